@@ -0,0 +1,154 @@
+"""
+Kiosk render benchmarks, run offscreen: building the tap grid, creating a card and painting a marquee.
+
+Needs PyQt5. The kiosk is pointed at a closed port, so it pages locally and never waits on a server.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+os.environ.setdefault("TAPLIST_SERVER_URL", "http://127.0.0.1:9")
+
+from synthetic import ROOT, TAP_COUNTS, make_taplist  # noqa: E402
+
+sys.path.insert(0, os.path.join(ROOT, "public"))
+
+from PyQt5 import QtGui, QtWidgets  # noqa: E402
+
+app = QtWidgets.QApplication.instance() or QtWidgets.QApplication(sys.argv[:1])
+
+import taplist  # noqa: E402
+
+
+def timed(fn, repeat) -> dict:
+    """Mean and worst ms of repeat calls"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return {"mean_ms": round(statistics.mean(samples), 3), "max_ms": round(max(samples), 3), "runs": repeat}
+
+
+def settle(seconds=0.2):
+    """Let queued events (layout, deferred deletes) run so they don't land in the next measurement"""
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        app.processEvents()
+        time.sleep(0.01)
+
+
+def wait_for_cards(window, timeout=30):
+    """Let the kiosk finish building the cards it defers to idle time"""
+    deadline = time.monotonic() + timeout
+    while window.unbuilt and time.monotonic() < deadline:
+        app.processEvents()
+
+
+def bench_window(tap_count, repeat) -> dict:
+    """Startup, full rebuilds and single-card rebuilds of a RotatingTapList"""
+    document = make_taplist(tap_count, description_words=120)
+    with tempfile.TemporaryDirectory(prefix="taplist-bench-") as workdir:
+        path = os.path.join(workdir, "taplist.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(document, f)
+
+        start = time.perf_counter()
+        window = taplist.RotatingTapList(path, app.primaryScreen())
+        startup = (time.perf_counter() - start) * 1000
+        wait_for_cards(window)
+        settle()
+
+        def reload_one_change():
+            document["taps"][0]["description"] += " more"
+            with open(path, "w", encoding="utf-8") as f:
+                json.dump(document, f)
+            window.setup_widgets()
+
+        def rebuild_all():
+            # drop the cards so every one is created again, as on a theme change; only the page on screen is
+            # built here, the rest follow in idle time
+            for widget in window.all_widgets:
+                if widget is not None:
+                    widget.key = None
+            window.setup_widgets()
+            wait_for_cards(window)
+
+        results = {
+            "startup_ms": round(startup, 3),
+            "startup_phases": {f"{phase}_ms": round(seconds * 1000, 3) for phase, seconds in window.startup.items()},
+            "setup_widgets_one_change": timed(reload_one_change, repeat),
+            "setup_widgets_all_new": timed(rebuild_all, repeat),
+            "pages": len(window.pages),
+        }
+        settle()
+
+        theme = window.theme
+        width, height = window.tap_width, taplist.Tap.DEFAULT_HEIGHT
+        taps = document["taps"]
+        cards = []
+
+        def create_card():
+            cards.append(taplist.Tap(taps[len(cards) % len(taps)], theme, window, width=width, height=height))
+
+        results["tap_init"] = timed(create_card, min(repeat * 5, 200))
+        for card in cards:
+            card.deleteLater()
+        settle()
+
+        label = window.curr_widgets[0].lab_desc if window.curr_widgets else None
+        if label is not None:
+            label.resize(max(200, label.width()), max(60, label.height()))
+            target = QtGui.QPixmap(label.size() * label.devicePixelRatioF())
+            target.setDevicePixelRatio(label.devicePixelRatioF())
+
+            def paint_cold():
+                # text laid out and rendered again, as after a text or size change
+                label._pixmap = None
+                label.render(target)
+
+            def paint_scroll():
+                # the steady state: blit the cached text pixmap one px further on
+                label.offset = (label.offset + 1) % max(1, label.text_height() - label.height())
+                label.render(target)
+
+            results["marquee_paint_cold"] = timed(paint_cold, repeat * 5)
+            results["marquee_paint_scroll"] = timed(paint_scroll, repeat * 20)
+
+        window.stop_animations()
+        window.close()
+        window.deleteLater()
+        settle()
+    return results
+
+
+def run(tap_counts=TAP_COUNTS, repeat=10) -> dict:
+    """
+    All kiosk benchmarks
+
+    Returns:
+        dict: {"taps_<n>": {...}} plus the screen size they ran at
+    """
+    size = app.primaryScreen().size()
+    results = {"screen": f"{size.width()}x{size.height()}"}
+    for tap_count in tap_counts:
+        results[f"taps_{tap_count}"] = bench_window(tap_count, repeat)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--taps", type=int, nargs="+", default=list(TAP_COUNTS), help="taplist sizes to run")
+    parser.add_argument("--repeat", type=int, default=10, help="runs per measurement")
+    args = parser.parse_args(argv)
+    json.dump(run(args.taps, args.repeat), sys.stdout, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    main()
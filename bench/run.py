@@ -0,0 +1,122 @@
+"""
+Run the server and kiosk benchmarks and write one JSON report, optionally checked against a baseline report.
+
+    python bench/run.py --output baseline.json
+    python bench/run.py --baseline baseline.json --output current.json
+
+With --baseline, metrics that got worse by more than --threshold percent are listed on stderr and the exit
+status is 1. Metrics ending in _ms count as worse when higher, those ending in _per_s when lower.
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(script, args) -> dict:
+    """Run one benchmark script in its own process and parse its JSON"""
+    result = subprocess.run([sys.executable, os.path.join(HERE, script), *args], capture_output=True, text=True)
+    if result.returncode != 0:
+        return {"error": result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "failed"}
+    return json.loads(result.stdout)
+
+
+def flatten(results, prefix="") -> dict:
+    """{"a": {"b_ms": 1}} -> {"a.b_ms": 1}, numbers only"""
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(flatten(value, f"{name}."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def regressions(current, baseline, threshold) -> list:
+    """
+    Metrics that got worse by more than threshold percent
+
+    Returns:
+        list[tuple[str, float, float, float]]: (metric, baseline, current, percent worse)
+    """
+    before, after = flatten(baseline), flatten(current)
+    worse = []
+    for name, old in sorted(before.items()):
+        new = after.get(name)
+        if new is None or not old:
+            continue
+        if name.endswith("_ms"):
+            change = (new - old) / old * 100
+        elif name.endswith("_per_s"):
+            change = (old - new) / old * 100
+        else:
+            continue
+        if change > threshold:
+            worse.append((name, old, new, round(change, 1)))
+    return worse
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--output", help="write the report here instead of stdout")
+    parser.add_argument("--baseline", help="earlier report to compare against")
+    parser.add_argument("--threshold", type=float, default=10.0, help="percent worse that counts as a regression")
+    parser.add_argument("--taps", nargs="+", default=[], help="taplist sizes (default: 10 50 200)")
+    parser.add_argument("--skip-server", action="store_true")
+    parser.add_argument("--skip-kiosk", action="store_true")
+    parser.add_argument("--quick", action="store_true", help="shorter runs, for a smoke test rather than numbers")
+    args = parser.parse_args(argv)
+
+    taps = ["--taps", *args.taps] if args.taps else []
+    report = {
+        "meta": {
+            "revision": git_revision(),
+            "date": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "system": platform.platform(),
+            "cpus": os.cpu_count(),
+        }
+    }
+    if not args.skip_server:
+        quick = ["--duration", "1", "--rounds", "5", "--uploads", "2"] if args.quick else []
+        report["server"] = run_suite("server_bench.py", taps + quick)
+    if not args.skip_kiosk:
+        quick = ["--repeat", "2"] if args.quick else []
+        report["kiosk"] = run_suite("kiosk_bench.py", taps + quick)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        worse = regressions(report, baseline, args.threshold)
+        for name, old, new, change in worse:
+            print(f"{name}: {old} -> {new} ({change}% worse)", file=sys.stderr)
+        if worse:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,349 @@
+"""
+Server benchmarks: /taplist.json under concurrent pollers, update-to-visible latency and upload throughput.
+
+Each taplist size runs against its own server started from a scratch copy of server/ and public/, so the real
+taplist, history and images are never touched.
+"""
+import argparse
+import contextlib
+import http.client
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+from synthetic import ROOT, TAP_COUNTS, make_png, make_taplist
+
+
+def percentile(samples, q) -> float:
+    """q-th percentile (0-100) of samples, nearest rank"""
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, round(q / 100 * len(ordered)) - 1))]
+
+
+def summarize(latencies, elapsed) -> dict:
+    """Throughput and latency percentiles (ms) of one run"""
+    if not latencies:
+        return {"requests": 0}
+    return {
+        "requests": len(latencies),
+        "requests_per_s": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "max_ms": round(max(latencies) * 1000, 2),
+    }
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class ServerProcess:
+    """The taplist server on a free port, running from a throwaway copy of the tree"""
+
+    def __init__(self, document, threads=None, write_delay=None):
+        self.document = document
+        self.threads = threads
+        self.write_delay = write_delay
+        self.port = free_port()
+        self.workdir = None
+        self.process = None
+
+    def __enter__(self):
+        self.workdir = tempfile.mkdtemp(prefix="taplist-bench-")
+        shutil.copytree(os.path.join(ROOT, "server"), os.path.join(self.workdir, "server"))
+        shutil.copytree(
+            os.path.join(ROOT, "public"),
+            os.path.join(self.workdir, "public"),
+            ignore=shutil.ignore_patterns("blobs", "variants", "index.json", "meta.json", "__pycache__"),
+        )
+        with open(os.path.join(self.workdir, "public", "taplist.json"), "w", encoding="utf-8") as f:
+            json.dump(self.document, f)
+
+        command = [sys.executable, "server.py", "--host", "127.0.0.1", "--port", str(self.port)]
+        if self.threads:
+            command += ["--threads", str(self.threads)]
+        env = dict(os.environ, TAPLIST_HISTORY_PATH=os.path.join(self.workdir, "history.db"))
+        if self.write_delay is not None:
+            env["TAPLIST_WRITE_DELAY"] = str(self.write_delay)
+        self.process = subprocess.Popen(
+            command,
+            cwd=os.path.join(self.workdir, "server"),
+            env=env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            with contextlib.suppress(OSError):
+                status, _, _ = self.request("GET", "/taplist/version")
+                if status == 200:
+                    return self
+            time.sleep(0.1)
+        self.__exit__(None, None, None)
+        raise RuntimeError("server did not start")
+
+    def __exit__(self, *exc):
+        if self.process:
+            self.process.terminate()
+            with contextlib.suppress(subprocess.TimeoutExpired):
+                self.process.wait(timeout=10)
+            if self.process.poll() is None:
+                self.process.kill()
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+    def connect(self, timeout=30) -> http.client.HTTPConnection:
+        return http.client.HTTPConnection("127.0.0.1", self.port, timeout=timeout)
+
+    def request(self, method, path, body=None, headers=None):
+        """One request on a fresh connection: (status, headers, body)"""
+        conn = self.connect()
+        try:
+            conn.request(method, path, body=body, headers=headers or {})
+            response = conn.getresponse()
+            return response.status, dict(response.getheaders()), response.read()
+        finally:
+            conn.close()
+
+
+def bench_polling(server, pollers, duration, conditional=False) -> dict:
+    """
+    Hammer /taplist.json from `pollers` keep-alive connections for `duration` seconds
+
+    Args:
+        conditional (bool): send If-None-Match like a display that already has the document, so most answers
+            are 304s
+    """
+    _, headers, _ = server.request("GET", "/taplist.json", headers={"Accept-Encoding": "gzip"})
+    request_headers = {"Accept-Encoding": "gzip"}
+    if conditional:
+        request_headers["If-None-Match"] = headers.get("ETag", "")
+    latencies, errors = [], []
+    lock = threading.Lock()
+    start = time.perf_counter()
+    deadline = start + duration
+
+    def poll():
+        conn, mine = server.connect(), []
+        try:
+            while time.perf_counter() < deadline:
+                sent = time.perf_counter()
+                conn.request("GET", "/taplist.json", headers=request_headers)
+                response = conn.getresponse()
+                response.read()
+                if response.status not in (200, 304):
+                    raise RuntimeError(f"status {response.status}")
+                mine.append(time.perf_counter() - sent)
+        except Exception as e:
+            with lock:
+                errors.append(str(e))
+        finally:
+            conn.close()
+            with lock:
+                latencies.extend(mine)
+
+    threads = [threading.Thread(target=poll) for _ in range(pollers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return dict(summarize(latencies, time.perf_counter() - start), pollers=pollers, errors=len(errors))
+
+
+class EventListener(threading.Thread):
+    """Reads /events and records when each taplist version was announced"""
+
+    def __init__(self, server):
+        super().__init__(daemon=True)
+        self.conn = server.connect(timeout=60)
+        self.seen = {}
+        self.changed = threading.Condition()
+
+    def run(self):
+        self.conn.request("GET", "/events")
+        response = self.conn.getresponse()
+        event = None
+        with contextlib.suppress(OSError, ValueError):
+            for line in response:
+                line = line.decode("utf-8").rstrip("\n")
+                if line.startswith("event: "):
+                    event = line[7:]
+                elif line.startswith("data: ") and event == "taplist":
+                    with self.changed:
+                        self.seen[json.loads(line[6:])["version"]] = time.perf_counter()
+                        self.changed.notify_all()
+
+    def wait_for(self, version, timeout=10):
+        with self.changed:
+            self.changed.wait_for(lambda: any(seen >= version for seen in self.seen), timeout)
+            return min((at for seen, at in self.seen.items() if seen >= version), default=None)
+
+    def close(self):
+        self.conn.close()
+
+
+def bench_update_latency(server, document, rounds) -> dict:
+    """
+    Time from an admin save to a display having the new version: the save, its taplist event, and the delta
+    the display then fetches
+    """
+    listener = EventListener(server)
+    listener.start()
+    time.sleep(0.2)
+    save, event, visible = [], [], []
+    _, headers, body = server.request("GET", "/taplist/version")
+    version = json.loads(body)["version"]
+    for index in range(rounds):
+        document = dict(document, title=f"Bench {index}")
+        sent = time.perf_counter()
+        status, _, body = server.request(
+            "POST", "/update-taplist", json.dumps(document), {"Content-Type": "application/json"}
+        )
+        saved = time.perf_counter()
+        if status != 200:
+            raise RuntimeError(f"save failed with {status}: {body[:200]}")
+        new_version = json.loads(body)["version"]
+        announced = listener.wait_for(new_version)
+        if announced is None:
+            raise RuntimeError(f"no event for version {new_version}")
+        server.request("GET", f"/taplist/delta?since={version}")
+        done = time.perf_counter()
+        save.append(saved - sent)
+        event.append(announced - sent)
+        visible.append(done - sent)
+        version = new_version
+    listener.close()
+
+    def ms(samples):
+        return {"p50_ms": round(percentile(samples, 50) * 1000, 2), "p99_ms": round(percentile(samples, 99) * 1000, 2)}
+
+    return {"rounds": rounds, "save": ms(save), "event": ms(event), "visible": ms(visible)}
+
+
+def bench_uploads(server, count, concurrency, width, height) -> dict:
+    """Upload `count` distinct PNGs, `concurrency` at a time, then wait for their processing jobs"""
+    images = [make_png(width, height, seed=index) for index in range(count)]
+    boundary = uuid.uuid4().hex
+    latencies, jobs = [], []
+    lock = threading.Lock()
+
+    def upload(index):
+        body = (
+            f'--{boundary}\r\nContent-Disposition: form-data; name="image"; filename="bench-{index}.png"\r\n'
+            f"Content-Type: image/png\r\n\r\n"
+        ).encode() + images[index] + f"\r\n--{boundary}--\r\n".encode()
+        sent = time.perf_counter()
+        while True:
+            status, headers, _ = server.request(
+                "POST", "/upload-image", body, {"Content-Type": f"multipart/form-data; boundary={boundary}"}
+            )
+            # the server's processing backlog is full, it asks us to come back
+            if status != 503:
+                break
+            time.sleep(0.2)
+        with lock:
+            latencies.append(time.perf_counter() - sent)
+            if headers.get("Location"):
+                jobs.append(headers["Location"])
+        if status not in (201, 202):
+            raise RuntimeError(f"upload failed with {status}")
+
+    start = time.perf_counter()
+    for first in range(0, count, concurrency):
+        threads = [threading.Thread(target=upload, args=(index,)) for index in range(first, min(count, first + concurrency))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    uploaded = time.perf_counter() - start
+
+    failed = 0
+    for job in jobs:
+        while True:
+            _, _, body = server.request("GET", job)
+            state = json.loads(body)["state"]
+            if state in ("done", "failed"):
+                failed += state == "failed"
+                break
+            time.sleep(0.05)
+    processed = time.perf_counter() - start
+    megabytes = sum(len(image) for image in images) / (1024 * 1024)
+    return {
+        "uploads": count,
+        "concurrency": concurrency,
+        "image_mb": round(megabytes / count, 2),
+        "uploads_per_s": round(count / uploaded, 2),
+        "upload_mb_per_s": round(megabytes / uploaded, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        "processed_per_s": round(count / processed, 2),
+        "failed_jobs": failed,
+    }
+
+
+def run(
+    tap_counts=TAP_COUNTS,
+    pollers=8,
+    duration=5.0,
+    rounds=20,
+    uploads=8,
+    upload_concurrency=2,
+    threads=None,
+    write_delay=None,
+):
+    """
+    All server benchmarks; threads and write_delay default to the server's own settings
+
+    Returns:
+        dict: {"taps_<n>": {"poll", "poll_conditional", "update"}, "uploads": {...}}
+    """
+    results = {}
+    for tap_count in tap_counts:
+        document = make_taplist(tap_count, description_words=120, image_count=min(tap_count, 40))
+        with ServerProcess(document, threads=threads, write_delay=write_delay) as server:
+            results[f"taps_{tap_count}"] = {
+                "document_kb": round(len(json.dumps(document)) / 1024, 1),
+                "poll": bench_polling(server, pollers, duration),
+                "poll_conditional": bench_polling(server, pollers, duration, conditional=True),
+                "update": bench_update_latency(server, document, rounds),
+            }
+    if uploads:
+        with ServerProcess(make_taplist(10), threads=threads) as server:
+            results["uploads"] = bench_uploads(server, uploads, upload_concurrency, 1200, 900)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--taps", type=int, nargs="+", default=list(TAP_COUNTS), help="taplist sizes to run")
+    parser.add_argument("--pollers", type=int, default=8, help="concurrent /taplist.json clients")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds of polling per run")
+    parser.add_argument("--rounds", type=int, default=20, help="saves timed for update-to-visible latency")
+    parser.add_argument("--uploads", type=int, default=8, help="images to upload, 0 to skip")
+    parser.add_argument("--upload-concurrency", type=int, default=2)
+    parser.add_argument("--threads", type=int, help="server worker threads (default: the server's own)")
+    parser.add_argument("--write-delay", type=float, help="TAPLIST_WRITE_DELAY for the server (default: its own)")
+    args = parser.parse_args(argv)
+    results = run(
+        args.taps,
+        args.pollers,
+        args.duration,
+        args.rounds,
+        args.uploads,
+        args.upload_concurrency,
+        args.threads,
+        args.write_delay,
+    )
+    json.dump(results, sys.stdout, indent=2)
+    print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Deterministic synthetic taplists and label images for the benchmarks."""
+import copy
+import json
+import os
+import random
+import struct
+import zlib
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_TAPLIST = os.path.join(ROOT, "src", "default-taplist.json")
+
+# The taplist sizes every benchmark runs at
+TAP_COUNTS = (10, 50, 200)
+
+WORDS = (
+    "honey orange blossom wildflower oak barrel aged dry sweet semi sparkling still tart cherry raspberry "
+    "blackberry vanilla cinnamon clove ginger lemon lime hops citrus pine floral earthy smoky toasted "
+    "caramel chocolate coffee coconut mango passionfruit peach apricot plum fig date maple buckwheat"
+).split()
+
+STYLES = ("Traditional Mead", "Melomel", "Cyser", "Metheglin", "Braggot", "Hydromel", "Sack Mead", "Pyment")
+
+
+def make_taplist(tap_count, description_words=40, image_count=0, seed=0) -> dict:
+    """
+    A taplist with the default themes and settings and tap_count generated taps
+
+    Args:
+        tap_count (int): number of taps
+        description_words (int): words in each description; a few hundred makes every marquee scroll
+        image_count (int): distinct label images the taps cycle through (bench-<n>.png), 0 for the default one
+        seed (int): same seed, same taplist
+    """
+    rng = random.Random(seed)
+    with open(DEFAULT_TAPLIST, encoding="utf-8") as f:
+        document = copy.deepcopy(json.load(f))
+    base_date = 1_700_000_000_000
+    document["taps"] = [
+        {
+            "id": base_date + index,
+            "category": rng.choice(("On Tap", "On Tap", "On Tap", "Bottles", "Coming Soon")),
+            "brewName": " ".join(rng.choice(WORDS).title() for _ in range(rng.randint(1, 3))),
+            "style": rng.choice(STYLES),
+            "abv": round(rng.uniform(4, 16), 1),
+            "labelLink": f"/images/bench-{index % image_count}.png" if image_count else "/images/defaultImage.png",
+            "dateAdded": base_date + rng.randint(0, 90) * 86_400_000,
+            "description": " ".join(rng.choice(WORDS) for _ in range(description_words)).capitalize() + ".",
+            "containerType": rng.choice(("keg", "can", "bottle", "growler")),
+        }
+        for index in range(tap_count)
+    ]
+    return document
+
+
+def make_png(width=1200, height=900, seed=0) -> bytes:
+    """
+    An RGB PNG of noise, which barely compresses, so its size is close to what a phone photo of a label weighs
+
+    Written by hand so the benchmarks don't need Pillow.
+    """
+    rng = random.Random(seed)
+    row = width * 3
+    raw = b"".join(b"\x00" + rng.randbytes(row) for _ in range(height))
+
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data) & 0xFFFFFFFF)
+
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(raw, 1)) + chunk(b"IEND", b"")
@@ -9,7 +9,7 @@ TSC_PID=$!
 
 # Activate virtualenv and start Flask server with autoreload
 source server/venv/bin/activate
-PORT=$PORT watchmedo auto-restart --directory=public --pattern="*.js" --recursive -- python3 server/server.py &
+PORT=$PORT watchmedo auto-restart --directory=public --pattern="*.js" --recursive -- python3 server/server.py --dev &
 SERVER_PID=$!
 
 # Wait until admin.html responds with HTTP 200
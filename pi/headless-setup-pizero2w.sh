@@ -47,6 +47,7 @@ After=network.target
 [Service]
 WorkingDirectory=$INSTALL_DIR/server
 ExecStart=$INSTALL_DIR/server/venv/bin/$PYTHON_EXEC server.py
+ExecReload=/bin/kill -HUP \$MAINPID
 Restart=always
 User=$USER
 Environment=FLASK_ENV=production
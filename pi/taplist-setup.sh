@@ -53,6 +53,7 @@ After=network.target
 [Service]
 WorkingDirectory=$INSTALL_DIR/server
 ExecStart=$INSTALL_DIR/server/venv/bin/$PYTHON_EXEC server.py
+ExecReload=/bin/kill -HUP \$MAINPID
 ExecStartPost=$POST_SCRIPT
 Restart=always
 User=$USER
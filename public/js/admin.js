@@ -1,5 +1,8 @@
 "use strict";
 let data;
+// ETag of the document `data` was loaded from, sent with whole-document saves
+let dataEtag = null;
+let saveQueue = Promise.resolve();
 let globalImageStore;
 const newTapBtn = document.getElementById("new-tap-button");
 const newTapFormContainer = document.getElementById("new-tap-form-container");
@@ -18,13 +21,23 @@ const tapContainer = document.getElementById("on-tap");
 const fileInput = document.getElementById("file-input");
 const fileNameDisplay = document.getElementById("file-name");
 const dropZone = document.getElementById("drop-zone");
+const versionSelect = document.getElementById("version-select");
+const restoreVersionButton = document.getElementById("restore-version-button");
+const gallery = document.getElementById("image-gallery");
+const imageFilter = document.getElementById("image-filter");
+const unusedOnly = document.getElementById("unused-only");
+const moreImagesButton = document.getElementById("more-images");
+const deleteUnusedButton = document.getElementById("delete-unused-images");
+const GALLERY_PAGE_SIZE = 48;
+// how many gallery images are shown so far
+let galleryOffset = 0;
+let filterTimer;
 const fetchData = async () => {
     try {
-        const res = await fetch(`./taplist.json?ts=${Date.now()}`, {
-            cache: "no-store",
-        });
+        const res = await fetch("./taplist.json", { cache: "no-cache" });
         const parsed = await res.json();
         data = parsed;
+        dataEtag = res.headers.get("ETag");
     }
     catch (err) {
         throw err;
@@ -34,6 +47,19 @@ const setup = async () => {
     await fetchData();
     globalImageStore = await loadImages();
     updateTaplist();
+    loadVersions();
+    restoreVersionButton.onclick = async () => {
+        const option = versionSelect.selectedOptions[0];
+        if (!option || !confirm(`Restore the taplist from ${option.textContent}?`))
+            return;
+        // the server rolls back from its own history, nothing to upload
+        await queueSave(async () => {
+            await fetch(`/taplist/versions/${option.value}/restore`, {
+                method: "POST",
+            });
+        });
+        window.location.reload();
+    };
     newTapBtn.onclick = () => {
         if (!newTapFormContainer.innerHTML) {
             generateNewTapForm(newTapFormContainer);
@@ -114,9 +140,23 @@ const setup = async () => {
             method: "POST",
             body: formData,
         });
-        await res.text();
+        const upload = await res
+            .json()
+            .catch(() => ({ error: res.statusText }));
+        if (!res.ok) {
+            alert(`Upload failed: ${upload.error}`);
+            return;
+        }
         globalImageStore = await loadImages();
         updateAllImageSelects();
+        // the server checks and resizes the image in the background
+        const job = upload.job && (await waitForJob(upload.job));
+        if (job?.state === "failed")
+            alert(`Upload failed: ${job.error}`);
+        if (job) {
+            globalImageStore = await loadImages();
+            updateAllImageSelects();
+        }
     };
     // Show file name
     const handleFile = (file) => {
@@ -145,6 +185,13 @@ const setup = async () => {
             handleFile(file);
         }
     };
+    imageFilter.oninput = () => {
+        clearTimeout(filterTimer);
+        filterTimer = setTimeout(() => renderGallery(true), 250);
+    };
+    unusedOnly.onchange = () => renderGallery(true);
+    moreImagesButton.onclick = () => renderGallery(false);
+    deleteUnusedButton.onclick = deleteUnusedImages;
 };
 const updateCustomColors = () => {
     customThemeEditor.classList.remove("hidden");
@@ -175,15 +222,65 @@ const setCSSVariables = (styles) => {
     };
     Object.entries(styles).forEach(([key, value]) => apply(key, value));
 };
-const persistUpdates = async () => {
+// Saves go out one at a time, so each one is based on the version the previous one produced
+const queueSave = (save) => {
+    const run = saveQueue.then(save);
+    // a failed save mustn't stop the ones queued behind it
+    saveQueue = run.catch((err) => console.error(err));
+    return run;
+};
+// The server checks every save against the taplist schema and answers 400 if it doesn't fit
+const reportRejected = async (res) => {
+    if (res.status !== 400)
+        return;
+    const { error } = await res.json().catch(() => ({ error: res.statusText }));
+    alert(`The change was not saved: ${error}`);
+};
+// Someone else saved first: 412 for a stale If-Match, 409 for a failed test op
+const isConflict = (res) => res.status === 409 || res.status === 412;
+// start over from their version rather than overwrite it
+const reloadAfterConflict = () => {
+    alert("The taplist was changed from another device. Reloading it.");
+    window.location.reload();
+};
+const persistUpdates = () => {
+    // snapshot the edit now; a save still in flight replaces `data` when it finishes
+    const body = JSON.stringify({ ...data, lastUpdated: Date.now() });
+    return queueSave(async () => {
+        let conflict = false;
+        try {
+            const res = await fetch("/update-taplist", {
+                method: "POST",
+                headers: {
+                    "Content-Type": "application/json",
+                    ...(dataEtag ? { "If-Match": dataEtag } : {}),
+                },
+                body,
+            });
+            conflict = isConflict(res);
+            await reportRejected(res);
+        }
+        catch (error) {
+            console.error(error);
+        }
+        finally {
+            await fetchData();
+        }
+        if (conflict)
+            reloadAfterConflict();
+    });
+};
+// A new tap has an id nobody else has, so it goes in whatever else changed meanwhile
+const persistNewTap = (tap) => queueSave(async () => {
     try {
-        await fetch("/update-taplist", {
-            method: "POST",
+        const res = await fetch(`/taps/${tap.id}`, {
+            method: "PUT",
             headers: {
                 "Content-Type": "application/json",
             },
-            body: JSON.stringify({ ...data, lastUpdated: Date.now() }),
+            body: JSON.stringify(tap),
         });
+        await reportRejected(res);
     }
     catch (error) {
         console.error(error);
@@ -191,40 +288,168 @@ const persistUpdates = async () => {
     finally {
         await fetchData();
     }
+});
+const persistPatch = (ops) => queueSave(async () => {
+    let conflict = false;
+    try {
+        const res = await fetch("/taplist.json", {
+            method: "PATCH",
+            headers: {
+                "Content-Type": "application/json-patch+json",
+            },
+            body: JSON.stringify(ops),
+        });
+        conflict = isConflict(res);
+        await reportRejected(res);
+    }
+    catch (error) {
+        console.error(error);
+    }
+    finally {
+        await fetchData();
+    }
+    if (conflict)
+        reloadAfterConflict();
+});
+// Moves are by position, so they only go ahead while both taps are still where this page last saw them
+const swapOps = (from, to) => [
+    { op: "test", path: `/taps/${from}/id`, value: data.taps[from].id },
+    { op: "test", path: `/taps/${to}/id`, value: data.taps[to].id },
+    { op: "move", from: `/taps/${from}`, path: `/taps/${to}` },
+];
+// An edit only goes ahead while the tap is where this page saw it and the fields it changes still hold what
+// this page showed, so saves to other taps or other fields of this one don't get in its way
+const editOps = (index, changes) => {
+    const tap = data.taps[index];
+    const ops = [
+        { op: "test", path: `/taps/${index}/id`, value: tap.id },
+    ];
+    for (const [key, value] of Object.entries(changes)) {
+        const path = `/taps/${index}/${key}`;
+        if (key in tap)
+            ops.push({ op: "test", path, value: tap[key] });
+        ops.push({ op: "add", path, value });
+    }
+    return ops;
+};
+const loadVersions = async () => {
+    try {
+        const res = await fetch("/taplist/versions", { cache: "no-cache" });
+        const { current, versions } = await res.json();
+        versionSelect.innerHTML = "";
+        for (const entry of versions) {
+            const option = document.createElement("option");
+            option.value = entry.version.toString();
+            option.textContent = new Date(entry.created).toLocaleString();
+            if (entry.version === current)
+                option.textContent += " (current)";
+            versionSelect.appendChild(option);
+        }
+    }
+    catch (err) {
+        console.warn("Failed to load version history", err);
+    }
+};
+// Poll a background job until it finishes
+const waitForJob = async (job) => {
+    while (job.state === "queued" || job.state === "running") {
+        await new Promise((resolve) => setTimeout(resolve, 500));
+        try {
+            const res = await fetch(`/jobs/${job.id}`, { cache: "no-store" });
+            if (!res.ok)
+                return null;
+            job = await res.json();
+        }
+        catch (error) {
+            console.error(error);
+            return null;
+        }
+    }
+    return job;
 };
 const loadImages = async () => {
-    const res = await fetch("/images");
-    const images = await res.json();
-    const gallery = document.getElementById("image-gallery");
-    gallery.innerHTML = "";
-    images.forEach((filename) => {
-        const wrapper = document.createElement("div");
-        wrapper.className = "image-wrapper";
-        const img = document.createElement("img");
-        img.src = `/images/${filename}`;
-        img.alt = filename;
-        const caption = document.createElement("div");
-        caption.className = "image-caption";
-        caption.title = filename;
-        caption.textContent = filename;
-        const del = document.createElement("button");
-        del.textContent = "Delete";
-        del.onclick = async () => {
-            if (filename === "defaultImage.png") {
-                alert("Cannot delete default image.");
-                return;
-            }
-            const userConfirmation = confirm("Are you sure? This action cannot be undone.");
-            if (userConfirmation) {
-                await fetch(`/delete-image/${filename}`, { method: "DELETE" });
-                globalImageStore = await loadImages();
-                updateAllImageSelects();
-            }
-        };
-        wrapper.append(img, caption, del);
-        gallery.appendChild(wrapper);
+    const res = await fetch("/images", { cache: "no-cache" });
+    const index = await res.json();
+    await renderGallery(true);
+    return Object.keys(index);
+};
+// The gallery shows a page at a time, fetching the next one on "Show More"
+const renderGallery = async (reset) => {
+    if (reset)
+        galleryOffset = 0;
+    const query = new URLSearchParams({
+        offset: galleryOffset.toString(),
+        limit: GALLERY_PAGE_SIZE.toString(),
+        q: imageFilter.value,
+        unused: unusedOnly.checked ? "1" : "0",
+    });
+    const res = await fetch(`/images?${query}`, { cache: "no-cache" });
+    const page = await res.json();
+    if (reset)
+        gallery.innerHTML = "";
+    page.items.forEach((entry) => gallery.appendChild(imageCard(entry)));
+    galleryOffset += page.items.length;
+    moreImagesButton.hidden = galleryOffset >= page.total;
+};
+const describeImage = (entry) => {
+    const details = [];
+    if (entry.width && entry.height)
+        details.push(`${entry.width}×${entry.height}`);
+    if (entry.size)
+        details.push(`${Math.ceil(entry.size / 1024)} KB`);
+    const uses = entry.usedBy.length;
+    details.push(uses ? `on ${uses} tap${uses === 1 ? "" : "s"}` : "unused");
+    return details.join(" · ");
+};
+const imageCard = (entry) => {
+    const filename = entry.name;
+    const wrapper = document.createElement("div");
+    wrapper.className = "image-wrapper";
+    const img = document.createElement("img");
+    img.src = entry.thumbnail;
+    img.alt = filename;
+    img.loading = "lazy";
+    const caption = document.createElement("div");
+    caption.className = "image-caption";
+    caption.title = filename;
+    caption.textContent = filename;
+    const details = document.createElement("div");
+    details.className = "image-details";
+    details.textContent = describeImage(entry);
+    const del = document.createElement("button");
+    del.textContent = "Delete";
+    del.onclick = async () => {
+        if (filename === "defaultImage.png") {
+            alert("Cannot delete default image.");
+            return;
+        }
+        const userConfirmation = confirm("Are you sure? This action cannot be undone.");
+        if (userConfirmation) {
+            await fetch(`/delete-image/${filename}`, { method: "DELETE" });
+            globalImageStore = await loadImages();
+            updateAllImageSelects();
+        }
+    };
+    wrapper.append(img, caption, details, del);
+    return wrapper;
+};
+const deleteUnusedImages = async () => {
+    const res = await fetch("/images/gc?dry_run=1", { method: "POST" });
+    const { unused } = await res.json();
+    if (!unused.length) {
+        alert("Every image is used by a tap.");
+        return;
+    }
+    if (!confirm(`Delete ${unused.length} unused images? This cannot be undone.`))
+        return;
+    // only the ones we were shown, in case a tap started using one since
+    await fetch("/images/gc", {
+        method: "POST",
+        headers: { "Content-Type": "application/json" },
+        body: JSON.stringify({ names: unused }),
     });
-    return images;
+    globalImageStore = await loadImages();
+    updateAllImageSelects();
 };
 const updateTaplist = () => {
     tapContainer.innerHTML = "";
@@ -424,32 +649,39 @@ const generateTapItem = (tap, container) => {
     deleteBtn.onclick = async () => {
         const userConfirmation = confirm("Are you sure? This action cannot be undone.");
         if (userConfirmation) {
-            const filtered = data.taps.filter((t) => t.id !== tap.id);
-            data.taps = filtered;
-            await persistUpdates();
-            await fetchData();
+            const index = data.taps.findIndex((t) => t.id === tap.id);
+            if (index === -1)
+                return;
+            const ops = [
+                { op: "test", path: `/taps/${index}/id`, value: tap.id },
+                { op: "remove", path: `/taps/${index}` },
+            ];
+            data.taps = data.taps.filter((t) => t.id !== tap.id);
+            await persistPatch(ops);
             updateTaplist();
         }
     };
     moveUpBtn.onclick = async () => {
         const index = data.taps.findIndex((t) => t.id === tap.id);
         if (index > 0) {
+            const ops = swapOps(index, index - 1);
             [data.taps[index - 1], data.taps[index]] = [
                 data.taps[index],
                 data.taps[index - 1],
             ];
-            await persistUpdates();
+            await persistPatch(ops);
             updateTaplist();
         }
     };
     moveDownBtn.onclick = async () => {
         const index = data.taps.findIndex((t) => t.id === tap.id);
         if (index < data.taps.length - 1) {
+            const ops = swapOps(index, index + 1);
             [data.taps[index], data.taps[index + 1]] = [
                 data.taps[index + 1],
                 data.taps[index],
             ];
-            await persistUpdates();
+            await persistPatch(ops);
             updateTaplist();
         }
     };
@@ -468,9 +700,11 @@ const generateTapItem = (tap, container) => {
         };
         const index = data.taps.findIndex((t) => t.id === tap.id);
         if (index !== -1) {
+            const changes = Object.fromEntries(Object.entries(updated).filter(([key, value]) => data.taps[index][key] !== value));
+            const ops = editOps(index, changes);
             data.taps[index] = updated;
-            persistUpdates();
-            fetchData();
+            if (Object.keys(changes).length)
+                persistPatch(ops);
         }
         [
             categoryInput,
@@ -555,7 +789,7 @@ const generateNewTapForm = (container) => {
             containerType: containerTypeSelect.value,
         };
         data.taps.push(newTap);
-        persistUpdates();
+        persistNewTap(newTap);
         form.reset(); // Clears all inputs
         dateInput.value = today; // Re-set the date after reset
         labelImageSelect.value = "./images/defaultImage.png";
@@ -1,20 +1,525 @@
 #!/usr/bin/env python3
+import argparse
+import bisect
 import datetime
+import functools
+import gzip
+import os
 import sys
 import json
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import OrderedDict
 from pathlib import Path
-from PyQt5 import QtWidgets, QtCore, QtGui
+from PyQt5 import QtWidgets, QtCore, QtGui, sip
 from typing import Union
 import math
 from time import strftime, localtime
 
+try:
+    import orjson
+except ImportError:  # optional, just a faster parser
+    orjson = None
+
+# where taplist.json and images/ are read from; with --server, a local copy of the server's
+PUBLIC_DIR = os.environ.get("TAPLIST_PUBLIC_DIR", "/home/pi/taplist-server/public")
+# the taplist server on this Pi, whose rotation clock keeps the kiosk on the same page as the other displays
+SERVER_URL = os.environ.get("TAPLIST_SERVER_URL", "http://127.0.0.1:5000")
+# the copy of a remote server's taplist and labels a kiosk started with --server runs from
+CACHE_DIR = os.environ.get("TAPLIST_CACHE_DIR", os.path.expanduser("~/.cache/taplist-kiosk"))
+# sizes the server's image pipeline writes to images/variants/<size>/
+VARIANT_SIZES = (150, 300, 600)
+# render metrics are written here in the Prometheus text format; the server's /metrics includes them when its
+# TAPLIST_KIOSK_METRICS points at the same file. Empty to turn off
+METRICS_PATH = os.environ.get("TAPLIST_KIOSK_METRICS", "/tmp/taplist-kiosk.prom")
+# page flips: "crossfade" blends two pre-rendered pixmaps of the card area, "fade" fades every card out and in
+TRANSITION = os.environ.get("TAPLIST_TRANSITION", "crossfade")
+# ms per page when taplist.json doesn't say; the server's /time and the browser displays use the same
+DEFAULT_FADE_TIME = 15000
+
+
+def parse_json(data):
+    """Parse JSON bytes, with orjson when it is installed"""
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+
+@functools.lru_cache(maxsize=None)
+def readable_variant_formats():
+    """Variant formats this Qt build has an image plugin for (WebP/AVIF need qt5-image-formats-plugins)"""
+    supported = {bytes(fmt).decode().lower() for fmt in QtGui.QImageReader.supportedImageFormats()}
+    return [fmt for fmt in ("avif", "webp") if fmt in supported]
+
+
+_image_index = {"mtime": None, "index": {}}
+
+
+def load_image_index() -> dict:
+    """The server's images/index.json (image name -> content-addressed blob), re-read only when it changes"""
+    path = f"{PUBLIC_DIR}/images/index.json"
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return {}
+    if _image_index["mtime"] != mtime:
+        _image_index.update(mtime=mtime, index=parse_json(Path(path).read_bytes()))
+    return _image_index["index"]
+
+
+def fade_time(data) -> float:
+    """Page interval in ms, the default unless fadeTime is a positive number (it can be hand-edited to anything)"""
+    value = data.get("fadeTime")
+    if type(value) in (int, float) and math.isfinite(value) and value > 0:
+        return value
+    return DEFAULT_FADE_TIME
+
+
+def label_size(data) -> int:
+    """Size in px the cards draw labels at: imageSize scaled by the body font size in rem"""
+    scale = data.get("font-size-body", 1.2)
+    if isinstance(scale, str) and scale.endswith("rem"):
+        scale = float(scale[:-3])
+    return int(data.get("imageSize", 150) * scale)
+
+
+def label_image_path(label_link: str, size: int) -> str:
+    """
+    Find the smallest pre-scaled variant of a label that is at least `size` px, so we don't decode a full
+    phone photo just to shrink it. Falls back to the original upload.
+
+    Args:
+        label_link (str): tap's labelLink, e.g. /images/label.png
+        size (int): size in px the label will be drawn at
+
+    Returns:
+        str: path to load
+    """
+    blob = load_image_index().get(os.path.basename(label_link))
+    if not blob:
+        # older server that still keeps images under their own names
+        return f"{PUBLIC_DIR}/{label_link}"
+    content_hash = os.path.splitext(blob)[0]
+    for variant in VARIANT_SIZES:
+        if variant < size:
+            continue
+        for fmt in readable_variant_formats():
+            path = f"{PUBLIC_DIR}/images/variants/{variant}/{content_hash}.{fmt}"
+            if os.path.exists(path):
+                return path
+    return f"{PUBLIC_DIR}/images/blobs/{blob}"
+
+
+def sync_clock():
+    """
+    Where the server's shared rotation clock stands relative to ours, from the quickest of a few /time round trips
+
+    Returns:
+        tuple[float, int]: (ms to add to our clock, rotation epoch in ms), (0, 0) if the server can't be reached
+    """
+    best = None
+    for _ in range(3):
+        sent = time.time() * 1000
+        try:
+            with urllib.request.urlopen(f"{SERVER_URL}/time", timeout=1) as res:
+                server_time = parse_json(res.read())
+        except (OSError, ValueError):
+            break
+        received = time.time() * 1000
+        round_trip = received - sent
+        if best is None or round_trip < best[0]:
+            best = (round_trip, server_time["now"] + round_trip / 2 - received, server_time.get("epoch", 0))
+    return (best[1], best[2]) if best else (0, 0)
+
+
+class ClockSync(QtCore.QObject):
+    """Run sync_clock() on a thread of its own, so nothing on screen waits for the server to answer"""
+
+    # (ms to add to our clock, rotation epoch in ms), delivered on the GUI thread
+    synced = QtCore.pyqtSignal(object)
+
+    def start(self):
+        threading.Thread(target=lambda: self.synced.emit(sync_clock()), name="taplist-clock", daemon=True).start()
+
+
+def write_atomic(path, body: bytes):
+    """Replace path with body so a reader sees either the old file or the new one, never half of it"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(body)
+    os.replace(tmp_path, path)
+
+
+class SnapshotSync(QtCore.QObject):
+    """
+    Keep a local copy of a remote server's taplist and label images, for a kiosk on another board.
+
+    The copy mirrors the server's public/ layout (taplist.json, images/index.json, images/blobs/ and
+    images/variants/), so the kiosk reads it exactly like a local server's files and boots straight from it,
+    and keeps showing it while the network is down. A background thread brings it up to date: taplist.json,
+    the image index and labels whose URLs don't name their content are fetched with If-None-Match, so an
+    unchanged document costs a bodyless 304, and blobs and variants are named by their content hash, so each
+    one is downloaded once. Of each label only the variant the cards draw it at is downloaded (the one
+    label_image_path picks), and new labels are downloaded before the taplist that uses them is swapped in.
+
+    The thread listens on /events and syncs again on every taplist or images event; without a connection it
+    retries with a growing delay. Changes are announced with the taplist_changed and images_changed signals,
+    which Qt delivers on the GUI thread.
+    """
+
+    taplist_changed = QtCore.pyqtSignal()
+    images_changed = QtCore.pyqtSignal()
+
+    def __init__(self, server_url, cache_dir, timeout=5):
+        super().__init__()
+        self.server_url = server_url.rstrip("/")
+        self.cache_dir = cache_dir
+        self.timeout = timeout
+        self.state_path = os.path.join(cache_dir, "sync.json")
+        try:
+            self.etags = json.loads(Path(self.state_path).read_text())
+        except (OSError, ValueError):
+            self.etags = {}
+        # asked here once, Qt's plugin registry isn't something to poke at from the sync thread
+        self.formats = readable_variant_formats()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def taplist_path(self) -> str:
+        return os.path.join(self.cache_dir, "taplist.json")
+
+    def start(self):
+        """Keep the copy in sync from a daemon thread from now on"""
+        self._thread = threading.Thread(target=self.run, name="taplist-sync", daemon=True)
+        self._thread.start()
+
+    def run(self):
+        failures = 0
+        while True:
+            try:
+                self.listen()
+                failures = 0
+            except (OSError, ValueError) as e:
+                failures += 1
+                print(f"Lost {self.server_url}: {e}", file=sys.stderr)
+            time.sleep(min(30, 2**failures))
+
+    def listen(self):
+        """Sync, then again on every change event until the stream ends"""
+        with urllib.request.urlopen(f"{self.server_url}/events", timeout=45) as stream:
+            # connected first, so nothing that changes from here on is missed
+            self.sync()
+            event = None
+            for line in stream:
+                line = line.decode("utf-8").rstrip("\r\n")
+                if line.startswith("event: "):
+                    event = line[7:]
+                elif line.startswith("data: ") and event in ("taplist", "images"):
+                    self.sync()
+                elif not line:
+                    event = None
+
+    def sync(self) -> bool:
+        """
+        Bring the copy up to date and announce what changed
+
+        Returns:
+            bool: False if the server couldn't be reached or sent something unusable; the copy is untouched
+        """
+        with self._lock:
+            try:
+                taplist_body, taplist_etag = self.fetch("/taplist.json", self.taplist_path)
+                document = parse_json(Path(self.taplist_path).read_bytes() if taplist_body is None else taplist_body)
+                if not isinstance(document, dict):
+                    raise ValueError("taplist.json is not an object")
+                images_changed = self.sync_images(document)
+            except (OSError, ValueError) as e:
+                print(f"Could not sync from {self.server_url}: {e}", file=sys.stderr)
+                return False
+            if taplist_body is not None:
+                write_atomic(self.taplist_path, taplist_body)
+                self.remember("/taplist.json", taplist_etag)
+            write_atomic(self.state_path, json.dumps(self.etags).encode("utf-8"))
+        if images_changed:
+            self.images_changed.emit()
+        if taplist_body is not None:
+            self.taplist_changed.emit()
+        return True
+
+    def fetch(self, path, copy_path):
+        """
+        GET path, conditionally if we have an ETag for it and the copy at copy_path it came with
+
+        The ETag isn't remembered here: call remember() once the body is safely in copy_path, or a sync that
+        fails halfway would leave us asking for changes against a copy we never wrote.
+
+        Returns:
+            tuple[bytes | None, str | None]: the body, None if our copy is still current, and its ETag
+        """
+        request = urllib.request.Request(f"{self.server_url}{urllib.parse.quote(path)}")
+        request.add_header("Accept-Encoding", "gzip")
+        etag = self.etags.get(path)
+        if etag and os.path.exists(copy_path):
+            request.add_header("If-None-Match", etag)
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as res:
+                body = res.read()
+                if res.headers.get("Content-Encoding") == "gzip":
+                    body = gzip.decompress(body)
+                return body, res.headers.get("ETag")
+        except urllib.error.HTTPError as e:
+            if e.code == 304:
+                return None, etag
+            raise
+
+    def remember(self, path, etag):
+        """Ask for path conditionally from now on; its body has been written"""
+        if etag:
+            self.etags[path] = etag
+        else:
+            self.etags.pop(path, None)
+
+    def sync_images(self, document) -> bool:
+        """
+        Download the labels document uses that we don't have yet, and drop the ones nothing uses any more
+
+        Returns:
+            bool: whether any label the kiosk would load changed
+        """
+        index_path = os.path.join(self.cache_dir, "images", "index.json")
+        library_path = os.path.join(self.cache_dir, "images", "library.json")
+        body, library_etag = self.fetch("/images", library_path)
+        library = parse_json(Path(library_path).read_bytes() if body is None else body)
+        names = {os.path.basename(tap.get("labelLink") or "") for tap in document.get("taps", [])} - {""}
+        size = label_size(document)
+
+        changed = False
+        wanted = set()
+        for name in sorted(names):
+            entry = library.get(name)
+            if entry is None:
+                # not in the library (older server): by name, revalidated since the name can be re-pointed
+                label_path = os.path.join(self.cache_dir, "images", name)
+                label, etag = self.fetch(f"/images/{name}", label_path)
+                if label is not None:
+                    write_atomic(label_path, label)
+                    self.remember(f"/images/{name}", etag)
+                    changed = True
+                continue
+            # the smallest variant we can decode that is big enough, else the upload itself
+            fitting = sorted(
+                (int(variant), url)
+                for variant, url in entry["variants"].items()
+                if int(variant) >= size and url.rsplit(".", 1)[-1] in self.formats
+            )
+            url = fitting[0][1] if fitting else entry["url"]
+            path = os.path.join(self.cache_dir, url.lstrip("/"))
+            wanted.add(path)
+            if not os.path.exists(path):
+                with urllib.request.urlopen(f"{self.server_url}{url}", timeout=self.timeout) as res:
+                    write_atomic(path, res.read())
+                changed = True
+
+        blobs = {name: os.path.basename(entry["url"]) for name, entry in library.items()}
+        if body is not None:
+            old = None
+            try:
+                old = parse_json(Path(index_path).read_bytes())
+            except (OSError, ValueError):
+                pass
+            if old != blobs:
+                # same format as the server's own images/index.json, which label_image_path reads
+                write_atomic(index_path, json.dumps(blobs).encode("utf-8"))
+                changed = True
+            write_atomic(library_path, body)
+            self.remember("/images", library_etag)
+        self.prune(wanted)
+        return changed
+
+    def prune(self, wanted):
+        """Delete downloaded blobs and variants no tap uses any more"""
+        for folder in ("blobs", "variants"):
+            for root, _, files in os.walk(os.path.join(self.cache_dir, "images", folder)):
+                for file in files:
+                    path = os.path.join(root, file)
+                    if path not in wanted:
+                        try:
+                            os.remove(path)
+                        except OSError:
+                            pass
+
+
+class PixmapCache:
+    """
+    Process-wide cache of decoded, scaled label pixmaps.
+
+    Entries are keyed by (path, mtime, size) so an unchanged label is decoded once and a replaced file is
+    picked up on its own. Total pixmap memory is capped and the least recently used entries are evicted first,
+    which keeps a 512MB board safe no matter how many labels a taplist accumulates.
+    """
+
+    def __init__(self, budget_bytes=32 * 1024 * 1024):
+        self.budget_bytes = budget_bytes
+        self.used_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def get(self, path: str, size: int) -> QtGui.QPixmap:
+        """
+        Get the label at `path` scaled to size x size, decoding it only on a miss
+
+        Args:
+            path (str): image file to load
+            size (int): width and height to scale to
+
+        Returns:
+            QtGui.QPixmap: the (possibly null, if unreadable) pixmap
+        """
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            mtime = None
+        key = (path, mtime, size)
+        pixmap = self._items.get(key)
+        if pixmap is not None:
+            self._items.move_to_end(key)
+            self.hits += 1
+            return pixmap
+
+        self.misses += 1
+        # let the decoder scale while reading instead of decoding full size and shrinking afterwards
+        reader = QtGui.QImageReader(path)
+        reader.setScaledSize(QtCore.QSize(size, size))
+        pixmap = QtGui.QPixmap.fromImage(reader.read())
+
+        cost = pixmap.width() * pixmap.height() * max(pixmap.depth(), 8) // 8
+        if cost <= self.budget_bytes:
+            self._items[key] = pixmap
+            self.used_bytes += cost
+            while self.used_bytes > self.budget_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self.used_bytes -= evicted.width() * evicted.height() * max(evicted.depth(), 8) // 8
+        return pixmap
+
+
+pixmap_cache = PixmapCache(int(os.environ.get("TAPLIST_PIXMAP_CACHE_MB", 32)) * 1024 * 1024)
+
+
+class Timing:
+    """Durations counted into fixed buckets, so recording one is a bisect and a few additions"""
+
+    def __init__(self, name, help, buckets):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def lines(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        running = 0
+        for bound, count in zip(self.buckets + ("+Inf",), self.counts):
+            running += count
+            lines.append(f'{self.name}_bucket{{le="{bound}"}} {running}')
+        lines += [f"{self.name}_sum {self.total}", f"{self.name}_count {running}"]
+        return lines
+
+
+class KioskMetrics:
+    """
+    What the kiosk's rendering costs: rebuild and paint times, marquee frames that came late, label cache hits.
+
+    Everything is recorded on the GUI thread, so plain counters do without locks. write() puts them in a file
+    for the server (or node_exporter's textfile collector) to pick up.
+    """
+
+    def __init__(self):
+        self.setup = Timing(
+            "taplist_kiosk_setup_widgets_seconds",
+            "Time to rebuild the tap cards after a taplist change",
+            (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+        )
+        self.paint = Timing(
+            "taplist_kiosk_paint_seconds",
+            "Time to paint one marquee frame",
+            (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025),
+        )
+        self.transition = Timing(
+            "taplist_kiosk_transition_paint_seconds",
+            "Time to paint one crossfade frame of a page flip",
+            (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05),
+        )
+        self.frames = 0
+        self.dropped_frames = 0
+        # seconds per startup phase, see RotatingTapList.startup_done
+        self.startup = {}
+
+    def lines(self) -> list:
+        lines = self.setup.lines() + self.paint.lines() + self.transition.lines()
+        counters = (
+            ("taplist_kiosk_marquee_frames_total", "Marquee animation ticks", self.frames),
+            ("taplist_kiosk_dropped_frames_total", "Marquee ticks that were due but never ran", self.dropped_frames),
+            ("taplist_kiosk_pixmap_cache_hits_total", "Label pixmaps served from the cache", pixmap_cache.hits),
+            ("taplist_kiosk_pixmap_cache_misses_total", "Label pixmaps decoded", pixmap_cache.misses),
+        )
+        for name, help, value in counters:
+            lines += [f"# HELP {name} {help}", f"# TYPE {name} counter", f"{name} {value}"]
+        lines += [
+            "# HELP taplist_kiosk_pixmap_cache_bytes Memory held by cached label pixmaps",
+            "# TYPE taplist_kiosk_pixmap_cache_bytes gauge",
+            f"taplist_kiosk_pixmap_cache_bytes {pixmap_cache.used_bytes}",
+        ]
+        if self.startup:
+            lines += [
+                "# HELP taplist_kiosk_startup_seconds Time spent in each startup phase",
+                "# TYPE taplist_kiosk_startup_seconds gauge",
+            ]
+            lines += [f'taplist_kiosk_startup_seconds{{phase="{phase}"}} {value}' for phase, value in self.startup.items()]
+        return lines
+
+    def write(self, path):
+        """Replace path with the current metrics, atomically so a reader never sees half a file"""
+        tmp_path = f"{path}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write("\n".join(self.lines()) + "\n")
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Could not write metrics to {path}: {e}", file=sys.stderr)
+
+
+kiosk_metrics = KioskMetrics()
+
 
 class FlowLayout(QtWidgets.QLayout):
     """
     FlowLayout allows for a wrapping layout that automatically will wrap widgets to a new line if the container it is in becomes smaller
     or larger to accomodate. Essentially if the window is big enough, it will show them all on one line, else it will autowrap to new lines
+
+    Item positions only depend on the rect, the spacing and the item sizes, so they are cached per combination of
+    those and every geometry pass after the first for a page is a lookup. Item sizes are read again only when
+    items come or go or Qt invalidates the layout (a card's size changed), and the style's extra spacing is asked
+    once per style.
     """
 
+    MAX_CACHED_LAYOUTS = 32
+
     def __init__(self, parent=None, margin=0, spacing=1):
         """Setup a flow layout"""
         super().__init__()
@@ -24,6 +529,15 @@ class FlowLayout(QtWidgets.QLayout):
         self.setSpacing(spacing)
         # self.setAlignment(QtCore.Qt.AlignTop |QtCore.Qt.AlignLeft)
         self.itemlist = []
+        # (width, height, x spacing, y spacing) per item, None until asked for after a change
+        self._sizes = None
+        self._minimum = None
+        # extra (x, y) spacing per style
+        self._style_spacing = {}
+        # (rect, spacing, sizes) -> (item positions, height)
+        self._layouts = {}
+        # the key whose positions the items currently have
+        self._applied = None
 
     def clear(self):
         for item in reversed(self.itemlist):
@@ -37,6 +551,7 @@ class FlowLayout(QtWidgets.QLayout):
             item (QtWidgets.QWidget): widget to add
         """
         self.itemlist.append(item)
+        self._items_changed()
 
     def count(self) -> int:
         """How many items do we have in the layout"""
@@ -67,9 +582,45 @@ class FlowLayout(QtWidgets.QLayout):
             Union[QtCore.QObject, None]: QObject if item found, else None
         """
         if 0 <= index < len(self.itemlist):
+            self._items_changed()
             return self.itemlist.pop(index)
         return None
 
+    def invalidate(self):
+        """Qt says something in the layout changed (e.g. a card's size), so read the item sizes again"""
+        self._items_changed()
+        super().invalidate()
+
+    def _items_changed(self):
+        self._sizes = None
+        self._minimum = None
+        self._applied = None
+
+    def style_spacing(self, style) -> tuple:
+        """Extra (x, y) spacing a style puts between widgets"""
+        spacing = self._style_spacing.get(style)
+        if spacing is None:
+            spacing = self._style_spacing[style] = tuple(
+                style.layoutSpacing(QtWidgets.QSizePolicy.PushButton, QtWidgets.QSizePolicy.PushButton, orientation)
+                for orientation in (QtCore.Qt.Horizontal, QtCore.Qt.Vertical)
+            )
+        return spacing
+
+    def item_sizes(self) -> tuple:
+        """(width, height, x spacing, y spacing) of every item, read once per change"""
+        if self._sizes is None:
+            sizes = []
+            for item in self.itemlist:
+                try:
+                    wid = item.widget()
+                except:
+                    wid = item
+                space_x, space_y = self.style_spacing(wid.style())
+                hint = item.sizeHint()
+                sizes.append((hint.width(), hint.height(), space_x, space_y))
+            self._sizes = tuple(sizes)
+        return self._sizes
+
     def expandingDirections(self):
         """Which way to expand?"""
         return QtCore.Qt.Horizontal
@@ -103,49 +654,59 @@ class FlowLayout(QtWidgets.QLayout):
 
     def minimumSize(self):
         """What is the min size"""
-        size = QtCore.QSize()
+        if self._minimum is None:
+            size = QtCore.QSize()
 
-        for item in self.itemlist:
-            size = size.expandedTo(item.minimumSize())
+            for item in self.itemlist:
+                size = size.expandedTo(item.minimumSize())
 
-        size += QtCore.QSize(2 * self.margin(), 2 * self.margin())
-        return size
+            self._minimum = size
+        return self._minimum + QtCore.QSize(2 * self.margin(), 2 * self.margin())
 
     def doLayout(self, rect, testOnly):
-        """Do the layout of objects"""
+        """Do the layout of objects, or just measure it when testOnly"""
+        key = (rect.x(), rect.y(), rect.right(), self.spacing(), self.item_sizes())
+        layout = self._layouts.get(key)
+        if layout is None:
+            layout = self._layouts[key] = self.compute_layout(rect, key[-1])
+            if len(self._layouts) > self.MAX_CACHED_LAYOUTS:
+                # oldest first, dicts keep insertion order
+                del self._layouts[next(iter(self._layouts))]
+        positions, height = layout
+
+        if not testOnly and key != self._applied:
+            for item, (x, y), (width, item_height, _, _) in zip(self.itemlist, positions, key[-1]):
+                item.setGeometry(QtCore.QRect(x, y, width, item_height))
+            self._applied = key
+        return height
+
+    def compute_layout(self, rect, sizes) -> tuple:
+        """
+        Where each item goes in rect
+
+        Returns:
+            tuple[list[tuple[int, int]], int]: top left corner of each item, and the height used
+        """
         x = rect.x()
         y = rect.y()
         lineHeight = 0
+        positions = []
 
-        for item in self.itemlist:
-            try:
-                wid = item.widget()
-            except:
-                wid = item
-            spaceX = self.spacing() + wid.style().layoutSpacing(
-                QtWidgets.QSizePolicy.PushButton,
-                QtWidgets.QSizePolicy.PushButton,
-                QtCore.Qt.Horizontal,
-            )
-            spaceY = self.spacing() + wid.style().layoutSpacing(
-                QtWidgets.QSizePolicy.PushButton,
-                QtWidgets.QSizePolicy.PushButton,
-                QtCore.Qt.Vertical,
-            )
-            nextX = x + item.sizeHint().width() + spaceX
+        for width, height, space_x, space_y in sizes:
+            spaceX = self.spacing() + space_x
+            spaceY = self.spacing() + space_y
+            nextX = x + width + spaceX
             if nextX - spaceX > rect.right() and lineHeight > 0:
                 x = rect.x()
                 y = y + lineHeight + spaceY
-                nextX = x + item.sizeHint().width() + spaceX
+                nextX = x + width + spaceX
                 lineHeight = 0
 
-            if not testOnly:
-                item.setGeometry(QtCore.QRect(QtCore.QPoint(x, y), item.sizeHint()))
-
+            positions.append((x, y))
             x = nextX
-            lineHeight = max(lineHeight, item.sizeHint().height())
+            lineHeight = max(lineHeight, height)
 
-        return y + lineHeight - rect.y() + self.spacing()
+        return positions, y + lineHeight - rect.y() + self.spacing()
 
     def margin(self):
         """How much margin should we have"""
@@ -156,94 +717,293 @@ class FlowLayout(QtWidgets.QLayout):
         self.setContentsMargins(margin, margin, margin, margin)
 
 
+class MarqueeClock(QtCore.QObject):
+    """
+    One timer driving every scrolling label that shares an interval, instead of a QTimer per label.
+    It only runs while at least one label still has text to scroll.
+
+    Ticks that come more than an interval late (the GUI thread was busy) are counted as dropped frames.
+    """
+
+    _clocks = {}
+
+    def __init__(self, interval):
+        super().__init__()
+        self._labels = []
+        self._last_tick = None
+        self.timer = QtCore.QTimer(self)
+        self.timer.setInterval(interval)
+        self.timer.timeout.connect(self.tick)
+
+    @classmethod
+    def for_interval(cls, interval) -> "MarqueeClock":
+        if interval not in cls._clocks:
+            cls._clocks[interval] = cls(interval)
+        return cls._clocks[interval]
+
+    def add(self, label):
+        if label not in self._labels:
+            self._labels.append(label)
+        if not self.timer.isActive():
+            self._last_tick = None
+            self.timer.start()
+
+    def remove(self, label):
+        if label in self._labels:
+            self._labels.remove(label)
+        if not self._labels:
+            self.timer.stop()
+
+    def tick(self):
+        now = time.perf_counter()
+        if self._last_tick is not None:
+            late = round((now - self._last_tick) * 1000 / self.timer.interval())
+            kiosk_metrics.dropped_frames += max(0, late - 1)
+        self._last_tick = now
+        kiosk_metrics.frames += 1
+        for label in list(self._labels):
+            if sip.isdeleted(label):
+                # its card was removed from the taplist
+                self.remove(label)
+            # cards on other pages keep their place until they are shown again
+            elif label.isVisible():
+                label.scrollText()
+
+
 class VerticalMarqueeLabel(QtWidgets.QLabel):
     def __init__(self, text="", parent=None, speed=30):
         super().__init__(parent)
         self.setAttribute(QtCore.Qt.WA_StyledBackground, True)
         self._text = text
         self.offset = 0
-        self.timer = QtCore.QTimer(self)
-        self.timer.timeout.connect(self.scrollText)
-        self.timer.start(speed)
+        # laid out text, rendered once and then just blitted at the current offset
+        self._pixmap = None
+        self._pixmap_key = None
+        self.clock = MarqueeClock.for_interval(speed)
         self.reset_timer = QtCore.QTimer(self)
         self.reset_timer.setSingleShot(True)
         self.reset_timer.timeout.connect(self.restartScroll)
         self.setAlignment(QtCore.Qt.AlignLeft | QtCore.Qt.AlignTop)
         self.setWordWrap(True)
+        self.clock.add(self)
 
     def restartScroll(self):
         self.offset = 0
         self.update()
-        self.timer.start()
+        self.clock.add(self)
 
     def setText(self, text):
+        if text == self._text:
+            return
         self._text = text
-        self.offset = 0
-        self.update()
+        self._pixmap = None
+        self.reset_timer.stop()
+        self.restartScroll()
         self.updateGeometry()
 
     def text(self):
         return self._text
 
-    def scrollText(self):
+    def text_pixmap(self) -> QtGui.QPixmap:
+        """
+        The whole text rendered at the label's width, rebuilt only when the text, font, width or colour change
+
+        Returns:
+            QtGui.QPixmap: transparent pixmap as tall as the laid out text
+        """
+        color = self.palette().color(QtGui.QPalette.WindowText)
+        key = (self.width(), self.font().key(), color.rgba(), self.devicePixelRatioF())
+        if self._pixmap is not None and key == self._pixmap_key:
+            return self._pixmap
+
         doc = QtGui.QTextDocument(self._text)
         doc.setDefaultFont(self.font())
         doc.setTextWidth(self.width())
-        text_height = doc.size().height()
+        # --- Set text color from palette (which QSS sets) ---
+        default_fmt = QtGui.QTextCharFormat()
+        default_fmt.setForeground(QtGui.QBrush(color))
+        doc.setDefaultStyleSheet(f"body {{ color: {color.name()}; }}")  # For HTML text, optional
+        cursor = QtGui.QTextCursor(doc)
+        cursor.select(QtGui.QTextCursor.Document)
+        cursor.setCharFormat(default_fmt)
+        cursor.clearSelection()
+        # ----------------------------------------------------
+
+        ratio = self.devicePixelRatioF()
+        size = QtCore.QSize(max(1, self.width()), max(1, math.ceil(doc.size().height())))
+        pixmap = QtGui.QPixmap(size * ratio)
+        pixmap.setDevicePixelRatio(ratio)
+        pixmap.fill(QtCore.Qt.transparent)
+        painter = QtGui.QPainter(pixmap)
+        doc.drawContents(painter, QtCore.QRectF(0, 0, size.width(), size.height()))
+        painter.end()
+
+        self._pixmap, self._pixmap_key = pixmap, key
+        return pixmap
+
+    def text_height(self) -> int:
+        pixmap = self.text_pixmap()
+        return round(pixmap.height() / pixmap.devicePixelRatio())
+
+    def scrollText(self):
+        text_height = self.text_height()
         if text_height <= self.height():
             self.offset = 0
-            self.timer.stop()
+            self.clock.remove(self)
         else:
             self.offset += 1
             # Stop when the last line is fully visible
             if self.offset >= text_height - self.height():
                 self.offset = text_height - self.height()
-                self.timer.stop()
+                self.clock.remove(self)
                 # Pause for 2 seconds (2000 ms)
                 self.reset_timer.start(2000)
 
             self.update()
 
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        # the new width may need (or stop needing) scrolling
+        if not self.reset_timer.isActive():
+            self.clock.add(self)
+
     def paintEvent(self, event):
+        start = time.perf_counter()
         painter = QtGui.QPainter(self)
         # Draw background and border using style (respects QSS)
         opt = QtWidgets.QStyleOption()
         opt.initFrom(self)
         self.style().drawPrimitive(QtWidgets.QStyle.PE_Widget, opt, painter, self)
-
-        doc = QtGui.QTextDocument(self._text)
-        doc.setDefaultFont(self.font())
-        doc.setTextWidth(self.width())
-
-        # --- Set text color from palette (which QSS sets) ---
-        color = self.palette().color(QtGui.QPalette.WindowText)
-        default_fmt = QtGui.QTextCharFormat()
-        default_fmt.setForeground(QtGui.QBrush(color))
-        doc.setDefaultStyleSheet(f"body {{ color: {color.name()}; }}")  # For HTML text, optional
-        cursor = QtGui.QTextCursor(doc)
-        cursor.select(QtGui.QTextCursor.Document)
-        cursor.setCharFormat(default_fmt)
-        cursor.clearSelection()
-        # ----------------------------------------------------
-
-        painter.save()
-        painter.translate(0, -self.offset)
-        doc.drawContents(painter, QtCore.QRectF(0, 0, self.width(), doc.size().height()))
-        painter.restore()
+        painter.drawPixmap(QtCore.QPointF(0, -self.offset), self.text_pixmap())
+        painter.end()
+        kiosk_metrics.paint.observe(time.perf_counter() - start)
 
     def sizeHint(self):
         fm = self.fontMetrics()
         return QtCore.QSize(200, fm.height() * 2 + 10)
 
 
+class CrossfadeOverlay(QtWidgets.QWidget):
+    """
+    Covers the card area during a page flip and blends a pixmap of the old page into one of the new page.
+
+    Each frame is two blits, however many cards the pages have, where per-card opacity effects send every card
+    and its labels through an offscreen pass every frame.
+    """
+
+    def __init__(self, parent, duration=800):
+        super().__init__(parent)
+        self.setAttribute(QtCore.Qt.WA_TransparentForMouseEvents, True)
+        # both pixmaps are opaque, so nothing underneath needs painting first
+        self.setAttribute(QtCore.Qt.WA_OpaquePaintEvent, True)
+        self.old_page = None
+        self.new_page = None
+        self.progress = 0.0
+        self.animation = QtCore.QVariantAnimation(self)
+        self.animation.setStartValue(0.0)
+        self.animation.setEndValue(1.0)
+        self.animation.setDuration(duration)
+        self.animation.setEasingCurve(QtCore.QEasingCurve.InOutQuad)
+        self.animation.valueChanged.connect(self.set_progress)
+        self.hide()
+
+    @property
+    def finished(self):
+        return self.animation.finished
+
+    def start(self, old_page: QtGui.QPixmap, new_page: QtGui.QPixmap, rect: QtCore.QRect):
+        self.old_page, self.new_page = old_page, new_page
+        self.progress = 0.0
+        self.setGeometry(rect)
+        self.raise_()
+        self.show()
+        self.animation.start()
+
+    def stop(self):
+        self.animation.stop()
+        self.hide()
+        self.old_page = self.new_page = None
+
+    def set_progress(self, value):
+        self.progress = value
+        self.update()
+
+    def paintEvent(self, event):
+        if self.old_page is None or self.new_page is None:
+            return
+        start = time.perf_counter()
+        painter = QtGui.QPainter(self)
+        painter.drawPixmap(0, 0, self.old_page)
+        painter.setOpacity(self.progress)
+        painter.drawPixmap(0, 0, self.new_page)
+        painter.end()
+        kiosk_metrics.transition.observe(time.perf_counter() - start)
+
+
+@functools.lru_cache(maxsize=16)
+def compile_stylesheet(theme: tuple, font_size, header_font_size, padding) -> str:
+    """
+    Build the application stylesheet for a theme. Cards are styled through their TapCard object name here
+    instead of each getting its own sheet, so Qt parses one sheet per theme rather than one per card.
+
+    Args:
+        theme (tuple): sorted (key, value) pairs of the active theme
+        font_size (float): body font size in pt
+        header_font_size (float): title font size in pt
+        padding (float): window padding
+
+    Returns:
+        str: stylesheet
+    """
+    theme = dict(theme)
+    font_family = theme.get("font-family", "sans-serif")
+    text_color = theme.get("text-color", "#000000")
+    # null when the admin page's field was cleared
+    border_radius = f"{int(theme.get('card-border-radius') or 0) * 16}px"
+    return f"""
+        QWidget {{
+            background-color: {theme.get("bg-color", "#ffffff")};
+            color: {text_color};
+            padding: {padding};
+            font-family: {font_family};
+            font-size:{font_size}pt;
+        }}
+        QLabel#LabTapListName{{
+            font-size:{header_font_size}pt;
+            margin:0,5,0,5px;
+            padding:5px;
+        }}
+        QFrame#TapCard {{
+            background-color: {theme.get("bg-color", "#fff")};
+            border-radius: {border_radius};
+            border: 2px solid {theme.get("card-border-color", "#ccc")};
+            padding: 0px;
+            margin:0px;
+        }}
+        QFrame#TapCard QLabel{{
+            background:transparent;
+            color: {theme.get("text-color", "#000")};
+            font-family: {font_family};
+            font-size: {int(font_size)}pt;
+            margin:0px;
+            padding:0px;
+        }}
+    """
+
+
 class Tap(QtWidgets.QFrame):
-    def __init__(self, tap_data, theme, tap_list=None, width=900, height=240, parent=None):
+    DEFAULT_HEIGHT = 240
+
+    def __init__(self, tap_data, theme, tap_list=None, width=900, height=DEFAULT_HEIGHT, parent=None):
         super().__init__(parent)
         self.tap_data = tap_data
         self.tap_list = tap_list
         self.setObjectName("TapCard")
         self.theme = theme
         self.extra_theme = self.tap_list.widget_data
+        # stable identity used to reuse this card across reloads, set by RotatingTapList
+        self.key = None
+        self._style_key = None
 
         self.main_lay = QtWidgets.QHBoxLayout()
 
@@ -263,13 +1023,9 @@ class Tap(QtWidgets.QFrame):
         self.setSizePolicy(QtWidgets.QSizePolicy.Fixed, QtWidgets.QSizePolicy.Expanding)
         # widgets
         self.font_size = int(self.rem_to_px(self.tap_list.widget_data.get("font-size-body", 18)))
-        self.image_size = int(
-            self.extra_theme.get("imageSize", 150) * self.rem_val(self.tap_list.widget_data.get("font-size-body", 1.2))
-        )
+        self.image_size = label_size(self.tap_list.widget_data)
 
-        self.icon = QtGui.QPixmap(
-            f"/home/pi/taplist-server/public/{tap_data.get('labelLink', 'images/defaultImage.png')}"
-        ).scaled(self.image_size, self.image_size)
+        self.icon = pixmap_cache.get(label_image_path(self.label_link, self.image_size), self.image_size)
         self.lab_icon = QtWidgets.QLabel()
         self.lab_icon.setPixmap(self.icon)
         self.lab_icon.setMinimumSize(self.image_size, self.image_size)
@@ -281,17 +1037,10 @@ class Tap(QtWidgets.QFrame):
         self.lab_desc.setWordWrap(True)
         self.lab_desc.setSizePolicy(QtWidgets.QSizePolicy.Expanding, QtWidgets.QSizePolicy.Expanding)
 
-        self.lab_styleAbv = QtWidgets.QLabel(f'{tap_data.get("style", "Unknown")} • {tap_data.get("abv", 0)}% ABV')
+        self.lab_styleAbv = QtWidgets.QLabel(self.style_abv_text())
         self.lab_styleAbv.setWordWrap(True)
 
-        if tap_data.get("category", "On Tap") != "Coming Soon":
-            added_str = self.tap_list.added_dict.get(self.tap_data.get("containerType", "keg"))
-        else:
-            added_str = "Coming Soon: "
-        dt = datetime.datetime.fromtimestamp(self.tap_data.get("dateAdded", "0") / 1000)
-        formatted = dt.strftime("%d/%m/%Y")
-        packaged = f"{added_str}{formatted}"
-        self.lab_added = QtWidgets.QLabel(packaged)
+        self.lab_added = QtWidgets.QLabel(self.added_text())
         self.lab_added.setWordWrap(True)
 
         self.main_lay.addWidget(self.lab_icon, alignment=QtCore.Qt.AlignVCenter | QtCore.Qt.AlignTop)
@@ -309,66 +1058,90 @@ class Tap(QtWidgets.QFrame):
     def category(self):
         return self.tap_data.get("category", "Unknown")
 
+    @property
+    def label_link(self):
+        return self.tap_data.get("labelLink", "images/defaultImage.png")
+
+    def style_abv_text(self):
+        return f'{self.tap_data.get("style", "Unknown")} • {self.tap_data.get("abv", 0)}% ABV'
+
+    def added_text(self):
+        coming_soon = self.tap_data.get("category", "On Tap") == "Coming Soon"
+        if not coming_soon:
+            added_str = self.tap_list.added_dict.get(self.tap_data.get("containerType", "keg"))
+        else:
+            added_str = "Coming Soon: "
+        # the server validates dateAdded, but a hand-edited file can still hold anything
+        date_added = self.tap_data.get("dateAdded")
+        try:
+            if isinstance(date_added, bool) or not isinstance(date_added, (int, float)):
+                raise ValueError(date_added)
+            formatted = datetime.datetime.fromtimestamp(date_added / 1000).strftime("%d/%m/%Y")
+        except (OverflowError, OSError, ValueError):
+            return "Coming Soon" if coming_soon else ""
+        return f"{added_str}{formatted}"
+
+    def update_data(self, tap_data, theme):
+        """
+        Point this card at new data for the same tap, only touching the labels that changed
+
+        Args:
+            tap_data (dict): the tap's new data
+            theme (dict): active theme
+        """
+        old_data = self.tap_data
+        self.tap_data = tap_data
+        self.theme = theme
+        self.extra_theme = self.tap_list.widget_data
+        if tap_data == old_data:
+            return
+
+        for label, text in (
+            (self.lab_brewName, tap_data.get("brewName", "Unset")),
+            (self.lab_desc, tap_data.get("description", "Order and find out!")),
+            (self.lab_styleAbv, self.style_abv_text()),
+            (self.lab_added, self.added_text()),
+        ):
+            if label.text() != text:
+                label.setText(text)
+
+        if self.label_link != old_data.get("labelLink", "images/defaultImage.png"):
+            self.refresh_icon()
+
+    def refresh_icon(self):
+        """Show whatever image labelLink points at now, if that isn't what we show already"""
+        icon = pixmap_cache.get(label_image_path(self.label_link, self.image_size), self.image_size)
+        if icon is not self.icon:
+            self.icon = icon
+            self.lab_icon.setPixmap(self.icon)
+
     def set_style(self):
         self.font_size = int(self.rem_to_px(self.tap_list.widget_data.get("font-size-body", 18)))
-        self.image_size = int(
-            self.extra_theme.get("imageSize", 150) * self.rem_val(self.tap_list.widget_data.get("font-size-body", 1.2))
-        )
+        self.image_size = label_size(self.tap_list.widget_data)
 
-        if not self.icon:
-            self.icon = QtGui.QPixmap(
-                f"/home/pi/taplist-server/public/{self.tap_data.get('labelLink', 'images/defaultImage.png')}"
-            ).scaled(self.image_size, self.image_size)
-        else:
-            self.icon = self.icon.scaled(self.image_size, self.image_size)
-        border_radius = f"{int(self.theme.get('card-border-radius', 0)) * 16}px"
-        font_family = self.theme.get("font-family", "sans-serif")
-        bg_color = self.theme.get("bg-color", "#fff")
-        text_color = self.theme.get("text-color", "#000")
-        border_color = self.theme.get("card-border-color", "#ccc")
+        # the stylesheet itself is shared (see compile_stylesheet), a card only has its size and label to set
+        style_key = (self._width, self._height, self.image_size)
+        if style_key == self._style_key:
+            return
+        self._style_key = style_key
+
+        self.icon = pixmap_cache.get(label_image_path(self.label_link, self.image_size), self.image_size)
+        self.lab_icon.setPixmap(self.icon)
         self.setMaximumSize(QtCore.QSize(int(self._width), int(self._height)))
         self.setMinimumSize(QtCore.QSize(int(self._width), int(self._height)))
 
-        self.setStyleSheet(
-            f"""
-            QFrame#TapCard {{
-                background-color: {bg_color};
-                border-radius: {border_radius};
-                border: 2px solid {border_color};
-                padding: 0px;
-                margin:0px;
-                min-width: {self._width}px;
-
-            }}
-            QLabel{{
-                background:transparent;
-                color: {text_color};
-                font-family: {font_family};
-                font-size: {self.font_size}pt;
-                margin:0px;
-                padding:0px;
-            }}
-
-        """
-        )
-
     # --- THEME HANDLING ---
     def rem_to_px(self, val):
         if isinstance(val, str) and val.endswith("rem"):
             return float(val[:-3]) * 16
         return val
 
-    def rem_val(self, val):
-        if isinstance(val, str) and val.endswith("rem"):
-            return float(val[:-3])
-        return val
-
 
 class RotatingTapList(QtWidgets.QMainWindow):
     def __init__(self, widget_data_file, screen):
+        started = time.perf_counter()
         super().__init__()
         self.setWindowFlags(QtCore.Qt.FramelessWindowHint)
-        self.showFullScreen()
 
         # hide the mouse cursor
         transparent_pixmap = QtGui.QPixmap(16, 16)
@@ -379,14 +1152,28 @@ class RotatingTapList(QtWidgets.QMainWindow):
         self.screen_size = screen.size()
         self.widget_data_file = widget_data_file
         self.widget_data = None
-        self.max_shown = None
+        self.widget_data_text = ""
+        self.pages = []
         self.all_widgets = []
         self.curr_widgets = []
+        self.batch_index = 0
+        self.next_index = 0
+        # start -> end of each startup phase, reported once every card is built
+        self.started = started
+        self.startup = {}
+        # our own clock until the server's answers, see on_clock_synced
+        self.clock_offset, self.epoch = 0, 0
+        self.clock_sync = ClockSync(self)
+        self.clock_sync.synced.connect(self.on_clock_synced)
+        self.due = 0
+        mark = time.perf_counter()
         self.load_taplist_data()
-        self.interval = self.widget_data.get("fadeTime", 15000)
-        self.tap_width = self.widget_data.get("card-min-width", 700)
+        self.startup["load"] = time.perf_counter() - mark
+        self.interval = fade_time(self.widget_data)
+        self.tap_width = self.widget_data.get("card-min-width") or 700
         self.theme_name = self.widget_data.get("activeTheme", "dark")
-        self.theme = self.widget_data.get("themes", {}).get(self.theme_name)
+        # a remote kiosk starts with no taplist at all until its first sync
+        self.theme = self.widget_data.get("themes", {}).get(self.theme_name) or {}
         self.added_dict = {
             "can": "Canned on: ",
             "keg": "Kegged on: ",
@@ -413,19 +1200,109 @@ class RotatingTapList(QtWidgets.QMainWindow):
         self.setCentralWidget(central)
         self.fade_out_group = None
         self.fade_in_group = None
-        # Timer
+        # Crossfade page flips: the next page is rendered offscreen in `staging` while the current one is up,
+        # and the live cards are only swapped in once the overlay has faded to it
+        self.transition = TRANSITION
+        self.crossfade = CrossfadeOverlay(central)
+        self.crossfade.finished.connect(self.on_crossfade_done)
+        self.staging = QtWidgets.QWidget(self, QtCore.Qt.Window)
+        self.staging.setAttribute(QtCore.Qt.WA_DontShowOnScreen, True)
+        self.staging.setAttribute(QtCore.Qt.WA_StyledBackground, True)
+        self.staging_layout = FlowLayout()
+        self.staging_layout.setContentsMargins(0, 0, 0, 0)
+        # sized by render_page to match the card area, never by its contents
+        self.staging_layout.setSizeConstraint(QtWidgets.QLayout.SetNoConstraint)
+        self.staging.setLayout(self.staging_layout)
+        # (page index, card area size) and the pixmap rendered for it
+        self.prerendered = (None, None)
+        self.prerender_timer = QtCore.QTimer(self)
+        self.prerender_timer.setSingleShot(True)
+        self.prerender_timer.setInterval(500)
+        self.prerender_timer.timeout.connect(self.prerender_next_page)
+        # Timer, re-armed for each page boundary of the shared rotation clock
         self.timer = QtCore.QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setTimerType(QtCore.Qt.PreciseTimer)
         self.timer.timeout.connect(self.next_batch)
-        # File watcher
-        self.file_watcher = QtCore.QFileSystemWatcher([self.widget_data_file])
+        # File watcher. One save can fire it several times, so changes restart a short timer and the widgets
+        # are only rebuilt once it runs out
+        self.file_watcher = QtCore.QFileSystemWatcher()
+        if os.path.exists(self.widget_data_file):
+            self.file_watcher.addPath(self.widget_data_file)
         self.file_watcher.fileChanged.connect(self.on_file_changed)
-        # Setup widgets
-        self.setup_widgets()
-        self.timer.start(self.interval)
+        self.reload_timer = QtCore.QTimer(self)
+        self.reload_timer.setSingleShot(True)
+        self.reload_timer.setInterval(200)
+        self.reload_timer.timeout.connect(self.reload_if_changed)
+        # A label re-uploaded under its old name only changes images/index.json, which the server replaces
+        # atomically, so watch the folder it is replaced in
+        images_dir = os.path.join(os.path.dirname(self.widget_data_file), "images")
+        if os.path.isdir(images_dir):
+            self.file_watcher.addPath(images_dir)
+        self.file_watcher.directoryChanged.connect(lambda _: self.labels_timer.start())
+        self.labels_timer = QtCore.QTimer(self)
+        self.labels_timer.setSingleShot(True)
+        self.labels_timer.setInterval(200)
+        self.labels_timer.timeout.connect(self.refresh_labels)
+        # Cards off the page being shown are built a few at a time whenever the event loop is idle
+        self.unbuilt = []
+        self.build_timer = QtCore.QTimer(self)
+        self.build_timer.setInterval(0)
+        self.build_timer.timeout.connect(self.build_some_cards)
+        # Render metrics, written out now and then rather than on every frame
+        self.metrics_timer = QtCore.QTimer(self)
+        self.metrics_timer.setInterval(15000)
+        self.metrics_timer.timeout.connect(lambda: kiosk_metrics.write(METRICS_PATH))
+        if METRICS_PATH:
+            self.metrics_timer.start()
+        # Setup widgets: only the page on screen now, the data is already loaded
+        mark = time.perf_counter()
+        self.setup_widgets(load=False)
+        self.schedule_next_batch()
+        self.startup["first_page"] = time.perf_counter() - mark
+        # the title paints in every frame, so its first paint is the first frame
+        self.lab_taplistName.installEventFilter(self)
+        self.showFullScreen()
+        self.clock_sync.start()
+
+    def on_clock_synced(self, clock):
+        """
+        The server's clock is in: time page flips by it from now on. The page up now stays until the next
+        flip, which lands on whatever page the other displays show then.
+        """
+        self.clock_offset, self.epoch = clock
+        self.schedule_next_batch()
+
+    def server_now(self) -> float:
+        """Current time in ms on the server's clock"""
+        return time.time() * 1000 + self.clock_offset
+
+    def page_at(self, time_ms) -> int:
+        """Page every display shows at time_ms"""
+        if not self.pages:
+            return 0
+        return int((time_ms - self.epoch) // self.interval) % len(self.pages)
+
+    def schedule_next_batch(self):
+        """Arm the timer for the next page boundary"""
+        now = self.server_now()
+        self.due = self.epoch + ((now - self.epoch) // self.interval + 1) * self.interval
+        self.timer.start(max(0, int(self.due - now)))
 
     def load_taplist_data(self):
-        """Get taplist.json data"""
-        self.widget_data = json.loads(Path(self.widget_data_file).read_text())
+        """Get taplist.json data, keeping what we had if the file doesn't parse (or isn't there yet)"""
+        try:
+            text = Path(self.widget_data_file).read_bytes()
+            data = parse_json(text)
+        except (OSError, ValueError) as e:
+            print(f"Could not read {self.widget_data_file}: {e}", file=sys.stderr)
+            text, data = b"", None
+        if not isinstance(data, dict):
+            if self.widget_data is not None:
+                return
+            data = {"taps": []}
+        self.widget_data_text = text
+        self.widget_data = data
 
     def rem_to_px(self, val):
         """approx rem to px values
@@ -442,92 +1319,172 @@ class RotatingTapList(QtWidgets.QMainWindow):
 
     def setup_theme(self):
         """make sure theme values are setup"""
-        self.theme = self.widget_data.get("themes", {}).get(self.theme_name)
-        font_family = self.theme.get("font-family", "sans-serif")
-        bg_color = self.theme.get("bg-color", "#ffffff")
-        text_color = self.theme.get("text-color", "#000000")
-        font_size = f"{self.rem_to_px(self.widget_data.get('font-size-body', 18))}"
+        self.theme_name = self.widget_data.get("activeTheme", "dark")
+        self.theme = self.widget_data.get("themes", {}).get(self.theme_name) or {}
+        font_size = self.rem_to_px(self.widget_data.get("font-size-body", 18))
         padding = self.rem_to_px(self.theme.get("card-padding", "1rem"))
         self.card_gap = self.rem_to_px(self.theme.get("card-gap", "1.5rem"))
         self.header_font_size = self.rem_to_px(self.widget_data.get("font-size-header", 30))
-        self.setStyleSheet(
-            f"""
-            QWidget {{
-                background-color: {bg_color};
-                color: {text_color};
-                padding: {padding};
-                font-family: {font_family};
-                font-size:{font_size}pt;
-            }}
-            QLabel#LabTapListName{{
-                font-size:{self.header_font_size}pt;
-                margin:0,5,0,5px;
-                padding:5px;
-            }}
-        """
-        )
+        stylesheet = compile_stylesheet(tuple(sorted(self.theme.items())), font_size, self.header_font_size, padding)
+        # one application-wide sheet, so only an actual theme change costs a style pass
+        app = QtWidgets.QApplication.instance()
+        if app.styleSheet() != stylesheet:
+            app.setStyleSheet(stylesheet)
         self.flow_layout.setSpacing(int(self.card_gap))
+        self.staging_layout.setSpacing(int(self.card_gap))
         self.lab_taplistName.setText(self.widget_data.get("title", "Tap List"))
 
-    def setup_widgets(self):
-        """Create widgetse and make sure data is updated"""
+    @staticmethod
+    def tap_key(tap, index):
+        """Stable identity for a tap across reloads (admin assigns ids, fall back to position for hand edits)"""
+        return tap.get("id", f"index-{index}")
+
+    def setup_widgets(self, load=True):
+        """
+        Make the Tap widgets match the current data. Cards for taps that are still there are kept and only
+        have their changed labels updated, removed ones are deleted, and the rotation stays on the page it was
+        showing. New taps only get a card right away if they are on that page; the rest are built while the
+        kiosk is idle, or when their page comes up, whichever is first.
+
+        Args:
+            load (bool, optional): read taplist.json first. Defaults to True.
+        """
+        start = time.perf_counter()
+        try:
+            self._setup_widgets(load)
+        finally:
+            kiosk_metrics.setup.observe(time.perf_counter() - start)
+
+    def _setup_widgets(self, load):
         self.stop_animations()
-        self.load_taplist_data()
+        # whatever was rendered ahead may show cards that are about to change
+        self.prerendered = (None, None)
+        if load:
+            self.load_taplist_data()
         self.setup_theme()
-        self.interval = self.widget_data.get("fadeTime", 15000)
-        self.tap_width = self.widget_data.get("card-min-width", 700)
+        interval = fade_time(self.widget_data)
+        self.tap_width = self.widget_data.get("card-min-width") or 700
         self.theme_name = self.widget_data.get("activeTheme", "dark")
-        self.theme = self.widget_data.get("themes", {}).get(self.theme_name)
+        self.theme = self.widget_data.get("themes", {}).get(self.theme_name) or {}
         self.card_padding = self.rem_to_px(self.theme.get("card-padding", 1))
-        taps = self.widget_data.get("taps", [])
-        self.lab_taplistName = QtWidgets.QLabel(self.widget_data.get("title", "What's on Tap"))
-
-        self.max_shown = None
-
-        if self.all_widgets:
-            for widget in self.all_widgets:
-                widget.setVisible(False)
-                widget.setParent(None)
-                widget.deleteLater()
-
-        # Create new Tap widgets
-        self.all_widgets = [Tap(tap, self.theme, tap_list=self, width=self.tap_width, parent=self) for tap in taps]
+        taps = self.taps = self.widget_data.get("taps", [])
+
+        existing = {widget.key: widget for widget in self.all_widgets if widget is not None}
+        # None stands in for a card that hasn't been built yet
+        widgets = []
+        for index, tap in enumerate(taps):
+            widget = existing.pop(self.tap_key(tap, index), None)
+            if widget is not None:
+                widget.update_data(tap, self.theme)
+            widgets.append(widget)
+
+        # whatever is left was removed from the taplist
+        for widget in existing.values():
+            widget.setVisible(False)
+            widget.setParent(None)
+            widget.deleteLater()
+        self.all_widgets = widgets
+
+        self.unbuilt = []
+        self.build_timer.stop()
         if not len(self.all_widgets):
+            self.curr_widgets = []
+            self.pages = []
+            while self.flow_layout.count():
+                self.flow_layout.takeAt(0)
+            self.startup_done()
             return
 
-        if not self.max_shown:
-            self.all_widgets[0].show()
-            self.max_widgets_wide = math.floor(self.screen_size.width() / (self.all_widgets[0].width() - self.card_gap))
-            self.max_widgets_high = math.floor(
-                (self.screen_size.height() / (self.all_widgets[0].height() + (self.card_gap) + self.header_font_size))
-            )
-
-            self.max_shown = int(self.max_widgets_high * self.max_widgets_wide)
+        # page through a plain grid; worked out here rather than asked of the server, so a reload never waits on
+        # the network
+        self.max_widgets_wide = max(1, math.floor(self.screen_size.width() / (self.tap_width - self.card_gap)))
+        self.max_widgets_high = max(
+            1,
+            math.floor(self.screen_size.height() / (Tap.DEFAULT_HEIGHT + self.card_gap + self.header_font_size)),
+        )
+        per_page = self.max_widgets_wide * self.max_widgets_high
+        indexes = list(range(len(self.all_widgets)))
+        self.pages = [indexes[start : start + per_page] for start in range(0, len(indexes), per_page)]
 
         # set tap widths = so they still fill screen, but could potentially have more than 2 etc. per row
         if math.floor(self.max_widgets_high) == 1:
-            for wid in self.all_widgets:
-                wid._width = self.screen_size.width() - 3
-                wid.set_style()
+            self.card_size = (self.screen_size.width() - 3, None)
         else:
-            for wid in self.all_widgets:
-                wid._width = (self.screen_size.width() / self.max_widgets_wide) - self.card_gap
-                wid._height = (self.screen_size.height() / self.max_widgets_high) - (
-                    (self.card_gap) + (self.header_font_size)
-                )
-                # print(wid._width, wid._height)
-                wid.set_style()
+            self.card_size = (
+                (self.screen_size.width() / self.max_widgets_wide) - self.card_gap,
+                (self.screen_size.height() / self.max_widgets_high) - ((self.card_gap) + (self.header_font_size)),
+            )
+        for wid in self.all_widgets:
+            if wid is not None:
+                self.size_card(wid)
+
+        # show whichever page the shared clock is on
+        if interval != self.interval:
+            self.interval = interval
+            self.schedule_next_batch()
+        self.batch_index = self.page_at(self.server_now())
+        self.show_current_batch(fade_in=False)
+
+        # then the cards of the pages after it, in the order they will come up
+        for offset in range(1, len(self.pages)):
+            page = self.pages[(self.batch_index + offset) % len(self.pages)]
+            self.unbuilt.extend(index for index in page if self.all_widgets[index] is None)
+        if self.unbuilt:
+            self.build_timer.start()
+        else:
+            self.startup_done()
+
+    def size_card(self, wid):
+        width, height = self.card_size
+        wid._width = width
+        if height is not None:
+            wid._height = height
+        wid.set_style()
+
+    def card(self, index) -> "Tap":
+        """The card for tap `index`, built now if it hasn't been yet"""
+        wid = self.all_widgets[index]
+        if wid is None:
+            tap = self.taps[index]
+            wid = Tap(tap, self.theme, tap_list=self, width=self.tap_width, parent=self)
+            wid.key = self.tap_key(tap, index)
+            self.size_card(wid)
+            self.all_widgets[index] = wid
+        return wid
+
+    def build_some_cards(self, budget=0.005):
+        """Build waiting cards for about `budget` seconds, so the event loop is never held up for long"""
+        deadline = time.perf_counter() + budget
+        while self.unbuilt and time.perf_counter() < deadline:
+            self.card(self.unbuilt.pop(0))
+        if not self.unbuilt:
+            self.build_timer.stop()
+            self.startup_done()
 
-        self.batch_index = 0
-        self.show_current_batch()
-        self.timer.setInterval(self.interval)
+    def eventFilter(self, obj, event):
+        if obj is self.lab_taplistName and event.type() == QtCore.QEvent.Paint:
+            self.lab_taplistName.removeEventFilter(self)
+            self.startup["first_frame"] = time.perf_counter() - self.started
+            self.startup_done()
+        return super().eventFilter(obj, event)
+
+    def startup_done(self):
+        """Report how long startup took, once the first frame is up and every card is built"""
+        if self.started is None or "first_frame" not in self.startup or self.unbuilt:
+            return
+        self.startup["all_cards"] = time.perf_counter() - self.started
+        self.started = None
+        kiosk_metrics.startup = {phase: round(seconds, 4) for phase, seconds in self.startup.items()}
+        report = ", ".join(f"{phase.replace('_', ' ')} {seconds * 1000:.0f}ms" for phase, seconds in self.startup.items())
+        print(f"Startup: {report}", file=sys.stderr)
 
-    def show_current_batch(self, animated=True):
+    def show_current_batch(self, animated=True, fade_in=True):
         """If animating (e.g. we have more widgets than can be displayed in one screen) handle removing the
         current widgets from the flowlayout and then fade in the next ones
 
         Args:
             animated (bool, optional): whether we should animate or not. Defaults to True.
+            fade_in (bool, optional): fade the batch in, or just put it in place (after a data reload). Defaults to True.
         """
         if not animated:
             return
@@ -537,16 +1494,17 @@ class RotatingTapList(QtWidgets.QMainWindow):
             w = item.widget()
             if w:
                 w.setParent(None)
-        # Determine batch
-        start = self.batch_index * self.max_shown
-        end = start + self.max_shown
-        self.curr_widgets = self.all_widgets[start:end]
-        # If empty, cycle back
-        if not self.curr_widgets:
+        # Determine batch, cycling back after the last page
+        if self.batch_index >= len(self.pages):
             self.batch_index = 0
-            start = 0
-            end = self.max_shown
-            self.curr_widgets = self.all_widgets[start:end]
+        self.curr_widgets = [self.card(index) for index in self.pages[self.batch_index]]
+        if not fade_in:
+            for w in self.curr_widgets:
+                # drop any half-finished fade so the card is fully visible
+                w.setGraphicsEffect(None)
+                self.flow_layout.addWidget(w)
+            self.prerender_timer.start()
+            return
         # Add with opacity 0
         for w in self.curr_widgets:
             w.setWindowOpacity(0)
@@ -568,13 +1526,19 @@ class RotatingTapList(QtWidgets.QMainWindow):
 
     def next_batch(self):
         """if we have widgets, fade out current ones"""
+        self.next_index = self.page_at(self.due)
+        self.schedule_next_batch()
         if not self.curr_widgets:
             return
 
-        if len(self.all_widgets) <= self.max_shown:
+        if len(self.pages) <= 1 or self.next_index == self.batch_index:
             self.show_current_batch(animated=False)
             return
 
+        if self.transition == "crossfade":
+            self.crossfade_to_next()
+            return
+
         self.fade_out_group = QtCore.QParallelAnimationGroup(self)
         for w in self.curr_widgets:
             effect = w.graphicsEffect()
@@ -597,11 +1561,83 @@ class RotatingTapList(QtWidgets.QMainWindow):
             w = item.widget()
             if w:
                 w.setParent(None)
-        self.batch_index += 1
+        self.batch_index = self.next_index
         self.fade_out_group = None
         self.show_current_batch()
 
+    def card_area(self) -> QtCore.QRect:
+        """Where the cards go in the central widget: below the title, down to the bottom of the window"""
+        top_left = self.flow_layout.geometry().topLeft()
+        return QtCore.QRect(top_left, self.centralWidget().rect().bottomRight())
+
+    def render_page(self, index) -> QtGui.QPixmap:
+        """
+        Paint page `index` offscreen, laid out exactly as it will be on screen
+
+        Its cards are borrowed by the hidden staging widget for the render and handed back parentless, which is
+        how cards off the current page always are.
+        """
+        area = self.card_area()
+        for w in (self.card(i) for i in self.pages[index]):
+            w.setGraphicsEffect(None)
+            self.staging_layout.addWidget(w)
+        self.staging.resize(area.size())
+        # shown but never on screen, so styles are polished and the layout runs
+        self.staging.show()
+        self.staging_layout.activate()
+        pixmap = self.staging.grab()
+        self.staging.hide()
+        while self.staging_layout.count():
+            item = self.staging_layout.takeAt(0)
+            if item.widget():
+                item.widget().setParent(None)
+        return pixmap
+
+    def prerender_next_page(self):
+        """Render the page coming up next while this one is just sitting there"""
+        if self.transition != "crossfade" or len(self.pages) <= 1 or self.crossfade.isVisible():
+            return
+        index = self.page_at(self.due)
+        key = (index, self.card_area().size())
+        if index == self.batch_index or self.prerendered[0] == key:
+            return
+        self.prerendered = (key, self.render_page(index))
+
+    def crossfade_to_next(self):
+        """Flip pages by fading a pixmap of this page into one of the next, then swap the live cards"""
+        self.prerender_timer.stop()
+        # cards a rebuild just put in place are only shown by a queued event; let it run now, or it would show
+        # them as windows of their own once they are taken out below
+        for w in self.curr_widgets:
+            QtCore.QCoreApplication.sendPostedEvents(w, QtCore.QEvent.MetaCall)
+        self.main_lay.activate()
+        area = self.card_area()
+        old_page = self.centralWidget().grab(area)
+        key, new_page = self.prerendered
+        if key != (self.next_index, area.size()):
+            # not rendered ahead (a reload just happened, or the clock jumped pages)
+            new_page = self.render_page(self.next_index)
+        self.prerendered = (None, None)
+        # the overlay shows the old page from here on, so the live cards can go
+        while self.flow_layout.count():
+            item = self.flow_layout.takeAt(0)
+            if item.widget():
+                item.widget().setParent(None)
+        self.crossfade.start(old_page, new_page, area)
+
+    def on_crossfade_done(self):
+        self.batch_index = self.next_index
+        self.show_current_batch(fade_in=False)
+        # show and lay out the cards now rather than on a queued event, so the frame after the overlay goes
+        # already has them in place
+        for w in self.curr_widgets:
+            w.show()
+        self.main_lay.activate()
+        self.crossfade.stop()
+
     def stop_animations(self):
+        if self.crossfade.isVisible():
+            self.crossfade.stop()
         if self.fade_out_group:
             self.fade_out_group.clear()
             self.fade_out_group = None
@@ -610,8 +1646,28 @@ class RotatingTapList(QtWidgets.QMainWindow):
             self.fade_in_group = None
 
     def on_file_changed(self):
+        # the server saves by atomically replacing taplist.json, which drops the file from the watcher
+        if self.widget_data_file not in self.file_watcher.files() and os.path.exists(self.widget_data_file):
+            self.file_watcher.addPath(self.widget_data_file)
+        self.reload_timer.start()
+
+    def refresh_labels(self):
+        """Label images changed behind unchanged labelLinks (re-uploaded under the same name)"""
+        for widget in self.all_widgets:
+            if widget is not None:
+                widget.refresh_icon()
+        self.prerendered = (None, None)
+
+    def reload_if_changed(self):
+        """Rebuild for a settled file change, unless the file ended up with the contents we already show"""
+        try:
+            text = Path(self.widget_data_file).read_bytes()
+        except FileNotFoundError:
+            return
+        if text == self.widget_data_text:
+            return
         self.stop_animations()
-        QtCore.QTimer.singleShot(200, self.setup_widgets)
+        self.setup_widgets()
 
 
 class EscapeFilter(QtCore.QObject):
@@ -623,12 +1679,35 @@ class EscapeFilter(QtCore.QObject):
 
 
 def main():
-    app = QtWidgets.QApplication(sys.argv)
+    global PUBLIC_DIR, SERVER_URL
+    parser = argparse.ArgumentParser(description="MeadTools taplist kiosk")
+    parser.add_argument(
+        "--server",
+        help="show the taplist of the server at this URL (e.g. http://taplist.local:5000) rather than the local "
+        "files, from a copy kept in --cache-dir",
+    )
+    parser.add_argument("--cache-dir", default=CACHE_DIR, help="where --server's copy is kept")
+    parser.add_argument("--public-dir", default=PUBLIC_DIR, help="the local server's public/ folder")
+    args, qt_args = parser.parse_known_args()
+
+    app = QtWidgets.QApplication(sys.argv[:1] + qt_args)
     app.setOverrideCursor(QtGui.QCursor(QtCore.Qt.BlankCursor))
     escape_filter = EscapeFilter()
     app.installEventFilter(escape_filter)
     screen = app.primaryScreen()
-    win = RotatingTapList("/home/pi/taplist-server/public/taplist.json", screen)
+    sync = None
+    PUBLIC_DIR = args.public_dir
+    if args.server:
+        SERVER_URL = args.server.rstrip("/")
+        PUBLIC_DIR = args.cache_dir
+        # start from the copy from last time, or an empty taplist on the very first start, while the sync
+        # thread fetches the server's
+        sync = SnapshotSync(SERVER_URL, args.cache_dir)
+    win = RotatingTapList(f"{PUBLIC_DIR}/taplist.json", screen)
+    if sync is not None:
+        sync.taplist_changed.connect(win.on_file_changed)
+        sync.images_changed.connect(win.refresh_labels)
+        sync.start()
     win.show()
     sys.exit(app.exec_())
 
@@ -0,0 +1,10 @@
+"""`python -m server` from the repository root: runs server.py as if started from this directory."""
+import os
+import runpy
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# server.py imports its sibling modules by plain name
+sys.path.insert(0, HERE)
+runpy.run_path(os.path.join(HERE, "server.py"), run_name="__main__")
@@ -0,0 +1,117 @@
+"""Precompressed responses: static bundles once at startup, the taplist once per version."""
+import functools
+import gzip
+import hashlib
+import os
+import threading
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+# Text assets worth compressing; images are already compressed formats
+COMPRESSIBLE = {".html", ".js", ".css", ".json", ".svg", ".txt", ".map"}
+
+# Bodies smaller than this aren't worth the Content-Encoding overhead
+MIN_SIZE = 512
+
+
+def available_encodings() -> list:
+    """Encodings we can produce, best first"""
+    return ["br", "gzip"] if brotli is not None else ["gzip"]
+
+
+def negotiate(accept_encodings, size=None):
+    """
+    Pick the encoding to send
+
+    Args:
+        accept_encodings (werkzeug.datastructures.Accept): the request's parsed Accept-Encoding header
+        size (int): length of the uncompressed body, if not already known to be worth compressing
+
+    Returns:
+        str | None: "br", "gzip", or None to send the body as-is
+    """
+    if size is not None and size < MIN_SIZE:
+        return None
+    for encoding in available_encodings():
+        if accept_encodings[encoding] > 0:
+            return encoding
+    return None
+
+
+@functools.lru_cache(maxsize=8)
+def compress(body: bytes, encoding: str) -> bytes:
+    """
+    Compress body, remembering the last few results
+
+    The taplist Snapshot keeps the same bytes object for as long as its version is current, and bytes cache their
+    hash, so repeat lookups for the current document are cheap and it is only compressed once per version.
+    """
+    if encoding == "br":
+        return brotli.compress(body, quality=11)
+    return gzip.compress(body, compresslevel=9, mtime=0)
+
+
+class StaticCache:
+    """
+    Compressed copies of the text files in the static folder.
+
+    Everything compressible is encoded with every available encoding by warm() at startup, so requests just
+    pick the cached bytes. Entries are keyed by path and checked against the file's mtime, so a file replaced
+    on disk (an update, or tsc --watch during development) is recompressed on its next request.
+    """
+
+    def __init__(self, root, skip=("images", "taplist.json")):
+        self.root = os.path.abspath(root)
+        self.skip = tuple(os.path.join(self.root, name) for name in skip)
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def compressible(self, path) -> bool:
+        return os.path.splitext(path)[1].lower() in COMPRESSIBLE and not path.startswith(self.skip)
+
+    def warm(self):
+        """Compress every eligible file under root"""
+        for directory, dirs, files in os.walk(self.root):
+            if directory.startswith(self.skip):
+                dirs.clear()
+                continue
+            for name in files:
+                path = os.path.join(directory, name)
+                if self.compressible(path):
+                    self.get(path)
+
+    def get(self, path):
+        """
+        Cached encodings of one file
+
+        Returns:
+            dict | None: {"etag", "mtime", "modified", "encodings": {encoding: bytes}}, or None if the file is missing,
+                not compressible or too small to bother
+        """
+        path = os.path.abspath(path)
+        if not self.compressible(path):
+            return None
+        try:
+            stat = os.stat(path)
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+        entry = self._entries.get(path)
+        if entry is not None and entry["mtime"] == stat.st_mtime_ns:
+            return entry
+        if stat.st_size < MIN_SIZE:
+            return None
+
+        with open(path, "rb") as f:
+            body = f.read()
+        entry = {
+            "etag": hashlib.sha1(body).hexdigest(),
+            "mtime": stat.st_mtime_ns,
+            "modified": stat.st_mtime,
+            "encodings": {encoding: compress.__wrapped__(body, encoding) for encoding in available_encodings()},
+        }
+        with self._lock:
+            self._entries[path] = entry
+        return entry
@@ -0,0 +1,94 @@
+"""Server-Sent Events fan-out so displays hear about changes without polling."""
+import json
+import queue
+import threading
+
+
+def format_event(event, data):
+    """Encode one SSE frame"""
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+class EventBroker:
+    """
+    Fan published events out to every connected /events client.
+
+    Each client gets its own small bounded queue. A client that stops reading never blocks a publisher: its
+    oldest pending message is dropped instead, since only the newest version matters to a display. Idle
+    streams send a heartbeat comment so dead connections are noticed and their threads released, and the
+    number of concurrent listeners is capped so streams can't take every worker thread.
+    """
+
+    def __init__(self, max_clients=32, queue_size=8, heartbeat=15.0):
+        self.max_clients = max_clients
+        self.queue_size = queue_size
+        self.heartbeat = heartbeat
+        self._clients = set()
+        self._lock = threading.Lock()
+
+    @property
+    def client_count(self) -> int:
+        """How many listeners are connected right now"""
+        return len(self._clients)
+
+    def subscribe(self):
+        """
+        Register a new listener
+
+        Returns:
+            queue.Queue | None: the client's queue, or None if we are at max_clients
+        """
+        client = queue.Queue(maxsize=self.queue_size)
+        with self._lock:
+            if len(self._clients) >= self.max_clients:
+                return None
+            self._clients.add(client)
+        return client
+
+    def unsubscribe(self, client):
+        with self._lock:
+            self._clients.discard(client)
+
+    def publish(self, event, data):
+        """
+        Queue an event for every listener
+
+        Args:
+            event (str): SSE event name
+            data (dict): JSON-serialisable payload
+        """
+        self.send(None, event, data)
+
+    def send(self, client, event, data):
+        """Queue an event for a single listener (or all of them when client is None)"""
+        message = format_event(event, data)
+        if client is not None:
+            clients = [client]
+        else:
+            with self._lock:
+                clients = list(self._clients)
+        for q in clients:
+            try:
+                q.put_nowait(message)
+            except queue.Full:
+                # slow reader, drop its oldest message rather than block the writer
+                try:
+                    q.get_nowait()
+                except queue.Empty:
+                    pass
+                try:
+                    q.put_nowait(message)
+                except queue.Full:
+                    pass
+
+    def stream(self, client):
+        """Yield SSE frames for one listener until the connection goes away"""
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    yield client.get(timeout=self.heartbeat)
+                except queue.Empty:
+                    yield ": ping\n\n"
+        finally:
+            self.unsubscribe(client)
@@ -0,0 +1,24 @@
+"""JSON through orjson when it is installed, the standard library otherwise."""
+import json
+
+try:
+    import orjson
+except ImportError:  # orjson is optional, several times faster on a Pi but the stdlib gives the same JSON
+    orjson = None
+
+COMPACT = (",", ":")
+
+
+def dumps(obj) -> bytes:
+    """Compact UTF-8 JSON"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=COMPACT).encode("utf-8")
+
+
+def loads(data):
+    """Parse JSON text or UTF-8 bytes"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
@@ -0,0 +1,109 @@
+"""Append-only taplist history in SQLite: periodic full snapshots with JSON Patch deltas in between."""
+import sqlite3
+import threading
+import time
+
+import fastjson
+from patch import apply_patch, diff
+
+
+class TaplistHistory:
+    """
+    Every committed taplist version, so a bad save can be rolled back.
+
+    A version is stored as a full document every `snapshot_every` versions and as the JSON Patch from the
+    version before it otherwise, so most rows are a few hundred bytes and rebuilding any version applies at
+    most snapshot_every - 1 patches. Only the newest `max_versions` (or a few more, so the oldest one kept is
+    always a full snapshot) are retained.
+    """
+
+    def __init__(self, path, snapshot_every=20, max_versions=500):
+        self.snapshot_every = snapshot_every
+        self.max_versions = max_versions
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS versions (
+                version INTEGER PRIMARY KEY,
+                created REAL NOT NULL,
+                full INTEGER NOT NULL,
+                body TEXT NOT NULL
+            )
+            """
+        )
+        # (version, document) of the newest row, what the next delta is taken against
+        self._last = None
+        row = self._db.execute("SELECT version FROM versions ORDER BY version DESC LIMIT 1").fetchone()
+        if row:
+            self._last = (row[0], self._load(row[0]))
+
+    def record(self, version, document, created=None):
+        """
+        Append a version
+
+        Args:
+            version (int): store version number, must be newer than anything recorded
+            document (dict): the taplist at that version
+            created (float, optional): unix time of the change, defaults to now
+        """
+        created = created or time.time()
+        with self._lock:
+            if self._last is not None and (version <= self._last[0] or document == self._last[1]):
+                return
+            deltas = self._db.execute(
+                "SELECT COUNT(*) FROM versions WHERE version > "
+                "(SELECT COALESCE(MAX(version), 0) FROM versions WHERE full = 1)"
+            ).fetchone()[0]
+            full = self._last is None or deltas + 1 >= self.snapshot_every
+            body = document if full else diff(self._last[1], document)
+            self._db.execute(
+                "INSERT INTO versions (version, created, full, body) VALUES (?, ?, ?, ?)",
+                (version, created, int(full), fastjson.dumps(body).decode("utf-8")),
+            )
+            self._last = (version, document)
+            self._prune()
+
+    def versions(self, limit=50, before=None) -> list:
+        """Newest first: [{version, created, full, size}]"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT version, created, full, LENGTH(body) FROM versions WHERE version < ? "
+                "ORDER BY version DESC LIMIT ?",
+                (before if before is not None else 2**63 - 1, limit),
+            ).fetchall()
+        return [
+            {"version": version, "created": int(created * 1000), "full": bool(full), "size": size}
+            for version, created, full, size in rows
+        ]
+
+    def get(self, version):
+        """The document at `version`, or None if it isn't (or is no longer) kept"""
+        with self._lock:
+            return self._load(version)
+
+    def _load(self, version):
+        """Rebuild a version from its snapshot and the deltas after it; caller holds the lock"""
+        rows = self._db.execute(
+            "SELECT version, full, body FROM versions WHERE version <= ? AND version >= "
+            "(SELECT MAX(version) FROM versions WHERE full = 1 AND version <= ?) ORDER BY version",
+            (version, version),
+        ).fetchall()
+        if not rows or rows[-1][0] != version:
+            return None
+        document = fastjson.loads(rows[0][2])
+        for _, _, body in rows[1:]:
+            document = apply_patch(document, fastjson.loads(body))
+        return document
+
+    def _prune(self):
+        """Drop versions past max_versions, keeping a full snapshot as the oldest row; caller holds the lock"""
+        row = self._db.execute(
+            "SELECT MAX(version) FROM versions WHERE full = 1 AND version <= "
+            "(SELECT version FROM versions ORDER BY version DESC LIMIT 1 OFFSET ?)",
+            (self.max_versions - 1,),
+        ).fetchone()
+        if row and row[0] is not None:
+            self._db.execute("DELETE FROM versions WHERE version < ?", (row[0],))
@@ -0,0 +1,457 @@
+"""Label images: content-addressed storage plus small resized variants made in the background."""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import urllib.parse
+from collections import Counter
+
+from jobs import JobQueue
+from store import write_atomic
+
+try:
+    from PIL import Image, ImageOps, features
+except ImportError:  # Pillow is optional, without it we just serve the originals
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+# Longest edge, in px, of each variant we generate
+VARIANT_SIZES = (150, 300, 600)
+
+VARIANT_FORMATS = {
+    "webp": {"format": "WEBP", "quality": 80, "method": 4},
+    "avif": {"format": "AVIF", "quality": 60, "speed": 8},
+}
+
+CHUNK_SIZE = 64 * 1024
+
+# The display falls back to this one, so it is never collected as unused
+DEFAULT_IMAGE = "defaultImage.png"
+
+# Shipped in public/images/ and pointed at by the desktop launchers, so imported as copies and left in place
+BUNDLED_IMAGES = (DEFAULT_IMAGE,)
+
+# What an upload may be called; anything else (an .svg with a script in it, say) is refused
+ALLOWED_EXTENSIONS = {".png", ".jpg", ".jpeg", ".gif", ".webp", ".avif", ".bmp"}
+
+
+class UploadTooLarge(ValueError):
+    """An upload went past the size limit while it was being read"""
+
+
+class InvalidImage(ValueError):
+    """An upload that doesn't decode as an image"""
+
+
+def pick_format(preferred="webp"):
+    """Best variant format this Pillow build can encode, or None if we can't make variants at all"""
+    if Image is None:
+        return None
+    for name in (preferred, "webp"):
+        if name in VARIANT_FORMATS and features.check(name):
+            return name
+    return None
+
+
+def blob_stem(blob: str) -> str:
+    """Content hash part of a blob name"""
+    return os.path.splitext(blob)[0]
+
+
+def probe(path):
+    """(width, height) from an image's header without decoding it, or (None, None)"""
+    if Image is None:
+        return None, None
+    try:
+        with Image.open(path) as img:
+            return img.size
+    except Exception:
+        return None, None
+
+
+def image_usage(taps) -> dict:
+    """
+    Which taps show which image
+
+    Returns:
+        dict: {image name: [tap id, ...]} for labelLinks of the form [.]/images/<name>
+    """
+    usage = {}
+    for index, tap in enumerate(taps):
+        _, found, name = (tap.get("labelLink") or "").partition("images/")
+        if found and name and "/" not in name:
+            usage.setdefault(urllib.parse.unquote(name), []).append(tap.get("id", index))
+    return usage
+
+
+class ImagePipeline:
+    """
+    Turn stored label blobs into a set of size variants.
+
+    Work runs as jobs on a JobQueue (one worker by default) so an upload request returns as soon as the blob is
+    saved and a Pi never decodes more than a photo or two at a time. Variants are re-encoded from the decoded
+    pixels, so they carry none of the original's EXIF data. They are named after the blob's content hash
+    (variants/<size>/<hash>.<ext>), so like the blobs they never change once written.
+    """
+
+    def __init__(
+        self, blob_dir, variant_dir, sizes=VARIANT_SIZES, preferred_format="webp", on_done=None, jobs: JobQueue = None
+    ):
+        self.blob_dir = blob_dir
+        self.variant_dir = variant_dir
+        self.sizes = tuple(sorted(sizes, reverse=True))
+        self.format = pick_format(preferred_format)
+        self.on_done = on_done
+        self._done = set()
+        self._lock = threading.Lock()
+        self.jobs = jobs or JobQueue()
+
+    @property
+    def enabled(self) -> bool:
+        return self.format is not None
+
+    def variant_path(self, blob, size) -> str:
+        return os.path.join(self.variant_dir, str(size), f"{blob_stem(blob)}.{self.format}")
+
+    def variants(self, blob) -> dict:
+        """{size: url} for a blob, empty until its variants have been written"""
+        with self._lock:
+            if blob not in self._done:
+                return {}
+        return {str(size): f"/images/variants/{size}/{blob_stem(blob)}.{self.format}" for size in sorted(self.sizes)}
+
+    def scan(self):
+        """Pick up variants already on disk and queue any blobs that are missing them"""
+        if not self.enabled:
+            return
+        for blob in sorted(os.listdir(self.blob_dir)):
+            if blob.startswith(".") or not os.path.isfile(os.path.join(self.blob_dir, blob)):
+                continue
+            if all(os.path.exists(self.variant_path(blob, size)) for size in self.sizes):
+                with self._lock:
+                    self._done.add(blob)
+            else:
+                self.submit(blob)
+
+    def submit(self, blob):
+        """Queue a blob for processing, returns the Job"""
+        return self.jobs.submit("variants", self.process, blob)
+
+    def remove(self, blob):
+        """Drop the variants of a deleted blob"""
+        with self._lock:
+            self._done.discard(blob)
+        for size in self.sizes:
+            try:
+                os.remove(self.variant_path(blob, size))
+            except FileNotFoundError:
+                pass
+
+    def process(self, blob) -> dict:
+        """
+        Decode a blob and write its variants; runs on a job worker
+
+        Raises:
+            InvalidImage: if Pillow can't decode the blob
+
+        Returns:
+            dict: {size: url} of the variants, empty without Pillow
+        """
+        if not self.enabled:
+            return {}
+        if self.variants(blob):
+            return self.variants(blob)
+        try:
+            with Image.open(os.path.join(self.blob_dir, blob)) as original:
+                # decode once and honour the phone's rotation flag
+                img = ImageOps.exif_transpose(original)
+                img = img.convert("RGBA" if img.mode in ("RGBA", "LA", "P") else "RGB")
+        except (OSError, SyntaxError, ValueError, Image.DecompressionBombError) as e:
+            raise InvalidImage(f"Could not decode {blob}: {e}") from e
+
+        # shrink step by step from the largest size
+        for size in self.sizes:
+            img.thumbnail((size, size), Image.LANCZOS)
+            path = self.variant_path(blob, size)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.tmp"
+            options = dict(VARIANT_FORMATS[self.format])
+            img.save(tmp_path, options.pop("format"), **options)
+            os.replace(tmp_path, path)
+        with self._lock:
+            self._done.add(blob)
+        if self.on_done:
+            self.on_done(blob)
+        return self.variants(blob)
+
+
+class ImageLibrary:
+    """
+    Content-addressed label storage.
+
+    Every upload is stored once as blobs/<sha256>.<ext>, however many names point at it, and index.json maps the
+    names the admin UI shows (and taps reference as /images/<name>) to those blobs. A blob's URL changes whenever
+    its content does, so clients can cache blob and variant URLs forever. Blobs no name refers to any more are
+    deleted along with their variants.
+
+    What the gallery shows about each blob (size, dimensions, when it was added) is kept in meta.json and
+    updated as blobs come and go, so listing the library never touches the blobs themselves.
+
+    A name re-pointed by an upload keeps its previous blob until the upload has been checked, so an upload that
+    turns out not to be an image puts the old label back rather than leaving the name with nothing.
+    """
+
+    def __init__(self, image_dir, pipeline: ImagePipeline = None):
+        self.image_dir = image_dir
+        self.blob_dir = os.path.join(image_dir, "blobs")
+        self.index_path = os.path.join(image_dir, "index.json")
+        self.meta_path = os.path.join(image_dir, "meta.json")
+        self.pipeline = pipeline
+        os.makedirs(self.blob_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        # blobs an upload replaced, kept until its check passes: {blob: uploads waiting}
+        self._held = Counter()
+        try:
+            with open(self.index_path, encoding="utf-8") as f:
+                self._index = json.load(f)
+        except FileNotFoundError:
+            self._index = {}
+        try:
+            with open(self.meta_path, encoding="utf-8") as f:
+                self._meta = json.load(f)
+        except (FileNotFoundError, ValueError):
+            self._meta = {}
+        # blobs stored before meta.json existed
+        missing = set(self._index.values()) - self._meta.keys()
+        for blob in missing:
+            if os.path.exists(self.blob_path(blob)):
+                self._meta[blob] = self._describe(blob)
+        if missing:
+            self._save_meta()
+
+    def blob_path(self, blob) -> str:
+        return os.path.join(self.blob_dir, blob)
+
+    def resolve(self, name):
+        """Blob a name points at, or None"""
+        return self._index.get(name)
+
+    def names(self) -> list:
+        with self._lock:
+            return sorted(self._index)
+
+    def index(self, usage=None) -> dict:
+        """
+        Every stored image
+
+        Args:
+            usage (dict, optional): image_usage() of the current taplist, to report which taps use each image
+
+        Returns:
+            dict: {name: {hash, url, thumbnail, variants, size, width, height, added[, usedBy]}}, sorted by name
+        """
+        with self._lock:
+            items = sorted(self._index.items())
+            meta = dict(self._meta)
+        index = {}
+        for name, blob in items:
+            variants = self.pipeline.variants(blob) if self.pipeline else {}
+            info = meta.get(blob, {})
+            entry = {
+                "hash": blob_stem(blob),
+                "url": f"/images/blobs/{blob}",
+                "thumbnail": variants.get(str(min(VARIANT_SIZES)), f"/images/blobs/{blob}"),
+                "variants": variants,
+                "size": info.get("size"),
+                "width": info.get("width"),
+                "height": info.get("height"),
+                "added": info.get("added"),
+            }
+            if usage is not None:
+                entry["usedBy"] = usage.get(name, [])
+            index[name] = entry
+        return index
+
+    def add(self, name, stream, max_size=None) -> str:
+        """
+        Store an upload and point `name` at it
+
+        Args:
+            name (str): display name, e.g. label.png
+            stream: file-like object to read the image from
+            max_size (int, optional): bytes to accept before giving up
+
+        Raises:
+            UploadTooLarge: if the stream goes past max_size; nothing is stored
+
+        Returns:
+            str: the blob name
+        """
+        return self._store(name, stream, max_size)[0]
+
+    def _store(self, name, stream, max_size=None, hold_previous=False):
+        """
+        add(), optionally holding on to the blob name pointed at before
+
+        Returns:
+            tuple[str, str | None]: the blob, and the previous one if it is held (release it with _release)
+        """
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(prefix=".upload-", dir=self.blob_dir)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in iter(lambda: stream.read(CHUNK_SIZE), b""):
+                    size += len(chunk)
+                    if max_size is not None and size > max_size:
+                        raise UploadTooLarge(f"{name} is larger than {max_size // (1024 * 1024)} MB")
+                    digest.update(chunk)
+                    f.write(chunk)
+            blob = f"{digest.hexdigest()}{os.path.splitext(name)[1].lower()}"
+
+            with self._lock:
+                is_new = not os.path.exists(self.blob_path(blob))
+                if is_new:
+                    os.chmod(tmp_path, 0o644)
+                    os.replace(tmp_path, self.blob_path(blob))
+                    self._meta[blob] = self._describe(blob)
+                previous = self._index.get(name)
+                self._index[name] = blob
+                self._save()
+                if previous == blob:
+                    previous = None
+                orphaned = None
+                if previous and hold_previous:
+                    self._held[previous] += 1
+                elif previous:
+                    orphaned = self._collect(previous)
+                if is_new or orphaned:
+                    self._save_meta()
+        finally:
+            # still here if we already had these exact bytes (or the upload failed)
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+        if self.pipeline and orphaned:
+            self.pipeline.remove(orphaned)
+        return blob, previous if hold_previous else None
+
+    def upload(self, name, stream, max_size=None):
+        """
+        Store an upload and queue its checks and variants
+
+        Returns:
+            Job | None: the processing job, None without a pipeline
+        """
+        if self.pipeline is None:
+            self.add(name, stream, max_size)
+            return None
+        blob, previous = self._store(name, stream, max_size, hold_previous=True)
+        return self.pipeline.jobs.submit("upload", self._process_upload, name, blob, previous)
+
+    def remove(self, name) -> bool:
+        """Forget a name, deleting its blob if nothing else uses it"""
+        return bool(self.remove_many([name]))
+
+    def remove_many(self, names) -> list:
+        """
+        Forget several names with a single index write
+
+        Returns:
+            list[str]: the names that existed and were removed
+        """
+        with self._lock:
+            blobs = {name: self._index.pop(name) for name in names if name in self._index}
+            if not blobs:
+                return []
+            self._save()
+            orphaned = [blob for blob in set(blobs.values()) if self._collect(blob)]
+            if orphaned:
+                self._save_meta()
+        if self.pipeline:
+            for blob in orphaned:
+                self.pipeline.remove(blob)
+        return list(blobs)
+
+    def import_loose_files(self):
+        """
+        Move plain files in images/ (from older installs) into the blob store. Bundled images are copied instead,
+        and only while their name isn't taken, so an upload under the same name wins.
+        """
+        for name in sorted(os.listdir(self.image_dir)):
+            path = os.path.join(self.image_dir, name)
+            if name in ("index.json", "meta.json") or name.startswith(".") or not os.path.isfile(path):
+                continue
+            bundled = name in BUNDLED_IMAGES
+            if bundled and name in self._index:
+                continue
+            with open(path, "rb") as f:
+                self.add(name, f)
+            if not bundled:
+                os.remove(path)
+
+    def _process_upload(self, name, blob, previous=None) -> dict:
+        """
+        Check and resize an upload on a job worker. If it isn't an image, the name goes back to the blob it
+        pointed at before (or away, if it was new).
+        """
+        try:
+            variants = self.pipeline.process(blob)
+        except InvalidImage as e:
+            with self._lock:
+                if self._index.get(name) == blob:
+                    if previous:
+                        self._index[name] = previous
+                    else:
+                        del self._index[name]
+                    self._save()
+            raise InvalidImage(f"{name} is not an image we can read") from e
+        finally:
+            self._release(previous, blob)
+        return {"name": name, "hash": blob_stem(blob), "variants": variants}
+
+    def _release(self, previous, blob):
+        """Stop holding an upload's previous blob, deleting whichever of the two nothing points at any more"""
+        with self._lock:
+            if previous:
+                self._held[previous] -= 1
+                if self._held[previous] <= 0:
+                    del self._held[previous]
+            orphaned = [stored for stored in {previous, blob} - {None} if self._collect(stored)]
+            if orphaned:
+                self._save_meta()
+        for stored in orphaned:
+            self.pipeline.remove(stored)
+
+    def _collect(self, blob):
+        """
+        Delete a blob nothing points at any more; caller holds the lock and saves the metadata after
+
+        Returns:
+            str | None: the blob, if it was deleted
+        """
+        if blob in self._held or blob in self._index.values():
+            return None
+        try:
+            os.remove(self.blob_path(blob))
+        except FileNotFoundError:
+            pass
+        self._meta.pop(blob, None)
+        return blob
+
+    def _describe(self, blob) -> dict:
+        """Metadata for a stored blob"""
+        stat = os.stat(self.blob_path(blob))
+        width, height = probe(self.blob_path(blob))
+        return {"size": stat.st_size, "width": width, "height": height, "added": int(stat.st_mtime * 1000)}
+
+    def _save_meta(self):
+        """Persist blob metadata; caller holds the lock"""
+        write_atomic(self.meta_path, json.dumps(self._meta, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+
+    def _save(self):
+        """Persist the index; caller holds the lock"""
+        write_atomic(self.index_path, json.dumps(self._index, ensure_ascii=False, indent=1).encode("utf-8"))
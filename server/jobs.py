@@ -0,0 +1,120 @@
+"""Background jobs on a small, low-priority thread pool, with status kept for polling."""
+import contextlib
+import logging
+import os
+import secrets
+import threading
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class Job:
+    """One unit of background work and what became of it"""
+
+    def __init__(self, kind):
+        self.id = secrets.token_hex(8)
+        self.kind = kind
+        self.state = "queued"
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.result = None
+        self.error = None
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "kind": self.kind,
+            "state": self.state,
+            "created": int(self.created * 1000),
+            "started": self.started and int(self.started * 1000),
+            "finished": self.finished and int(self.finished * 1000),
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class JobQueue:
+    """
+    Run slow work (image decoding and re-encoding) off the request threads.
+
+    A fixed number of worker threads, niced so a busy pool can't slow down the requests displays are waiting on,
+    take jobs in submission order. The newest `keep` finished jobs stay around so a client can look up how its
+    job went after the fact. on_finished, if given, is called with each job once it is done or failed.
+    """
+
+    def __init__(self, workers=1, nice=10, keep=200, on_finished=None):
+        self.nice = nice
+        self.keep = keep
+        self.on_finished = on_finished
+        self._jobs = OrderedDict()
+        self._pending = 0
+        self._pending_kinds = Counter()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="jobs", initializer=self._lower_priority
+        )
+
+    @property
+    def pending(self) -> int:
+        """Jobs queued or running"""
+        return self._pending
+
+    def pending_of(self, kind) -> int:
+        """Jobs of one kind queued or running"""
+        return self._pending_kinds[kind]
+
+    def submit(self, kind, fn, *args) -> Job:
+        """
+        Queue fn(*args)
+
+        Args:
+            kind (str): what the job does, reported back with its status
+            fn (callable): the work; its return value becomes the job's result, an exception marks it failed
+
+        Returns:
+            Job: the queued job
+        """
+        job = Job(kind)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._pending += 1
+            self._pending_kinds[job.kind] += 1
+            self._trim()
+        self._executor.submit(self._run, job, fn, args)
+        return job
+
+    def get(self, job_id):
+        """A job by id, or None if unknown or already forgotten"""
+        return self._jobs.get(job_id)
+
+    def _run(self, job, fn, args):
+        job.state, job.started = "running", time.time()
+        try:
+            job.result = fn(*args)
+            job.state = "done"
+        except Exception as e:
+            logger.warning("%s job %s failed: %s", job.kind, job.id, e)
+            job.error, job.state = str(e), "failed"
+        finally:
+            job.finished = time.time()
+            with self._lock:
+                self._pending -= 1
+                self._pending_kinds[job.kind] -= 1
+                self._trim()
+            if self.on_finished:
+                self.on_finished(job)
+
+    def _trim(self):
+        """Forget the oldest finished jobs past keep; caller holds the lock"""
+        excess = len(self._jobs) - self._pending - self.keep
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.finished][: max(0, excess)]:
+            del self._jobs[job_id]
+
+    def _lower_priority(self):
+        # Linux schedules threads individually, so this nices just the worker
+        with contextlib.suppress(AttributeError, OSError):
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), self.nice)
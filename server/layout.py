@@ -0,0 +1,106 @@
+"""Category grouping and page layout for the browser display's viewport, worked out once per version and screen size."""
+import math
+import threading
+from collections import OrderedDict, namedtuple
+
+# What a client tells us about its screen. Sizes are CSS px; card_height is one rendered card.
+Viewport = namedtuple("Viewport", "width height card_width card_height font_size group")
+
+# Part of the page height left free on grouped pages, since heading heights are only estimates
+PAGE_BUFFER = 0.1
+
+
+def to_px(value, font_size) -> float:
+    """Theme lengths are numbers (px) or "<n>rem" strings"""
+    if isinstance(value, str) and value.endswith("rem"):
+        return float(value[:-3]) * font_size
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def group_taps(taps) -> list:
+    """
+    Group taps by category, categories in order of first appearance and taps in list order
+
+    Returns:
+        list[tuple[str, list[int]]]: (category, indexes into taps)
+    """
+    groups = OrderedDict()
+    for index, tap in enumerate(taps):
+        category = (tap.get("category") or "").strip()
+        groups.setdefault(category, []).append(index)
+    return list(groups.items())
+
+
+def paginate(document, viewport: Viewport) -> dict:
+    """
+    Split the taplist into the pages a display rotates through
+
+    Args:
+        document (dict): taplist document
+        viewport (Viewport): the display's size
+
+    Returns:
+        dict: {"columns", "rows", "pages"}, each page a list of {"category", "taps"} sections with taps given as
+            indexes into document["taps"]. A category too long for one page continues on the next.
+    """
+    taps = document.get("taps", [])
+    theme = document.get("themes", {}).get(document.get("activeTheme"), {}) or {}
+    font_size = viewport.font_size
+    gap = to_px(theme.get("card-gap", "1.5rem"), font_size)
+    # matches styles.css: wrappers are 2rem apart, a heading is 2.8em text with a 2px rule and a 0.5rem gap
+    section_gap = 2 * font_size
+    heading_height = 2.8 * 1.2 * font_size + 2 + 0.5 * font_size
+
+    # a plain grid of fixed-size cards (group=0) is exact, grouped pages leave room for the estimates
+    budget = viewport.height * (1 - PAGE_BUFFER) if viewport.group else viewport.height
+    columns = max(1, math.floor((viewport.width + gap) / (viewport.card_width + gap)))
+    rows = max(1, math.floor((budget + gap) / (viewport.card_height + gap)))
+
+    sections = group_taps(taps) if viewport.group else [("", list(range(len(taps))))]
+    pages, page, used = [], [], 0.0
+    for category, indexes in sections:
+        heading = heading_height if category else 0
+        section_rows = max(1, math.floor((budget - heading + gap) / (viewport.card_height + gap)))
+        per_chunk = section_rows * columns
+        for start in range(0, len(indexes), per_chunk):
+            chunk = indexes[start : start + per_chunk]
+            chunk_rows = math.ceil(len(chunk) / columns)
+            height = heading + chunk_rows * viewport.card_height + (chunk_rows - 1) * gap
+            if page and used + section_gap + height > budget:
+                pages.append(page)
+                page, used = [], 0.0
+            used += height + (section_gap if page else 0)
+            page.append({"category": category, "taps": chunk})
+    if page:
+        pages.append(page)
+    return {"columns": columns, "rows": rows, "pages": pages}
+
+
+class LayoutCache:
+    """
+    Small LRU of computed layouts keyed by (version, viewport).
+
+    Every display of the same size asks for the same layout, and it only changes when the taplist does, so each
+    one is computed once per version. Older versions just age out.
+    """
+
+    def __init__(self, maxsize=32):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, snapshot, viewport: Viewport) -> dict:
+        key = (snapshot.version, viewport)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+        layout = dict(paginate(snapshot.document, viewport), version=snapshot.version)
+        with self._lock:
+            self._entries[key] = layout
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return layout
@@ -0,0 +1,188 @@
+"""Request and taplist metrics in the Prometheus text format."""
+import bisect
+import threading
+import time
+
+# Request latency buckets in seconds, from a cached /taplist.json on a Pi to a slow upload
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Upload size buckets in bytes, 16 KB to 16 MB
+SIZE_BUCKETS = tuple(16 * 1024 * 4**power for power in range(6))
+
+
+def format_labels(names, values) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{escape_label(value)}"' for name, value in zip(names, values))
+    return f"{{{pairs}}}"
+
+
+def escape_label(value) -> str:
+    return str(value).replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\"")
+
+
+def format_value(value) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """A monotonically increasing count per label set"""
+
+    kind = "counter"
+
+    def __init__(self, name, help, labels=()):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            yield self.name, format_labels(self.labels, labels), value
+
+
+class Histogram:
+    """
+    Observations counted into fixed buckets per label set.
+
+    Each label set is one preallocated list of bucket counts plus a sum, so an observation is a bisect and three
+    additions under a lock that is held for well under a microsecond.
+    """
+
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.labels = name, help, tuple(labels)
+        self.buckets = tuple(buckets)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                # per-bucket counts, the +Inf bucket last, then the sum
+                state = self._values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            state[index] += 1
+            state[-1] += value
+
+    def samples(self):
+        with self._lock:
+            items = sorted((labels, list(state)) for labels, state in self._values.items())
+        names = self.labels + ("le",)
+        for labels, state in items:
+            running = 0
+            for bound, count in zip(self.buckets + ("+Inf",), state):
+                running += count
+                le = bound if isinstance(bound, str) else format_value(float(bound))
+                yield f"{self.name}_bucket", format_labels(names, labels + (le,)), running
+            yield f"{self.name}_sum", format_labels(self.labels, labels), state[-1]
+            yield f"{self.name}_count", format_labels(self.labels, labels), running
+
+
+class Callback:
+    """A value read from elsewhere (store, broker) when scraped, so it costs nothing between scrapes"""
+
+    def __init__(self, name, help, kind, read):
+        self.name, self.help, self.kind, self.read = name, help, kind, read
+
+    def samples(self):
+        yield self.name, "", self.read()
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def add(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labels=()) -> Counter:
+        return self.add(Counter(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=LATENCY_BUCKETS) -> Histogram:
+        return self.add(Histogram(name, help, labels, buckets))
+
+    def gauge_callback(self, name, help, read) -> Callback:
+        return self.add(Callback(name, help, "gauge", read))
+
+    def counter_callback(self, name, help, read) -> Callback:
+        return self.add(Callback(name, help, "counter", read))
+
+    def render(self) -> str:
+        """Every metric in the Prometheus text exposition format"""
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+class RequestMetrics:
+    """
+    WSGI middleware counting requests, their latency and the bytes sent, per route.
+
+    The route label is the matched URL rule (e.g. /taps/<int:tap_id>), left in the environ by the app, so
+    the label set stays small however many different URLs are requested. Latency runs until the last byte of
+    the body is handed to the server, except for event streams, which stay open for as long as a display is
+    connected and are only counted.
+    """
+
+    ROUTE_KEY = "taplist.route"
+
+    def __init__(self, app, registry: Registry):
+        self.app = app
+        self.requests = registry.counter(
+            "taplist_http_requests_total", "HTTP requests by route, method and status", ("route", "method", "status")
+        )
+        self.latency = registry.histogram(
+            "taplist_http_request_duration_seconds", "Time to produce the whole response", ("route", "method")
+        )
+        self.sent = registry.counter("taplist_http_response_bytes_total", "Response body bytes sent", ("route",))
+
+    def __call__(self, environ, start_response):
+        start = time.perf_counter()
+        response = {}
+
+        def record_start(status, headers, exc_info=None):
+            response["status"] = status.split(" ", 1)[0]
+            response["headers"] = headers
+            return start_response(status, headers, exc_info)
+
+        body = self.app(environ, record_start)
+        file_wrapper = environ.get("wsgi.file_wrapper")
+        if file_wrapper is not None and isinstance(file_wrapper, type) and isinstance(body, file_wrapper):
+            # leave files to the server's own efficient path and count them from their Content-Length
+            length = next((int(v) for k, v in response.get("headers", ()) if k.lower() == "content-length"), 0)
+            self._record(environ, response, start, length)
+            return body
+        return self._observe(body, environ, response, start)
+
+    def _observe(self, body, environ, response, start):
+        sent = 0
+        try:
+            for chunk in body:
+                sent += len(chunk)
+                yield chunk
+        finally:
+            if hasattr(body, "close"):
+                body.close()
+            self._record(environ, response, start, sent)
+
+    def _record(self, environ, response, start, sent):
+        route = environ.get(self.ROUTE_KEY, "unmatched")
+        method = environ.get("REQUEST_METHOD", "")
+        self.requests.inc(route, method, response.get("status", "000"))
+        self.sent.inc(route, amount=sent)
+        content_type = next((v for k, v in response.get("headers", ()) if k.lower() == "content-type"), "")
+        if not content_type.startswith("text/event-stream"):
+            self.latency.observe(time.perf_counter() - start, route, method)
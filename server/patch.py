@@ -0,0 +1,185 @@
+"""Minimal RFC 6902 JSON Patch support for the taplist document."""
+import copy
+
+
+class PatchError(ValueError):
+    """A patch operation could not be applied"""
+
+
+class TestFailed(PatchError):
+    """A test operation found something else at its path: the document changed under the patch"""
+
+
+def escape(token) -> str:
+    """Escape one JSON Pointer reference token"""
+    return str(token).replace("~", "~0").replace("/", "~1")
+
+
+def parse_pointer(pointer: str) -> list:
+    """Split a JSON Pointer (RFC 6901) into unescaped tokens"""
+    if pointer == "":
+        return []
+    if not pointer.startswith("/"):
+        raise PatchError(f"Invalid JSON pointer: {pointer!r}")
+    return [token.replace("~1", "/").replace("~0", "~") for token in pointer[1:].split("/")]
+
+
+def _index(container: list, token: str, allow_end=False) -> int:
+    if allow_end and token == "-":
+        return len(container)
+    if not token.isdigit() or (token != "0" and token.startswith("0")):
+        raise PatchError(f"Invalid array index: {token!r}")
+    index = int(token)
+    if index > len(container) or (index == len(container) and not allow_end):
+        raise PatchError(f"Array index out of range: {index}")
+    return index
+
+
+def _walk(document, tokens, owned=None):
+    """
+    Return the container holding the last token
+
+    With owned (ids of the containers apply_patch made itself), containers on the way that are still shared with
+    the original document are copied first, so the one returned can be changed without touching the original.
+    """
+    node = document
+    for token in tokens[:-1]:
+        if isinstance(node, list):
+            key = _index(node, token)
+        elif isinstance(node, dict) and token in node:
+            key = token
+        else:
+            raise PatchError(f"Path not found: /{'/'.join(tokens)}")
+        child = node[key]
+        if owned is not None and isinstance(child, (dict, list)) and id(child) not in owned:
+            child = node[key] = child.copy()
+            owned.add(id(child))
+        node = child
+    return node
+
+
+def _get(document, pointer):
+    tokens = parse_pointer(pointer)
+    if not tokens:
+        return document
+    parent, token = _walk(document, tokens), tokens[-1]
+    if isinstance(parent, list):
+        return parent[_index(parent, token)]
+    if isinstance(parent, dict) and token in parent:
+        return parent[token]
+    raise PatchError(f"Path not found: {pointer}")
+
+
+def _add(document, pointer, value, owned):
+    tokens = parse_pointer(pointer)
+    if not tokens:
+        return value
+    parent, token = _walk(document, tokens, owned), tokens[-1]
+    if isinstance(parent, list):
+        parent.insert(_index(parent, token, allow_end=True), value)
+    elif isinstance(parent, dict):
+        parent[token] = value
+    else:
+        raise PatchError(f"Cannot add to {pointer}")
+    return document
+
+
+def _remove(document, pointer, owned):
+    tokens = parse_pointer(pointer)
+    if not tokens:
+        raise PatchError("Cannot remove the whole document")
+    parent, token = _walk(document, tokens, owned), tokens[-1]
+    if isinstance(parent, list):
+        return parent.pop(_index(parent, token))
+    if isinstance(parent, dict) and token in parent:
+        return parent.pop(token)
+    raise PatchError(f"Path not found: {pointer}")
+
+
+def apply_patch(document, operations):
+    """
+    Apply a JSON Patch to a copy of document
+
+    Only the containers on the paths the patch changes are copied; everything else is shared with document, so
+    neither may be changed in place afterwards (the store never does, snapshots are immutable).
+
+    Args:
+        document (dict): document to patch, left untouched
+        operations (list): RFC 6902 operations
+
+    Raises:
+        PatchError: if any operation fails, in which case nothing is applied
+
+    Returns:
+        dict: the patched copy
+    """
+    if not isinstance(operations, list):
+        raise PatchError("A JSON Patch must be a list of operations")
+    result = document.copy() if isinstance(document, (dict, list)) else document
+    # a container only ever gets one of our copies' ids while that copy is alive, and the original's containers
+    # all stay alive, so an id in here is never one of theirs
+    owned = {id(result)}
+    for operation in operations:
+        if not isinstance(operation, dict) or "path" not in operation:
+            raise PatchError(f"Invalid operation: {operation!r}")
+        op, path = operation.get("op"), operation["path"]
+        if op in ("add", "replace", "test") and "value" not in operation:
+            raise PatchError(f"'{op}' needs a value")
+        if op in ("move", "copy") and "from" not in operation:
+            raise PatchError(f"'{op}' needs a from path")
+
+        if op == "add":
+            result = _add(result, path, copy.deepcopy(operation["value"]), owned)
+        elif op == "remove":
+            _remove(result, path, owned)
+        elif op == "replace":
+            if parse_pointer(path):
+                _remove(result, path, owned)
+            result = _add(result, path, copy.deepcopy(operation["value"]), owned)
+        elif op == "move":
+            if path.startswith(operation["from"] + "/"):
+                raise PatchError("Cannot move a value into one of its children")
+            result = _add(result, path, _remove(result, operation["from"], owned), owned)
+        elif op == "copy":
+            result = _add(result, path, copy.deepcopy(_get(result, operation["from"])), owned)
+        elif op == "test":
+            try:
+                matches = _get(result, path) == operation["value"]
+            except PatchError:
+                # e.g. the tap at that index was deleted
+                matches = False
+            if not matches:
+                raise TestFailed(f"Test failed at {path}")
+        else:
+            raise PatchError(f"Unknown operation: {op!r}")
+        if isinstance(result, (dict, list)) and id(result) not in owned:
+            # a move or copy to the root made it one of the original's containers
+            result = result.copy()
+            owned.add(id(result))
+    return result
+
+
+def diff(old, new, path="") -> list:
+    """
+    Cheap structural diff producing JSON Patch operations
+
+    Objects are compared key by key and equal-length arrays item by item; anything else that changed is replaced
+    whole. That keeps the common edits (one tap field, a theme colour) down to a single small operation.
+    """
+    if old == new:
+        return []
+    if isinstance(old, dict) and isinstance(new, dict):
+        ops = [{"op": "remove", "path": f"{path}/{escape(key)}"} for key in old if key not in new]
+        for key, value in new.items():
+            child = f"{path}/{escape(key)}"
+            if key not in old:
+                ops.append({"op": "add", "path": child, "value": value})
+            else:
+                ops.extend(diff(old[key], value, child))
+        return ops
+    if isinstance(old, list) and isinstance(new, list) and len(old) == len(new):
+        ops = []
+        for index, (before, after) in enumerate(zip(old, new)):
+            ops.extend(diff(before, after, f"{path}/{index}"))
+        return ops
+    return [{"op": "replace", "path": path, "value": new}]
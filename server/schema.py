@@ -0,0 +1,203 @@
+"""
+The taplist document model, compiled once at import.
+
+The model is declared as plain data below. compile_node() turns each node into a small checking function with
+its type sets and child checks bound in, so validate() runs no model lookups at all and stops at the first field
+that doesn't fit, naming it. A 100-tap document takes about 250µs on an x86 desktop; the Pi has not been
+measured and is several times slower.
+"""
+import math
+from collections import namedtuple
+
+from patch import escape
+
+Value = namedtuple("Value", "types minimum")
+ListOf = namedtuple("ListOf", "item")
+DictOf = namedtuple("DictOf", "item")
+# Unknown keys are allowed, so a document written by a newer admin page still validates
+Record = namedtuple("Record", "fields required")
+
+NULL = type(None)
+
+TYPE_NAMES = {
+    str: "a string",
+    int: "an integer",
+    float: "a number",
+    bool: "a boolean",
+    NULL: "null",
+    list: "an array",
+    dict: "an object",
+}
+
+
+def string(nullable=False) -> Value:
+    return Value((str, NULL) if nullable else (str,), None)
+
+
+def integer() -> Value:
+    return Value((int,), None)
+
+
+def number(nullable=False, minimum=None) -> Value:
+    # bool is its own type, and types are compared exactly, so true never passes for a number
+    return Value((int, float, NULL) if nullable else (int, float), minimum)
+
+
+def length() -> Value:
+    """Theme sizes: px numbers or "<n>rem" strings"""
+    return Value((str, int, float), None)
+
+
+# abv, dateAdded, card-border-radius and card-min-width come from number inputs in the admin page and are null
+# when left empty
+TAP = Record(
+    {
+        "id": integer(),
+        "category": string(),
+        "brewName": string(),
+        "style": string(),
+        "abv": number(nullable=True),
+        "labelLink": string(),
+        "dateAdded": number(nullable=True),
+        "description": string(),
+        "containerType": string(),
+    },
+    ("id", "category", "brewName", "labelLink"),
+)
+
+THEME = Record(
+    {
+        "bg-color": string(nullable=True),
+        "text-color": string(nullable=True),
+        "image-width": number(),
+        "card-width": number(),
+        "card-border-radius": number(nullable=True),
+        "card-padding": length(),
+        "card-gap": length(),
+        "font-family": string(),
+        "card-border-color": string(),
+    },
+    (),
+)
+
+TAPLIST = Record(
+    {
+        "title": string(),
+        "activeTheme": string(),
+        "themes": DictOf(THEME),
+        "fadeTime": number(minimum=0),
+        "card-min-width": number(nullable=True),
+        "font-size-body": length(),
+        "font-size-header": length(),
+        "lastUpdated": number(),
+        "taps": ListOf(TAP),
+    },
+    ("taps",),
+)
+
+
+class SchemaError(ValueError):
+    """A document that doesn't fit the taplist model"""
+
+    def __init__(self, path, message):
+        super().__init__(f"{path or '/'}: {message}")
+        self.path = path
+        self.message = message
+
+    def within(self, token) -> "SchemaError":
+        """The same error seen from the container holding `token`"""
+        return SchemaError(f"/{escape(token)}{self.path}", self.message)
+
+
+def describe(types) -> str:
+    # int alone is an id; next to float it is just a number
+    if float in types:
+        types = [t for t in types if t is not int]
+    return " or ".join(dict.fromkeys(TYPE_NAMES.get(t, t.__name__) for t in types))
+
+
+def type_error(expected, value) -> SchemaError:
+    return SchemaError("", f"expected {expected}, got {describe((type(value),))}")
+
+
+def compile_node(node):
+    """
+    Build the check for a model node. Paths are only put together on the way out of a failure, so a document
+    that fits costs no string building.
+
+    Returns:
+        callable: value -> None, raising SchemaError for the first field that doesn't fit, with its JSON Pointer
+            below value
+    """
+    if isinstance(node, Value):
+        types, minimum = frozenset(node.types), node.minimum
+        expected = describe(node.types)
+
+        def check_value(value):
+            kind = type(value)
+            if kind not in types:
+                raise type_error(expected, value)
+            if kind is float and not math.isfinite(value):
+                raise SchemaError("", "expected a finite number")
+            if minimum is not None and value is not None and value <= minimum:
+                raise SchemaError("", f"must be greater than {minimum}")
+
+        return check_value
+
+    item = compile_node(node.item) if isinstance(node, (ListOf, DictOf)) else None
+    if isinstance(node, ListOf):
+
+        def check_list(value):
+            if type(value) is not list:
+                raise type_error("an array", value)
+            for index, entry in enumerate(value):
+                try:
+                    item(entry)
+                except SchemaError as e:
+                    raise e.within(index) from None
+
+        return check_list
+
+    if isinstance(node, DictOf):
+
+        def check_dict(value):
+            if type(value) is not dict:
+                raise type_error("an object", value)
+            for key, entry in value.items():
+                try:
+                    item(entry)
+                except SchemaError as e:
+                    raise e.within(key) from None
+
+        return check_dict
+
+    required = node.required
+    fields = tuple((key, compile_node(field)) for key, field in node.fields.items())
+
+    def check_record(value):
+        if type(value) is not dict:
+            raise type_error("an object", value)
+        for key in required:
+            if key not in value:
+                raise SchemaError(f"/{escape(key)}", "is required")
+        for key, field in fields:
+            if key in value:
+                try:
+                    field(value[key])
+                except SchemaError as e:
+                    raise e.within(key) from None
+
+    return check_record
+
+
+check_taplist = compile_node(TAPLIST)
+
+
+def validate(document):
+    """
+    Check a whole taplist document
+
+    Raises:
+        SchemaError: naming the first offending field as a JSON Pointer
+    """
+    check_taplist(document)
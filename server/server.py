@@ -1,80 +1,609 @@
 from flask import Flask, request, jsonify, send_from_directory, redirect
-import json
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.security import safe_join
+from werkzeug.utils import secure_filename
+import argparse
+import atexit
+import math
+import mimetypes
 import os
+import signal
+import sys
+import time
+
+import fastjson
+from compression import StaticCache, compress, negotiate
+from events import EventBroker
+from history import TaplistHistory
+from images import (
+    ALLOWED_EXTENSIONS,
+    DEFAULT_IMAGE,
+    ImageLibrary,
+    ImagePipeline,
+    UploadTooLarge,
+    blob_stem,
+    image_usage,
+)
+from jobs import JobQueue
+from layout import LayoutCache, Viewport
+from metrics import SIZE_BUCKETS, Registry, RequestMetrics
+from patch import PatchError, TestFailed, escape
+from schema import SchemaError, validate
+from store import TaplistStore, VersionConflict
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Request bodies and compact jsonify() responses through orjson when it is installed"""
+
+    def loads(self, s, **kwargs):
+        if fastjson.orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return fastjson.orjson.loads(s)
+
+    def dumps(self, obj, **kwargs):
+        # jsonify() only asks for compact separators outside debug mode, anything else goes to the stdlib
+        orjson = fastjson.orjson
+        if orjson is None or kwargs.keys() - {"separators"} or kwargs.get("separators") != fastjson.COMPACT:
+            return super().dumps(obj, **kwargs)
+        option = orjson.OPT_NON_STR_KEYS | (orjson.OPT_SORT_KEYS if self.sort_keys else 0)
+        return orjson.dumps(obj, default=self.default, option=option).decode("utf-8")
+
 
 app = Flask(__name__, static_folder="../public", static_url_path="")
+app.json = FastJSONProvider(app)
+
+# Everything /metrics reports; request counts, latency and bytes sent are recorded around the whole app
+metrics = Registry()
+app.wsgi_app = RequestMetrics(app.wsgi_app, metrics)
 
 UPLOAD_FOLDER = os.path.join(app.static_folder, "images")
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 app.config["UPLOAD_FOLDER"] = UPLOAD_FOLDER
+# Biggest upload we take; Flask answers 413 for anything declaring more before reading it
+MAX_UPLOAD_SIZE = int(float(os.environ.get("TAPLIST_MAX_UPLOAD_MB", 16)) * 1024 * 1024)
+app.config["MAX_CONTENT_LENGTH"] = MAX_UPLOAD_SIZE + 64 * 1024
+# Uploads waiting to be processed before new ones are turned away (variant backfills at startup don't count)
+MAX_PENDING_JOBS = int(os.environ.get("TAPLIST_MAX_PENDING_JOBS", 8))
 
 TAPLIST_PATH = os.path.join(app.static_folder, "taplist.json")
 
+# Change notifications for /events listeners
+broker = EventBroker(max_clients=int(os.environ.get("TAPLIST_MAX_LISTENERS", 32)))
+
+# Every saved version, kept outside public/ so it isn't served as a static file
+history = TaplistHistory(
+    os.environ.get("TAPLIST_HISTORY_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "history.db")),
+    max_versions=int(os.environ.get("TAPLIST_HISTORY_SIZE", 500)),
+)
+
+
+def committed(snapshot):
+    """A version reached disk: keep it in the history and tell the displays"""
+    history.record(snapshot.version, snapshot.document, snapshot.modified)
+    broker.publish("taplist", taplist_version_info(snapshot))
+
+
+# In-memory taplist, every read and write goes through this. Writes that don't fit the schema are refused, and
+# bursts of admin saves within the write delay are written to disk and announced to displays once.
+store = TaplistStore(
+    TAPLIST_PATH,
+    write_delay=float(os.environ.get("TAPLIST_WRITE_DELAY", 0.3)),
+    on_commit=committed,
+    validate=validate,
+)
+# start the history with whatever is on disk now (first run, or edited by hand while we were down)
+history.record(store.version, store.document, store.snapshot.modified)
+
+upload_bytes = metrics.histogram("taplist_upload_bytes", "Size of image upload requests", buckets=SIZE_BUCKETS)
+upload_seconds = metrics.histogram("taplist_upload_duration_seconds", "Time to receive and store an upload")
+job_seconds = metrics.histogram("taplist_job_duration_seconds", "Background job run time", ("kind", "state"))
+
+# Image checks and resizing, on a niced pool so they never hold up a request
+jobs = JobQueue(
+    workers=int(os.environ.get("TAPLIST_IMAGE_WORKERS", 1)),
+    on_finished=lambda job: job_seconds.observe(job.finished - job.started, job.kind, job.state),
+)
+
+# Label images stored by content hash, with resized variants generated in the background after each upload
+library = ImageLibrary(
+    UPLOAD_FOLDER,
+    pipeline=ImagePipeline(
+        os.path.join(UPLOAD_FOLDER, "blobs"),
+        os.path.join(UPLOAD_FOLDER, "variants"),
+        preferred_format=os.environ.get("TAPLIST_IMAGE_FORMAT", "webp"),
+        on_done=lambda blob: broker.publish("images", {"hash": blob_stem(blob), "action": "processed"}),
+        jobs=jobs,
+    ),
+)
+library.import_loose_files()
+library.pipeline.scan()
+
+# Page layouts per (version, viewport), so same-sized displays share one computation
+layouts = LayoutCache()
+
+# Text bundles (js, css, html) compressed once up front rather than on every request
+static_cache = StaticCache(app.static_folder)
+static_cache.warm()
+
+metrics.gauge_callback("taplist_version", "Version of the taplist being served", lambda: store.version)
+metrics.counter_callback("taplist_writes_total", "Taplist versions created by admin writes", lambda: store.writes)
+metrics.counter_callback("taplist_saves_total", "Taplist versions written to disk", lambda: store.saves)
+metrics.gauge_callback("taplist_event_clients", "Displays connected to /events", lambda: broker.client_count)
+metrics.gauge_callback("taplist_jobs_pending", "Background jobs queued or running", lambda: jobs.pending)
+
+# A kiosk on this machine writes its own metrics here (see public/taplist.py); /metrics passes them on
+KIOSK_METRICS_PATH = os.environ.get("TAPLIST_KIOSK_METRICS")
+
+# Displays show page floor((now - epoch) / fadeTime) % pages, so screens in one room flip together
+ROTATION_EPOCH = int(os.environ.get("TAPLIST_ROTATION_EPOCH", 0))
+# ms per page when taplist.json doesn't say; the kiosk and the browser displays use the same
+DEFAULT_FADE_TIME = 15000
+
+# Blob and variant URLs change whenever their content does, so browsers never need to revalidate them
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+
+@app.before_request
+def label_route():
+    # the URL rule rather than the path, so /taps/1 and /taps/2 share one set of metrics
+    request.environ[RequestMetrics.ROUTE_KEY] = request.url_rule.rule if request.url_rule else "unmatched"
+
+
+def send_encoded(body, etag, mimetype, modified, encoding=None):
+    """
+    Send bytes that were already compressed with `encoding` (or plain when None)
+
+    The ETag is weak for encoded bodies: every encoding of one version shares it, so a client's If-None-Match
+    still matches whatever Accept-Encoding it sends next time.
+    """
+    response = app.response_class(body, mimetype=mimetype)
+    if encoding:
+        response.content_encoding = encoding
+    response.vary.add("Accept-Encoding")
+    response.set_etag(etag, weak=encoding is not None)
+    response.last_modified = modified
+    return response
+
+
+def send_static(filename):
+    """Static files, from the precompressed cache when the client accepts one of its encodings"""
+    path = safe_join(app.static_folder, filename)
+    entry = static_cache.get(path) if path else None
+    encoding = negotiate(request.accept_encodings) if entry else None
+    if encoding is None:
+        response = send_from_directory(app.static_folder, filename)
+        if entry:
+            response.vary.add("Accept-Encoding")
+        return response
+    mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    response = send_encoded(entry["encodings"][encoding], entry["etag"], mimetype, entry["modified"], encoding)
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+
+# Flask's own static route, now answered from the cache
+app.view_functions["static"] = send_static
+
 
 @app.route("/")
 def serve_index():
-    return send_from_directory(app.static_folder, "index.html")
+    return send_static("index.html")
 
 
 @app.route("/admin")
 def serve_admin():
-    return send_from_directory(app.static_folder, "admin.html")
+    return send_static("admin.html")
 
 
 @app.route("/taplist.json")
 def serve_taplist():
-    return send_from_directory(app.static_folder, "taplist.json")
+    snapshot = store.snapshot
+    # compressed at most once per version, see compression.compress
+    encoding = negotiate(request.accept_encodings, len(snapshot.body))
+    body = compress(snapshot.body, encoding) if encoding else snapshot.body
+    response = send_encoded(body, snapshot.etag, "application/json", snapshot.modified, encoding)
+    response.headers["X-Taplist-Version"] = str(snapshot.version)
+    # Let browsers keep a copy but always revalidate it; unchanged polls get a bodyless 304
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+
+def taplist_version_info(snapshot=None):
+    """Small version document shared by /taplist/version and the taplist event"""
+    snapshot = snapshot or store.snapshot
+    return {"version": snapshot.version, "etag": snapshot.etag, "lastModified": int(snapshot.modified * 1000)}
+
+
+@app.route("/taplist/version")
+def taplist_version():
+    response = jsonify(taplist_version_info())
+    response.cache_control.no_store = True
+    return response
+
+
+def rotation_interval(document):
+    """fadeTime, or the default for a hand-edited one that isn't a positive number"""
+    value = document.get("fadeTime")
+    if type(value) in (int, float) and math.isfinite(value) and value > 0:
+        return value
+    return DEFAULT_FADE_TIME
+
+
+@app.route("/time")
+def server_time():
+    """Shared rotation clock; clients estimate their skew from `now` and the request's round trip"""
+    response = jsonify(
+        {
+            "now": int(time.time() * 1000),
+            "epoch": ROTATION_EPOCH,
+            "fadeTime": rotation_interval(store.document),
+        }
+    )
+    response.cache_control.no_store = True
+    return response
+
+
+@app.route("/taplist/delta")
+def taplist_delta():
+    since = request.args.get("since", type=int)
+    snapshot, ops = store.changes_since(since) if since is not None else (store.snapshot, None)
+    if ops is None:
+        # too far behind (or unknown version), send everything
+        return jsonify({"version": snapshot.version, "document": snapshot.document})
+    return jsonify({"version": snapshot.version, "ops": ops})
+
+
+def pixels_arg(name, default=None) -> int:
+    """
+    A size query argument in px, rounded so displays that differ by a fraction of a px share a cache entry
+
+    Raises:
+        KeyError: if it is missing and has no default
+        ValueError: if it isn't a finite number (args.get(type=float) would quietly use the default instead)
+    """
+    value = request.args.get(name)
+    if value is None:
+        if default is None:
+            raise KeyError(name)
+        return default
+    try:
+        return max(1, round(float(value)))
+    except (ValueError, OverflowError):
+        raise ValueError(f"{name} must be a number, got {value!r}") from None
+
+
+@app.route("/taplist/layout")
+def taplist_layout():
+    try:
+        font_size = pixels_arg("fontSize", 16)
+        viewport = Viewport(
+            width=pixels_arg("width"),
+            height=pixels_arg("height"),
+            card_width=pixels_arg("cardWidth", 500),
+            card_height=pixels_arg("cardHeight", 15 * font_size),
+            font_size=font_size,
+            group=request.args.get("group", "1") != "0",
+        )
+    except KeyError:
+        return jsonify({"error": "width and height are required"}), 400
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    response = jsonify(layouts.get(store.snapshot, viewport))
+    response.cache_control.no_cache = True
+    return response
+
+
+@app.route("/events")
+def stream_events():
+    if request.method == "HEAD":
+        # waitress would run the stream for a HEAD and throw the body away, never noticing the client leave, so a
+        # few probes would hold listener slots and threads for good
+        response = app.response_class(mimetype="text/event-stream")
+        response.cache_control.no_cache = True
+        return response
+    client = broker.subscribe()
+    if client is None:
+        # Too many listeners, clients fall back to polling /taplist/version
+        return jsonify({"error": "Too many event listeners"}), 503
+    # Start every stream with the current version so a reconnecting display catches up on missed changes
+    broker.send(client, "taplist", taplist_version_info())
+    response = app.response_class(broker.stream(client), mimetype="text/event-stream")
+    response.cache_control.no_cache = True
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
+
+
+def if_match():
+    """ETags from the request's If-Match header (weak ones too, gzip responses carry those), or None"""
+    if not request.if_match or request.if_match.star_tag:
+        return None
+    return request.if_match.as_set(include_weak=True)
+
+
+def version_conflict(e: VersionConflict):
+    """412 with the current version, so the client can refetch and redo its change"""
+    response = jsonify({"error": str(e), **taplist_version_info(e.snapshot)})
+    response.status_code = 412
+    response.set_etag(e.snapshot.etag)
+    return response
 
 
 @app.route("/update-taplist", methods=["POST"])
 def update_taplist():
     try:
-        data = request.get_json()
-        with open(TAPLIST_PATH, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
-        return jsonify({"message": "Taplist updated successfully."}), 200
+        data = request.get_json(silent=True)
+        snapshot = store.replace(data, if_match=if_match())
+        response = jsonify({"message": "Taplist updated successfully.", **taplist_version_info(snapshot)})
+        response.set_etag(snapshot.etag)
+        return response, 200
+    except VersionConflict as e:
+        return version_conflict(e)
+    except SchemaError as e:
+        return jsonify({"error": str(e), "path": e.path}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+@app.route("/taplist.json", methods=["PATCH"])
+def patch_taplist():
+    operations = request.get_json(force=True, silent=True)
+    try:
+        snapshot = store.patch(operations, if_match=if_match())
+    except VersionConflict as e:
+        return version_conflict(e)
+    except TestFailed as e:
+        # guarded by a test op rather than If-Match, same answer: refetch and redo the change
+        return jsonify({"error": str(e), **taplist_version_info()}), 409
+    except (PatchError, SchemaError) as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(taplist_version_info(snapshot)), 200
+
+
+@app.route("/taplist/versions")
+def list_versions():
+    versions = history.versions(
+        limit=min(request.args.get("limit", 50, type=int), 500),
+        before=request.args.get("before", type=int),
+    )
+    response = jsonify({"current": store.version, "versions": versions})
+    response.cache_control.no_cache = True
+    return response
+
+
+@app.route("/taplist/versions/<int:version>")
+def get_version(version):
+    document = history.get(version)
+    if document is None:
+        return jsonify({"error": f"Version {version} not found"}), 404
+    # a past version never changes
+    response = jsonify(document)
+    response.cache_control.max_age = IMMUTABLE_MAX_AGE
+    response.cache_control.immutable = True
+    return response
+
+
+@app.route("/taplist/versions/<int:version>/restore", methods=["POST"])
+def restore_version(version):
+    """Roll back by committing an old version as the newest one, so the rollback can be undone too"""
+    document = history.get(version)
+    if document is None:
+        return jsonify({"error": f"Version {version} not found"}), 404
+    try:
+        snapshot = store.replace(document, if_match=if_match())
+    except VersionConflict as e:
+        return version_conflict(e)
+    except SchemaError as e:
+        return jsonify({"error": str(e), "path": e.path}), 400
+    return jsonify(taplist_version_info(snapshot)), 200
+
+
+def find_tap(document, tap_id):
+    """Index of the tap with the given id, or None"""
+    for index, tap in enumerate(document.get("taps", [])):
+        if tap.get("id") == tap_id:
+            return index
+    return None
+
+
+@app.route("/taps/<int:tap_id>", methods=["PATCH", "PUT", "DELETE"])
+def edit_tap(tap_id):
+    changes = None
+    if request.method != "DELETE":
+        changes = request.get_json(silent=True)
+        if not isinstance(changes, dict):
+            return jsonify({"error": "Expected a JSON object"}), 400
+
+    def tap_operations(document):
+        index = find_tap(document, tap_id)
+        if request.method == "PUT":
+            tap = {**changes, "id": tap_id}
+            if index is None:
+                return [{"op": "add", "path": "/taps/-", "value": tap}]
+            return [{"op": "replace", "path": f"/taps/{index}", "value": tap}]
+        if index is None:
+            raise LookupError(f"Tap {tap_id} not found")
+        if request.method == "DELETE":
+            return [{"op": "remove", "path": f"/taps/{index}"}]
+        return [
+            {"op": "add", "path": f"/taps/{index}/{escape(key)}", "value": value}
+            for key, value in changes.items()
+            if key != "id"
+        ]
+
+    try:
+        snapshot = store.patch(tap_operations, if_match=if_match())
+    except VersionConflict as e:
+        return version_conflict(e)
+    except LookupError as e:
+        return jsonify({"error": str(e)}), 404
+    except (PatchError, SchemaError) as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(taplist_version_info(snapshot)), 200
+
+
+@app.errorhandler(RequestEntityTooLarge)
+def upload_too_large(e):
+    return jsonify({"error": f"Uploads are limited to {MAX_UPLOAD_SIZE // (1024 * 1024)} MB"}), 413
+
+
 @app.route("/upload-image", methods=["POST"])
 def upload_image():
+    """Store the upload and answer right away; decoding and resizing happen in a job the client can poll"""
     if "image" not in request.files:
-        return "No file part", 400
+        return jsonify({"error": "No file part"}), 400
 
     file = request.files["image"]
     if file.filename == "":
-        return "No selected file", 400
+        return jsonify({"error": "No selected file"}), 400
+
+    filename = secure_filename(file.filename)
+    if not filename or os.path.splitext(filename)[1].lower() not in ALLOWED_EXTENSIONS:
+        return jsonify({"error": f"Not an image file name: {file.filename}"}), 400
+    if jobs.pending_of("upload") >= MAX_PENDING_JOBS:
+        response = jsonify({"error": "Still processing earlier uploads, try again shortly"})
+        response.retry_after = 5
+        return response, 503
+
+    start = time.perf_counter()
+    try:
+        job = library.upload(filename, file.stream, max_size=MAX_UPLOAD_SIZE)
+    except UploadTooLarge as e:
+        return jsonify({"error": str(e)}), 413
+    upload_seconds.observe(time.perf_counter() - start)
+    upload_bytes.observe(request.content_length or 0)
+    broker.publish("images", {"name": filename, "action": "uploaded"})
+    body = {"message": f"Uploaded as /images/{filename}", "name": filename, "url": f"/images/{filename}"}
+    if job is None:
+        return jsonify(body), 201
+    response = jsonify({**body, "job": job.to_dict()})
+    response.headers["Location"] = f"/jobs/{job.id}"
+    return response, 202
+
+
+@app.route("/jobs/<job_id>")
+def job_status(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        return jsonify({"error": f"Job {job_id} not found"}), 404
+    response = jsonify(job.to_dict())
+    response.cache_control.no_store = True
+    return response
+
+
+# (version, image_usage()) of the taplist last asked about
+_usage = (None, {})
 
-    filename = file.filename
-    save_path = os.path.join(app.config["UPLOAD_FOLDER"], filename)
-    file.save(save_path)
-    return f"Uploaded as /images/{filename}", 200
+
+def current_image_usage() -> dict:
+    """Which taps use which image, worked out once per taplist version"""
+    global _usage
+    snapshot = store.snapshot
+    if _usage[0] != snapshot.version:
+        _usage = (snapshot.version, image_usage(snapshot.document.get("taps", [])))
+    return _usage[1]
 
 
 @app.route("/images")
 def list_images():
-    image_dir = app.config["UPLOAD_FOLDER"]
-    try:
-        filenames = [
-            f
-            for f in os.listdir(image_dir)
-            if os.path.isfile(os.path.join(image_dir, f))
-        ]
-        return jsonify(filenames)
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+    """
+    The image library. With no query, all of it as {name: entry}. With any of limit, offset, q (part of the
+    name) or unused=1 (no tap shows it), one page: {"total", "offset", "limit", "items": [{"name", ...entry}]}.
+    """
+    index = library.index(current_image_usage())
+    if not request.args.keys() & {"limit", "offset", "q", "unused"}:
+        response = jsonify(index)
+        response.cache_control.no_cache = True
+        # remote kiosks revalidate this on every images event; unchanged, they get a 304
+        response.add_etag()
+        return response.make_conditional(request)
+
+    query = request.args.get("q", "").lower()
+    unused = request.args.get("unused", type=int)
+    items = [
+        {"name": name, **entry}
+        for name, entry in index.items()
+        if query in name.lower() and (not unused or (not entry["usedBy"] and name != DEFAULT_IMAGE))
+    ]
+    offset = max(0, request.args.get("offset", 0, type=int))
+    limit = min(max(1, request.args.get("limit", 50, type=int)), 500)
+    response = jsonify({"total": len(items), "offset": offset, "limit": limit, "items": items[offset : offset + limit]})
+    response.cache_control.no_cache = True
+    return response
+
+
+@app.route("/images/gc", methods=["POST"])
+def collect_unused_images():
+    """
+    Delete every image no tap shows (except the default label). A JSON body of {"names": [...]} limits it to
+    those names, and ?dry_run=1 only reports what would go.
+    """
+    usage = current_image_usage()
+    body = request.get_json(silent=True) or {}
+    names = body.get("names") if isinstance(body, dict) else None
+    candidates = [name for name in names if isinstance(name, str)] if isinstance(names, list) else library.names()
+    unused = [name for name in candidates if name not in usage and name != DEFAULT_IMAGE and library.resolve(name)]
+    if request.args.get("dry_run", type=int):
+        return jsonify({"removed": [], "unused": unused}), 200
+    removed = library.remove_many(unused)
+    if removed:
+        # one event for the lot, displays reload their image index once
+        broker.publish("images", {"names": removed, "action": "deleted"})
+    return jsonify({"removed": removed, "unused": []}), 200
+
+
+def send_immutable(directory, filename):
+    response = send_from_directory(directory, filename, max_age=IMMUTABLE_MAX_AGE)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+@app.route("/images/blobs/<blob>")
+def serve_image_blob(blob):
+    return send_immutable(library.blob_dir, blob)
+
+
+@app.route("/images/variants/<int:size>/<name>")
+def serve_image_variant(size, name):
+    return send_immutable(os.path.join(library.pipeline.variant_dir, str(size)), name)
+
+
+@app.route("/images/<name>")
+def serve_image(name):
+    # Older clients and taps still ask by name; always revalidate since the name can be re-pointed
+    blob = library.resolve(name)
+    if blob is None:
+        return jsonify({"error": "File not found"}), 404
+    response = send_from_directory(library.blob_dir, blob)
+    response.cache_control.no_cache = True
+    return response
 
 
 @app.route("/delete-image/<filename>", methods=["DELETE"])
 def delete_image(filename):
-    file_path = os.path.join(app.config["UPLOAD_FOLDER"], filename)
-    if os.path.exists(file_path):
-        os.remove(file_path)
+    if library.remove(filename):
+        broker.publish("images", {"name": filename, "action": "deleted"})
         return jsonify({"message": "Image deleted"}), 200
     return jsonify({"error": "File not found"}), 404
 
 
+@app.route("/metrics")
+def serve_metrics():
+    """Server (and local kiosk) metrics in the Prometheus text format"""
+    body = metrics.render()
+    if KIOSK_METRICS_PATH:
+        try:
+            with open(KIOSK_METRICS_PATH, encoding="utf-8") as f:
+                body += f.read()
+        except OSError:
+            pass
+    response = app.response_class(body, mimetype="text/plain")
+    response.headers["Content-Type"] = "text/plain; version=0.0.4; charset=utf-8"
+    response.cache_control.no_store = True
+    return response
+
+
 # Captive portal triggers
 @app.route("/generate_204")
 @app.route("/gen_204")
@@ -86,6 +615,68 @@ def captive_portal():
     return redirect("/admin")
 
 
+def reload_taplist(*_):
+    """Pick up a taplist.json edited on disk (SIGHUP / systemctl reload) without dropping connections"""
+    try:
+        snapshot = store.reload()
+    except ValueError as e:
+        # raising here would unwind waitress's serve loop and take the server down with it
+        app.logger.error("Could not parse %s, still serving version %s: %s", TAPLIST_PATH, store.version, e)
+        return
+    committed(snapshot)
+
+
+def main(argv=None):
+    cores = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description="MeadTools taplist server")
+    parser.add_argument("--host", default=os.environ.get("HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", 5000)))
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=int(os.environ.get("TAPLIST_THREADS", 4 * cores)),
+        help="worker threads for ordinary requests (default: 4 per core)",
+    )
+    parser.add_argument(
+        "--max-listeners",
+        type=int,
+        default=broker.max_clients,
+        help="concurrent /events streams, each holds a thread of its own on top of --threads",
+    )
+    parser.add_argument(
+        "--connection-limit",
+        type=int,
+        default=int(os.environ.get("TAPLIST_CONNECTION_LIMIT", 100)),
+        help="open sockets accepted before new connections wait in the backlog",
+    )
+    parser.add_argument("--dev", action="store_true", help="Flask development server with debugger and reloader")
+    args = parser.parse_args(argv)
+    atexit.register(store.flush)
+
+    if args.dev:
+        app.run(debug=True, port=args.port, host=args.host)
+        return
+
+    from waitress import serve
+
+    # One process: the taplist, change log and event listeners live in memory and must be shared by every
+    # request. Event streams get their own slice of the pool so they can never starve /taplist.json readers.
+    broker.max_clients = args.max_listeners
+    signal.signal(signal.SIGHUP, reload_taplist)
+    # stop cleanly on systemctl stop so a coalesced write still waiting to be saved isn't lost
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    serve(
+        app,
+        host=args.host,
+        port=args.port,
+        threads=args.threads + args.max_listeners,
+        connection_limit=args.connection_limit,
+        # refuse oversized bodies while they stream in rather than buffering them first
+        max_request_body_size=app.config["MAX_CONTENT_LENGTH"],
+        channel_timeout=2 * broker.heartbeat + 5,
+        ident="taplist",
+    )
+
+
 if __name__ == "__main__":
-    port = int(os.environ.get("PORT", 5000))
-    app.run(debug=True, port=port, host="0.0.0.0")
+    main()
@@ -0,0 +1,327 @@
+"""In-memory taplist document with atomic, durable writes."""
+import contextlib
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import deque, namedtuple
+
+import fastjson
+from patch import apply_patch, diff
+
+logger = logging.getLogger(__name__)
+
+# One immutable view of the document. Readers grab the current one without locking.
+Snapshot = namedtuple("Snapshot", "document body etag version modified")
+
+EMPTY_DOCUMENT = {"taps": []}
+
+# a save that failed (disk full, read-only after an fsck) is retried after this many seconds, doubling up to the max
+RETRY_DELAY = 1.0
+MAX_RETRY_DELAY = 60.0
+
+
+def serialize(document) -> bytes:
+    """Compact UTF-8 JSON, the same bytes we keep on disk and send to clients"""
+    return fastjson.dumps(document)
+
+
+class VersionConflict(Exception):
+    """The document changed since the version a writer based its change on"""
+
+    def __init__(self, snapshot):
+        super().__init__(f"Taplist changed, now at version {snapshot.version}")
+        self.snapshot = snapshot
+
+
+def write_atomic(path, body: bytes):
+    """Durably write body over path: temp file, fsync, atomic rename, fsync the directory"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}-", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(body)
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(tmp_path)
+        raise
+
+    # make the rename itself survive a power cut (not supported on every platform)
+    with contextlib.suppress(OSError):
+        dir_fd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+
+class TaplistStore:
+    """
+    Keep taplist.json parsed and pre-serialized in memory.
+
+    Reads are served from the cached bytes of the current Snapshot and never touch the disk or wait on a
+    writer. Writers serialize under a lock, write a temp file next to taplist.json, fsync it and os.replace()
+    it into place, so a reader (or the Qt kiosk's file watcher) can never see a truncated file and a crash
+    mid-save leaves the previous version intact.
+
+    Versions are integers that only go up: each write takes max(previous + 1, now in ms), so they also keep
+    increasing across restarts. The last few changes are kept as JSON Patch operations so clients that are
+    only a little behind can catch up with a delta instead of the whole document.
+
+    With a write_delay, bursts of writes (a drag reorder, a colour picker) are coalesced. A write after a quiet
+    spell is written, and on_commit called, at once, so a single save is on disk and on the displays before
+    the writer gets its answer. Writes that follow it within write_delay are served from memory right away but
+    only written once they pause for write_delay seconds (or max_write_delay after the first of them), so
+    displays and the kiosk's file watcher see at most two changes per burst rather than one per request; a
+    crash in that window loses them. A save that fails is logged and kept in memory like a coalesced one, and
+    retried with backoff until it reaches the disk.
+
+    on_commit is called once a version is on disk, outside the write lock and in version order; a version
+    that was overtaken before its call came round is skipped.
+
+    A validate callable, if given, sees every document a writer hands in and raises to reject it before
+    anything is stored. Reloading from disk skips it, so a hand-edited file is still served.
+
+    writes counts the versions writers created and saves the times one was written to disk; with a write_delay
+    the difference is what coalescing saved.
+    """
+
+    def __init__(self, path, change_log_size=64, write_delay=0.0, max_write_delay=2.0, on_commit=None, validate=None):
+        self.path = path
+        self.write_delay = write_delay
+        self.max_write_delay = max_write_delay
+        self.on_commit = on_commit
+        self.validate = validate
+        self._lock = threading.Lock()
+        # serializes on_commit calls, which happen outside _lock
+        self._commit_lock = threading.Lock()
+        self._committed = 0
+        self._version = 0
+        self._snapshot = None
+        # (previous version, version, operations) for recent writes
+        self._changes = deque(maxlen=change_log_size)
+        # monotonic time of the oldest write not on disk yet, and the timer that will flush it
+        self._dirty_since = None
+        self._flush_timer = None
+        # monotonic time of the last write, to tell the start of a burst from the rest of it
+        self._last_write = float("-inf")
+        # saves that failed in a row, for the retry backoff
+        self._failures = 0
+        self.writes = 0
+        self.saves = 0
+        self.reload()
+
+    @property
+    def snapshot(self) -> Snapshot:
+        """The current document, safe to use without holding any lock"""
+        return self._snapshot
+
+    @property
+    def document(self) -> dict:
+        return self._snapshot.document
+
+    @property
+    def version(self) -> int:
+        return self._snapshot.version
+
+    def reload(self):
+        """
+        (Re)read the document from disk, e.g. after it was edited by hand
+
+        A file that doesn't parse is left alone: at startup an empty taplist is served in its place (so the
+        admin page is there to fix it), later the current snapshot is kept.
+
+        Raises:
+            ValueError: if the file doesn't parse and there is a current snapshot to keep
+        """
+        with self._lock:
+            try:
+                with open(self.path, "rb") as f:
+                    document = fastjson.loads(f.read())
+                modified = os.stat(self.path).st_mtime
+            except FileNotFoundError:
+                document, modified = EMPTY_DOCUMENT, time.time()
+            except ValueError as e:
+                if self._snapshot is not None:
+                    raise
+                logger.error("Could not parse %s, serving an empty taplist until it is saved: %s", self.path, e)
+                document, modified = EMPTY_DOCUMENT, time.time()
+            # the file wins over writes still waiting to be flushed
+            self._cancel_flush()
+            self._snapshot = self._build(document, modified)
+            # whatever was logged no longer leads to this document
+            self._changes.clear()
+        return self._snapshot
+
+    def replace(self, document, if_match=None) -> Snapshot:
+        """
+        Replace the whole document and persist it
+
+        Args:
+            document (dict): new taplist document
+            if_match (Collection[str], optional): ETags the writer's copy may have; without it the last writer wins
+
+        Raises:
+            VersionConflict: if the current ETag isn't in if_match
+            Exception: whatever validate raises for an invalid document
+
+        Returns:
+            Snapshot: the snapshot now being served
+        """
+        with self._lock:
+            self._check(if_match)
+            snapshot, saved = self._commit(document, diff(self._snapshot.document, document))
+        if saved:
+            self._notify(snapshot)
+        return snapshot
+
+    def patch(self, operations, if_match=None) -> Snapshot:
+        """
+        Apply a JSON Patch to the document and persist it
+
+        Args:
+            operations (list | callable): RFC 6902 operations, or a function taking the current document and
+                returning them. The function runs under the write lock, so indexes it computes stay valid.
+            if_match (Collection[str], optional): ETags the writer's copy may have
+
+        Raises:
+            PatchError: if the patch doesn't apply; the stored document is left untouched
+            VersionConflict: if the current ETag isn't in if_match
+            Exception: whatever validate raises for the patched document
+
+        Returns:
+            Snapshot: the snapshot now being served
+        """
+        with self._lock:
+            self._check(if_match)
+            current = self._snapshot.document
+            if callable(operations):
+                operations = operations(current)
+            snapshot, saved = self._commit(apply_patch(current, operations), operations)
+        if saved:
+            self._notify(snapshot)
+        return snapshot
+
+    def changes_since(self, version: int):
+        """
+        Operations that turn the document at `version` into the current one
+
+        Returns:
+            tuple[Snapshot, list | None]: the current snapshot and the operations leading to it (empty if already
+                current), or None instead of operations if `version` is too old or unknown
+        """
+        snapshot, changes = self._snapshot, list(self._changes)
+        if version == snapshot.version:
+            return snapshot, []
+        ops, found = [], False
+        for previous, logged, operations in changes:
+            found = found or previous == version
+            if found:
+                ops.extend(operations)
+                if logged == snapshot.version:
+                    return snapshot, ops
+        return snapshot, None
+
+    def flush(self):
+        """Write out a pending coalesced version now (e.g. on shutdown)"""
+        with self._lock:
+            if self._dirty_since is None:
+                return
+            snapshot = self._snapshot
+            if not self._save(snapshot):
+                return
+            self._cancel_flush()
+        self._notify(snapshot)
+
+    def _check(self, if_match):
+        """Optimistic concurrency check; caller holds the lock"""
+        if if_match is not None and self._snapshot.etag not in if_match:
+            raise VersionConflict(self._snapshot)
+
+    def _commit(self, document, operations):
+        """
+        Make a new version current, writing it out now if it starts a burst; caller holds the lock
+
+        Returns:
+            tuple[Snapshot, bool]: the new snapshot, and whether it is on disk already
+        """
+        if self.validate:
+            self.validate(document)
+        previous = self._snapshot.version
+        snapshot = self._build(document, time.time())
+        self.writes += 1
+        self._changes.append((previous, snapshot.version, operations))
+        self._snapshot = snapshot
+
+        now = time.monotonic()
+        # the first write of a burst goes out right away, only the ones hot on its heels wait
+        immediate = self._dirty_since is None and now - self._last_write >= self.write_delay
+        self._last_write = now
+        if immediate and self._save(snapshot):
+            return snapshot, True
+
+        if self._dirty_since is None:
+            self._dirty_since = now
+        # a failed save has its retry scheduled already
+        if not self._failures:
+            # wait for the burst to end, but never hold a change back longer than max_write_delay
+            self._schedule_flush(min(self.write_delay, self._dirty_since + self.max_write_delay - now))
+        return snapshot, False
+
+    def _save(self, snapshot) -> bool:
+        """
+        Write snapshot to disk, scheduling a retry if that fails; caller holds the lock
+
+        Returns:
+            bool: whether it was written
+        """
+        try:
+            write_atomic(self.path, snapshot.body)
+        except OSError:
+            self._failures += 1
+            delay = min(MAX_RETRY_DELAY, RETRY_DELAY * 2 ** (self._failures - 1))
+            logger.exception("Could not save taplist version %s, retrying in %gs", snapshot.version, delay)
+            if self._dirty_since is None:
+                self._dirty_since = time.monotonic()
+            self._schedule_flush(delay)
+            return False
+        self._failures = 0
+        self.saves += 1
+        return True
+
+    def _notify(self, snapshot):
+        """Call on_commit for a version that reached disk, unless a newer one got there first"""
+        if not self.on_commit:
+            return
+        with self._commit_lock:
+            if snapshot.version <= self._committed:
+                return
+            self._committed = snapshot.version
+            self.on_commit(snapshot)
+
+    def _schedule_flush(self, delay):
+        """(Re)start the flush timer; caller holds the lock"""
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+        self._flush_timer = threading.Timer(max(0.0, delay), self.flush)
+        self._flush_timer.daemon = True
+        self._flush_timer.start()
+
+    def _cancel_flush(self):
+        """Forget the pending flush; caller holds the lock"""
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        self._dirty_since = None
+        self._failures = 0
+
+    def _build(self, document, modified) -> Snapshot:
+        body = serialize(document)
+        self._version = max(self._version + 1, int(modified * 1000))
+        return Snapshot(document, body, hashlib.sha1(body).hexdigest(), self._version, modified)
@@ -1,16 +1,139 @@
 let currentThemes: Record<ThemeName, Styles>;
-let lastUpdated: number | null = null;
+let currentVersion: number | null = null;
+let currentData: TapData | null = null;
+let rotationTimer: number | undefined;
+let renderCount = 0;
+// server clock minus ours, and the start of the shared rotation, from /time
+let clockOffset = 0;
+let rotationEpoch = 0;
+let imageIndex: ImageIndex = {};
+// ms per page when taplist.json doesn't say; the server's /time and the Python kiosk use the same
+const DEFAULT_FADE_TIME = 15000;
+const FALLBACK_IMAGE = "./images/defaultImage.png";
+// how long a burst of images events (an upload, then its variants) settles before the index is fetched
+const IMAGES_SETTLE_TIME = 250;
+let imagesTimer: number | undefined;
 
 const getData = async () => {
   try {
-    const res = await fetch("./taplist.json");
+    const res = await fetch("./taplist.json", { cache: "no-cache" });
     const data: TapData = await res.json();
+    currentVersion = Number(res.headers.get("X-Taplist-Version")) || null;
     return data;
   } catch (err) {
     throw err;
   }
 };
 
+// Estimate our clock's skew from the quickest of a few round trips to /time
+const syncClock = async () => {
+  let bestRoundTrip = Infinity;
+  try {
+    for (let i = 0; i < 3; i++) {
+      const sent = Date.now();
+      const res = await fetch("./time", { cache: "no-store" });
+      const { now, epoch }: ServerTime = await res.json();
+      const received = Date.now();
+      if (received - sent < bestRoundTrip) {
+        bestRoundTrip = received - sent;
+        clockOffset = now + bestRoundTrip / 2 - received;
+        rotationEpoch = epoch;
+      }
+    }
+  } catch (err) {
+    console.warn("Failed to sync clock", err);
+  }
+};
+
+const serverNow = () => Date.now() + clockOffset;
+
+const loadImageIndex = async () => {
+  try {
+    const res = await fetch("./images", { cache: "no-cache" });
+    imageIndex = await res.json();
+  } catch (err) {
+    console.warn("Failed to load image index", err);
+  }
+};
+
+const imageFor = (labelLink: string) =>
+  imageIndex[(labelLink || FALLBACK_IMAGE).split("/").pop()!];
+
+// what the cards' images are drawn from, to tell whether an images event changed any of them
+const imageSources = (taps: Tap[]) =>
+  JSON.stringify(
+    taps.map((tap) => {
+      const image = imageFor(tap.labelLink);
+      return image ? [image.url, image.variants] : null;
+    })
+  );
+
+const decodePointer = (pointer: string) =>
+  pointer === ""
+    ? []
+    : pointer
+        .slice(1)
+        .split("/")
+        .map((token) => token.replace(/~1/g, "/").replace(/~0/g, "~"));
+
+// Applies the JSON Patch operations sent by /taplist/delta to a copy of the document
+const applyPatch = <T>(document: T, ops: PatchOperation[]): T => {
+  const root: Record<string, any> = {
+    document: JSON.parse(JSON.stringify(document)),
+  };
+
+  const locate = (pointer: string) => {
+    const tokens = ["document", ...decodePointer(pointer)];
+    let parent: any = root;
+    for (const token of tokens.slice(0, -1)) parent = parent[token];
+    return { parent, key: tokens[tokens.length - 1] };
+  };
+
+  const add = (pointer: string, value: unknown) => {
+    const { parent, key } = locate(pointer);
+    if (Array.isArray(parent)) {
+      if (key === "-") parent.push(value);
+      else parent.splice(Number(key), 0, value);
+    } else {
+      parent[key] = value;
+    }
+  };
+
+  const remove = (pointer: string) => {
+    const { parent, key } = locate(pointer);
+    const value = parent[key];
+    if (Array.isArray(parent)) parent.splice(Number(key), 1);
+    else delete parent[key];
+    return value;
+  };
+
+  for (const op of ops) {
+    switch (op.op) {
+      case "add":
+        add(op.path, op.value);
+        break;
+      case "remove":
+        remove(op.path);
+        break;
+      case "replace": {
+        const { parent, key } = locate(op.path);
+        parent[key] = op.value;
+        break;
+      }
+      case "move":
+        add(op.path, remove(op.from!));
+        break;
+      case "copy": {
+        const { parent, key } = locate(op.from!);
+        add(op.path, JSON.parse(JSON.stringify(parent[key])));
+        break;
+      }
+    }
+  }
+
+  return root.document;
+};
+
 const createCard = (tap: Tap) => {
   const {
     brewName,
@@ -22,19 +145,31 @@ const createCard = (tap: Tap) => {
     containerType,
   } = tap;
 
-  const fallbackImage = "./images/defaultImage.png";
-
   const card = document.createElement("div");
   card.className = "tap-card";
 
   const cardImg = document.createElement("img");
-  cardImg.src = labelLink || fallbackImage;
+  cardImg.src = labelLink || FALLBACK_IMAGE;
   cardImg.alt = brewName;
   cardImg.className = "tap-image";
   cardImg.onerror = () => {
-    cardImg.src = fallbackImage;
+    cardImg.removeAttribute("srcset");
+    cardImg.src = FALLBACK_IMAGE;
   };
 
+  // use the content-addressed url (cached forever) and let the browser pick the smallest variant that fits
+  const image = imageFor(labelLink);
+  if (image) {
+    cardImg.src = image.url;
+    const variants = Object.entries(image.variants);
+    if (variants.length) {
+      cardImg.srcset = variants
+        .map(([size, url]) => `${url} ${size}w`)
+        .join(", ");
+      cardImg.sizes = "4em";
+    }
+  }
+
   const cardContent = document.createElement("div");
   cardContent.className = "tap-content";
 
@@ -127,11 +262,8 @@ const createCategoryWrapper = (category: string, taps: Tap[]) => {
   return wrapper;
 };
 
-const startRotation = (
-  container: HTMLElement,
-  wrappers: HTMLElement[],
-  interval = 10000
-) => {
+// Fallback when the server can't lay the pages out: measure every wrapper in the DOM
+const measurePages = (container: HTMLElement, wrappers: HTMLElement[]) => {
   const pages: HTMLElement[][] = [];
 
   let tempPage: HTMLElement[] = [];
@@ -144,8 +276,6 @@ const startRotation = (
     const height = wrapper.getBoundingClientRect().height;
     container.removeChild(wrapper);
 
-    console.log(tempHeight + height, maxHeight - buffer);
-
     if (tempHeight + height <= maxHeight - buffer || tempPage.length === 0) {
       tempPage.push(wrapper);
       tempHeight += height;
@@ -160,9 +290,48 @@ const startRotation = (
     pages.push(tempPage);
   }
 
-  let pageIndex = 0;
+  return pages;
+};
+
+// Pages for this viewport, grouped and laid out by the server once per version and screen size
+const fetchLayout = async (container: HTMLElement, data: TapData) => {
+  // one rendered card gives the real card height and the width the grid gets
+  const sample = createCategoryWrapper("", [data.taps[0]]);
+  container.appendChild(sample);
+  const group = sample.querySelector<HTMLElement>(".tap-group")!;
+  const params = new URLSearchParams({
+    width: String(group.clientWidth),
+    height: String(container.clientHeight),
+    cardWidth: String(data["card-min-width"] ?? 500),
+    cardHeight: String(
+      group.firstElementChild!.getBoundingClientRect().height
+    ),
+    fontSize: String(parseFloat(getComputedStyle(document.body).fontSize)),
+  });
+  container.removeChild(sample);
+
+  const res = await fetch(`./taplist/layout?${params}`, { cache: "no-cache" });
+  if (!res.ok) throw new Error(`Layout request failed: ${res.status}`);
+  return (await res.json()) as TaplistLayout;
+};
+
+const startRotation = (
+  container: HTMLElement,
+  pages: HTMLElement[][],
+  fadeTime: unknown
+) => {
+  // a hand-edited fadeTime can be anything; 0 or null would stop the clock
+  const interval =
+    typeof fadeTime === "number" && fadeTime > 0 && isFinite(fadeTime)
+      ? fadeTime
+      : DEFAULT_FADE_TIME;
+  // every display shows the page for the current slot of the shared clock
+  const pageAt = (time: number) => {
+    const slot = Math.floor((time - rotationEpoch) / interval);
+    return ((slot % pages.length) + pages.length) % pages.length;
+  };
 
-  const showPage = () => {
+  const showPage = (pageIndex: number) => {
     container.classList.remove("fade-in");
     container.classList.add("fade-out");
 
@@ -177,15 +346,29 @@ const startRotation = (
           container.classList.remove("fade-out");
           container.classList.add("fade-in");
         });
-
-        pageIndex = (pageIndex + 1) % pages.length;
       }, 300);
     });
   };
 
+  window.clearTimeout(rotationTimer);
+  rotationTimer = undefined;
+
   if (pages.length > 1) {
-    showPage();
-    setInterval(showPage, interval);
+    let slot = Math.floor((serverNow() - rotationEpoch) / interval);
+    const scheduleNext = () => {
+      // after a suspended tab or a clock jump, rejoin the current slot instead of replaying missed ones
+      slot = Math.max(
+        slot + 1,
+        Math.floor((serverNow() - rotationEpoch) / interval)
+      );
+      const due = rotationEpoch + slot * interval;
+      rotationTimer = window.setTimeout(() => {
+        showPage(pageAt(due));
+        scheduleNext();
+      }, due - serverNow());
+    };
+    showPage(pageAt(serverNow()));
+    scheduleNext();
   } else {
     container.innerHTML = "";
     for (const wrapper of pages[0]) {
@@ -194,11 +377,11 @@ const startRotation = (
   }
 };
 
-const handleUpdate = async () => {
+const renderTaplist = async (data: TapData) => {
+  const render = ++renderCount;
   const container = document.getElementById("taplist-container")!;
   const h1 = document.getElementById("title")!;
   try {
-    const data = await getData();
     const { taps, title, activeTheme, themes, fadeTime } = data;
 
     h1.textContent = title;
@@ -213,8 +396,6 @@ const handleUpdate = async () => {
 
     setStyles(combinedStyles);
 
-    container.innerHTML = "";
-
     if (taps.length === 0) {
       const baseUrl = window.location.href.replace(/\/+$/, "");
       const adminUrl = `${baseUrl}/admin`;
@@ -236,39 +417,139 @@ const handleUpdate = async () => {
       throw new Error(message);
     }
 
-    const grouped = groupByCategory(taps);
-
-    const sortedCategories = Object.keys(grouped);
-
-    const wrappers = sortedCategories.map((category) =>
-      createCategoryWrapper(category, grouped[category])
-    );
+    let pages: HTMLElement[][];
+    try {
+      const layout = await fetchLayout(container, data);
+      if (layout.version !== currentVersion)
+        throw new Error("Layout is for another version");
+      pages = layout.pages.map((page) =>
+        page.map((section) =>
+          createCategoryWrapper(
+            section.category,
+            section.taps.map((index) => taps[index])
+          )
+        )
+      );
+    } catch (err) {
+      console.warn("Falling back to measuring pages locally", err);
+      const grouped = groupByCategory(taps);
+      const wrappers = Object.keys(grouped).map((category) =>
+        createCategoryWrapper(category, grouped[category])
+      );
+      pages = measurePages(container, wrappers);
+    }
 
-    startRotation(container, wrappers, fadeTime);
-    lastUpdated = data.lastUpdated ?? null;
+    // a newer render started while we were waiting on the server
+    if (render !== renderCount) return;
+    startRotation(container, pages, fadeTime);
   } catch (err) {
     console.error(err);
     container.innerHTML = (err as Error).message;
   }
 };
 
+const handleUpdate = async () => {
+  try {
+    [currentData] = await Promise.all([
+      getData(),
+      loadImageIndex(),
+      syncClock(),
+    ]);
+  } catch (err) {
+    console.error(err);
+    document.getElementById("taplist-container")!.innerHTML = (
+      err as Error
+    ).message;
+    return;
+  }
+  renderTaplist(currentData);
+};
+
+let resizeTimer: number | undefined;
+
+// clocks drift, re-measure the skew now and then
+window.setInterval(syncClock, 15 * 60 * 1000);
+
 window.onload = handleUpdate;
-window.onresize = handleUpdate;
+window.onresize = () => {
+  // wait for the resize to settle instead of re-laying out on every event
+  window.clearTimeout(resizeTimer);
+  resizeTimer = window.setTimeout(() => {
+    if (currentData) renderTaplist(currentData);
+  }, 250);
+};
 
-const pollForChanges = async () => {
-  try {
-    const res = await fetch(`./taplist.json?ts=${Date.now()}`, {
-      cache: "no-store",
-    });
-    const data = await res.json();
-    const updated = data.lastUpdated ?? null;
+// Catch up to the server's version with a delta instead of reloading the whole page
+const fetchChanges = async () => {
+  const res = await fetch(`./taplist/delta?since=${currentVersion}`, {
+    cache: "no-store",
+  });
+  const delta: TaplistDelta = await res.json();
+  if (delta.version === currentVersion) return;
+
+  currentData = delta.document ?? applyPatch(currentData!, delta.ops ?? []);
+  currentVersion = delta.version;
+  renderTaplist(currentData);
+};
+
+let syncQueue: Promise<void> = Promise.resolve();
 
-    if (updated !== null && updated !== lastUpdated) {
-      location.reload();
+const syncTo = (version: number) => {
+  syncQueue = syncQueue.then(async () => {
+    if (currentData === null || version === currentVersion) return;
+    try {
+      await fetchChanges();
+    } catch (err) {
+      console.warn("Failed to apply changes, reloading taplist", err);
+      await handleUpdate();
     }
+  });
+};
+
+const pollForChanges = async () => {
+  try {
+    const res = await fetch("./taplist/version", { cache: "no-store" });
+    const { version }: TaplistVersion = await res.json();
+    syncTo(version);
   } catch (err) {
     console.warn("Failed to check for updates", err);
   }
 };
 
-setInterval(pollForChanges, 5000);
+let pollTimer: number | undefined;
+
+const startPolling = () => {
+  if (pollTimer === undefined) {
+    pollTimer = window.setInterval(pollForChanges, 5000);
+  }
+};
+
+const listenForChanges = () => {
+  if (!("EventSource" in window)) {
+    startPolling();
+    return;
+  }
+
+  const events = new EventSource("./events");
+  events.addEventListener("taplist", (e) => {
+    const { version }: TaplistVersion = JSON.parse((e as MessageEvent).data);
+    syncTo(version);
+  });
+  events.addEventListener("images", () => {
+    // most images events are about labels no tap uses, so only redraw when one on screen moved
+    window.clearTimeout(imagesTimer);
+    imagesTimer = window.setTimeout(async () => {
+      const before = currentData && imageSources(currentData.taps);
+      await loadImageIndex();
+      if (currentData && imageSources(currentData.taps) !== before)
+        renderTaplist(currentData);
+    }, IMAGES_SETTLE_TIME);
+  });
+  events.onerror = () => {
+    // EventSource reconnects on its own after a dropped connection and only gives up on an error
+    // response (e.g. 503 when the server has too many listeners), so poll instead in that case
+    if (events.readyState === EventSource.CLOSED) startPolling();
+  };
+};
+
+listenForChanges();
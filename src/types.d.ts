@@ -23,6 +23,116 @@ type TapData = {
   lastUpdated?: number;
 };
 
+type TaplistVersion = {
+  version: number;
+  etag: string;
+  lastModified: number;
+};
+
+type PatchOperation = {
+  op: "add" | "remove" | "replace" | "move" | "copy" | "test";
+  path: string;
+  from?: string;
+  value?: unknown;
+};
+
+type TaplistDelta = {
+  version: number;
+  ops?: PatchOperation[];
+  document?: TapData;
+};
+
+// shared rotation clock, as returned by /time
+type ServerTime = {
+  now: number;
+  epoch: number;
+  fadeTime: number;
+};
+
+type VersionEntry = {
+  version: number;
+  // ms since epoch
+  created: number;
+  // stored as a whole document rather than a delta
+  full: boolean;
+  size: number;
+};
+
+// newest first, as returned by /taplist/versions
+type TaplistVersions = {
+  current: number;
+  versions: VersionEntry[];
+};
+
+type LayoutSection = {
+  category: string;
+  // indexes into TapData.taps
+  taps: number[];
+};
+
+// pages for one viewport, as returned by /taplist/layout
+type TaplistLayout = {
+  version: number;
+  columns: number;
+  rows: number;
+  pages: LayoutSection[][];
+};
+
+type ImageEntry = {
+  hash: string;
+  // content-addressed, safe to cache forever
+  url: string;
+  // smallest variant, or the original until variants exist
+  thumbnail: string;
+  // longest edge in px -> variant url
+  variants: Record<string, string>;
+  // bytes, px and ms since the epoch; null if unknown
+  size: number | null;
+  width: number | null;
+  height: number | null;
+  added: number | null;
+  // ids of the taps showing it
+  usedBy: number[];
+};
+
+// one page of /images?limit=&offset=&q=&unused=
+type ImagePage = {
+  total: number;
+  offset: number;
+  limit: number;
+  items: (ImageEntry & { name: string })[];
+};
+
+// POST /images/gc
+type ImageCollection = {
+  removed: string[];
+  unused: string[];
+};
+
+// image name -> entry, as returned by /images
+type ImageIndex = Record<string, ImageEntry>;
+
+// background work, as returned by /jobs/<id>; times are ms since the epoch
+type Job = {
+  id: string;
+  kind: string;
+  state: "queued" | "running" | "done" | "failed";
+  created: number;
+  started: number | null;
+  finished: number | null;
+  result: unknown;
+  error: string | null;
+};
+
+type UploadResponse = {
+  message: string;
+  name: string;
+  url: string;
+  // absent when the server can't process images
+  job?: Job;
+  error?: string;
+};
+
 type ThemeName = "light" | "dark" | "retro" | "chalkboard" | "custom";
 
 type Styles = {
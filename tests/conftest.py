@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the server imports its modules by plain name, as when started from server/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "server"))
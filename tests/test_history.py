@@ -0,0 +1,56 @@
+import copy
+
+import pytest
+
+from history import TaplistHistory
+
+
+@pytest.fixture
+def versions():
+    """Ten versions of a taplist, each adding a tap"""
+    document = {"title": "Taplist", "taps": []}
+    result = []
+    for version in range(1, 11):
+        document = copy.deepcopy(document)
+        document["taps"].append({"id": version, "brewName": f"Brew {version}"})
+        result.append((version, document))
+    return result
+
+
+def test_get_rebuilds_delta_versions(tmp_path, versions):
+    history = TaplistHistory(str(tmp_path / "history.db"), snapshot_every=4)
+    for version, document in versions:
+        history.record(version, document)
+    assert [row["full"] for row in reversed(history.versions())] == [True, False, False, False] * 2 + [True, False]
+    for version, document in versions:
+        assert history.get(version) == document
+
+
+def test_reopened_history_continues_the_deltas(tmp_path, versions):
+    path = str(tmp_path / "history.db")
+    history = TaplistHistory(path, snapshot_every=4)
+    for version, document in versions[:5]:
+        history.record(version, document)
+    history = TaplistHistory(path, snapshot_every=4)
+    for version, document in versions[5:]:
+        history.record(version, document)
+    assert history.get(7) == versions[6][1]
+
+
+def test_unchanged_and_older_versions_are_skipped(tmp_path, versions):
+    history = TaplistHistory(str(tmp_path / "history.db"))
+    history.record(2, versions[1][1])
+    history.record(3, versions[1][1])
+    history.record(1, versions[0][1])
+    assert [row["version"] for row in history.versions()] == [2]
+    assert history.get(1) is None
+
+
+def test_pruning_keeps_a_snapshot_first(tmp_path, versions):
+    history = TaplistHistory(str(tmp_path / "history.db"), snapshot_every=4, max_versions=3)
+    for version, document in versions:
+        history.record(version, document)
+    kept = [row["version"] for row in reversed(history.versions())]
+    assert kept[0] == 5 and kept[-1] == 10
+    assert history.get(kept[0]) == versions[4][1]
+    assert history.get(10) == versions[9][1]
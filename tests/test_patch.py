@@ -0,0 +1,124 @@
+import copy
+
+import pytest
+
+import patch
+from patch import PatchError, apply_patch, diff
+
+DOCUMENT = {
+    "title": "Taplist",
+    "themes": {"dark": {"bg-color": "#000", "card-gap": "1rem"}},
+    "taps": [
+        {"id": 1, "brewName": "Dry Mead", "abv": 12.5},
+        {"id": 2, "brewName": "Cyser", "abv": None},
+        {"id": 3, "brewName": "Melomel", "abv": 9},
+    ],
+}
+
+
+@pytest.mark.parametrize(
+    "change",
+    [
+        lambda d: d["taps"][1].update(brewName="Sweet Cyser"),
+        lambda d: d["taps"].append({"id": 4, "brewName": "Braggot"}),
+        lambda d: d["taps"].pop(0),
+        lambda d: d["taps"].reverse(),
+        lambda d: d["themes"].update({"a/b~c": {"bg-color": None}}),
+        lambda d: d["themes"]["dark"].pop("card-gap"),
+        lambda d: d.update(title="", fadeTime=5000),
+        lambda d: d.clear(),
+    ],
+)
+def test_diff_round_trips(change):
+    new = copy.deepcopy(DOCUMENT)
+    change(new)
+    assert apply_patch(DOCUMENT, diff(DOCUMENT, new)) == new
+
+
+def test_diff_of_equal_documents_is_empty():
+    assert diff(DOCUMENT, copy.deepcopy(DOCUMENT)) == []
+
+
+def test_one_field_is_one_operation():
+    new = copy.deepcopy(DOCUMENT)
+    new["taps"][2]["abv"] = 10
+    assert diff(DOCUMENT, new) == [{"op": "replace", "path": "/taps/2/abv", "value": 10}]
+
+
+def test_apply_leaves_the_original_alone():
+    before = copy.deepcopy(DOCUMENT)
+    result = apply_patch(
+        DOCUMENT,
+        [
+            {"op": "add", "path": "/taps/0/style", "value": "Traditional"},
+            {"op": "remove", "path": "/taps/1"},
+            {"op": "replace", "path": "/themes/dark/bg-color", "value": "#111"},
+            {"op": "move", "from": "/taps/0", "path": "/taps/-"},
+        ],
+    )
+    assert DOCUMENT == before
+    assert [tap["id"] for tap in result["taps"]] == [3, 1]
+    assert result["taps"][1]["style"] == "Traditional"
+    assert result["themes"]["dark"]["bg-color"] == "#111"
+
+
+def test_added_values_are_not_shared():
+    value = {"id": 4, "brewName": "Braggot"}
+    result = apply_patch(DOCUMENT, [{"op": "add", "path": "/taps/-", "value": value}])
+    value["brewName"] = "changed"
+    assert result["taps"][-1]["brewName"] == "Braggot"
+
+
+def test_failed_test_operation_applies_nothing():
+    operations = [
+        {"op": "replace", "path": "/title", "value": "Changed"},
+        {"op": "test", "path": "/taps/0/id", "value": 2},
+    ]
+    with pytest.raises(patch.TestFailed):
+        apply_patch(DOCUMENT, operations)
+    assert DOCUMENT["title"] == "Taplist"
+
+
+def test_test_on_a_missing_path_fails():
+    with pytest.raises(patch.TestFailed):
+        apply_patch(DOCUMENT, [{"op": "test", "path": "/taps/7/id", "value": 1}])
+
+
+@pytest.mark.parametrize(
+    "operation",
+    [
+        {"op": "remove", "path": "/taps/3"},
+        {"op": "add", "path": "/taps/01", "value": {}},
+        {"op": "replace", "path": "/missing/key", "value": 1},
+        {"op": "move", "from": "/taps", "path": "/taps/0"},
+        {"op": "frobnicate", "path": "/title"},
+        {"op": "add", "path": "title", "value": 1},
+    ],
+)
+def test_invalid_operations(operation):
+    with pytest.raises(PatchError):
+        apply_patch(DOCUMENT, [operation])
+
+
+def test_untouched_containers_are_shared():
+    result = apply_patch(DOCUMENT, [{"op": "replace", "path": "/taps/1/abv", "value": 6}])
+    assert result["taps"][1] is not DOCUMENT["taps"][1]
+    assert result["taps"][0] is DOCUMENT["taps"][0] and result["themes"] is DOCUMENT["themes"]
+
+
+@pytest.mark.parametrize(
+    "operations",
+    [
+        [{"op": "move", "from": "/taps/0", "path": "/taps/-"}, {"op": "add", "path": "/taps/2/style", "value": "x"}],
+        [
+            {"op": "copy", "from": "/themes/dark", "path": "/themes/light"},
+            {"op": "remove", "path": "/themes/light/card-gap"},
+        ],
+        [{"op": "move", "from": "/themes", "path": ""}, {"op": "remove", "path": "/dark/card-gap"}],
+        [{"op": "add", "path": "/taps/0/abv", "value": 1}, {"op": "test", "path": "/taps/0/abv", "value": 1}],
+    ],
+)
+def test_changes_after_a_move_or_copy_leave_the_original_alone(operations):
+    before = copy.deepcopy(DOCUMENT)
+    apply_patch(DOCUMENT, operations)
+    assert DOCUMENT == before
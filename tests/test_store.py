@@ -0,0 +1,154 @@
+import json
+import threading
+
+import pytest
+
+import store
+from store import TaplistStore, VersionConflict
+
+
+def document(*ids):
+    return {"title": "Taplist", "taps": [{"id": tap_id, "brewName": f"Brew {tap_id}"} for tap_id in ids]}
+
+
+def on_disk(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+class Commits:
+    """on_commit that records versions and can be waited on"""
+
+    def __init__(self):
+        self.versions = []
+        self.event = threading.Event()
+
+    def __call__(self, snapshot):
+        self.versions.append(snapshot.version)
+        self.event.set()
+
+    def wait(self):
+        assert self.event.wait(5)
+        self.event.clear()
+
+
+@pytest.fixture
+def path(tmp_path):
+    path = tmp_path / "taplist.json"
+    path.write_text(json.dumps(document(1)))
+    return str(path)
+
+
+def test_serves_the_file_and_writes_through(path):
+    commits = Commits()
+    taplist = TaplistStore(path, on_commit=commits)
+    assert taplist.document == document(1)
+    snapshot = taplist.replace(document(1, 2))
+    assert on_disk(path) == document(1, 2)
+    assert commits.versions == [snapshot.version]
+    assert snapshot.version > 0 and taplist.saves == 1
+
+
+def test_version_conflict(path):
+    taplist = TaplistStore(path)
+    etag = taplist.snapshot.etag
+    taplist.replace(document(2), if_match={etag})
+    with pytest.raises(VersionConflict) as e:
+        taplist.patch([{"op": "remove", "path": "/taps/0"}], if_match={etag})
+    assert e.value.snapshot is taplist.snapshot
+    assert taplist.document == document(2)
+
+
+def test_rejected_documents_are_not_stored(path):
+    def validate(candidate):
+        if not candidate["taps"]:
+            raise ValueError("no taps")
+
+    taplist = TaplistStore(path, validate=validate)
+    version = taplist.version
+    with pytest.raises(ValueError):
+        taplist.replace(document())
+    assert taplist.version == version and on_disk(path) == document(1)
+
+
+def test_burst_is_coalesced(path):
+    commits = Commits()
+    taplist = TaplistStore(path, write_delay=0.1, on_commit=commits)
+    first = taplist.replace(document(1, 2))
+    # the first save of a burst is written at once, the rest wait for it to end
+    assert commits.versions == [first.version] and on_disk(path) == document(1, 2)
+    commits.event.clear()
+    for count in range(3, 6):
+        taplist.replace(document(*range(1, count + 1)))
+    assert taplist.document == document(1, 2, 3, 4, 5)
+    assert on_disk(path) == document(1, 2)
+    commits.wait()
+    assert on_disk(path) == document(1, 2, 3, 4, 5)
+    assert commits.versions == [first.version, taplist.version]
+    assert (taplist.writes, taplist.saves) == (4, 2)
+
+
+def test_changes_since(path):
+    taplist = TaplistStore(path)
+    start = taplist.version
+    taplist.replace(document(1, 2))
+    taplist.patch([{"op": "replace", "path": "/title", "value": "Meads"}])
+    snapshot, operations = taplist.changes_since(start)
+    rebuilt = store.apply_patch(document(1), operations)
+    assert rebuilt == snapshot.document
+    assert taplist.changes_since(taplist.version)[1] == []
+    assert taplist.changes_since(start - 1)[1] is None
+
+
+def test_failed_saves_are_retried(path, monkeypatch):
+    monkeypatch.setattr(store, "RETRY_DELAY", 0.05)
+    commits = Commits()
+    taplist = TaplistStore(path, write_delay=0.05, on_commit=commits)
+    write_atomic = store.write_atomic
+    failing = threading.Event()
+    failing.set()
+
+    def flaky_write(target, body):
+        if failing.is_set():
+            raise OSError("No space left on device")
+        write_atomic(target, body)
+
+    monkeypatch.setattr(store, "write_atomic", flaky_write)
+    # neither the immediate write nor a coalesced one raises to the writer, both stay served from memory
+    taplist.replace(document(1, 2))
+    taplist.replace(document(1, 2, 3))
+    assert taplist.document == document(1, 2, 3)
+    assert commits.versions == [] and taplist.saves == 0
+
+    failing.clear()
+    commits.wait()
+    assert on_disk(path) == document(1, 2, 3)
+    assert commits.versions == [taplist.version]
+
+
+def test_on_commit_runs_outside_the_lock(path):
+    held = []
+    taplist = None
+
+    def on_commit(snapshot):
+        held.append(taplist._lock.locked())
+
+    taplist = TaplistStore(path, on_commit=on_commit)
+    taplist.replace(document(1, 2))
+    taplist.flush()
+    assert held == [False]
+
+
+def test_reload_keeps_the_snapshot_on_a_bad_file(path):
+    taplist = TaplistStore(path)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("{not json")
+    with pytest.raises(ValueError):
+        taplist.reload()
+    assert taplist.document == document(1)
+
+
+def test_unparseable_file_at_startup_serves_an_empty_taplist(path):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("{not json")
+    assert TaplistStore(path).document == store.EMPTY_DOCUMENT